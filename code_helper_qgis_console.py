@@ -10,6 +10,8 @@ from qgis.core import (
     QgsProject,
     QgsVectorLayer,
     QgsField,
+    QgsFields,
+    QgsFeatureRequest,
     QgsVectorDataProvider,
     edit,
 )
@@ -69,13 +71,62 @@ def delete_field(layer, field_index):
 
 def collect_existing_codes(layer, code_idx):
     existing = set()
-    for f in layer.getFeatures():
+    request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry).setSubsetOfAttributes([code_idx])
+    for f in layer.getFeatures(request):
         val = f[code_idx]
         if val is not None and str(val).strip() != "":
             existing.add(str(val))
     return existing
 
 
+def write_attribute_values(layer, changes):
+    """
+    Apply {fid: {field_index: value}} to a layer as one batch.
+
+    Field indexes are layer indexes. When the layer is not being edited and
+    every field comes from the provider, the values are written with a single
+    dataProvider().changeAttributeValues call, which the OGR and PostgreSQL
+    providers run in one transaction and which skips the edit buffer and its
+    undo stack. Otherwise the changes go through the edit buffer, one call
+    per feature, as a single undo command.
+    """
+    if not changes:
+        return
+    fields = layer.fields()
+    provider = layer.dataProvider()
+    field_indexes = {idx for attrs in changes.values() for idx in attrs}
+    direct = (
+        not layer.isEditable()
+        and provider.capabilities() & QgsVectorDataProvider.ChangeAttributeValues
+        and all(fields.fieldOrigin(idx) == QgsFields.OriginProvider for idx in field_indexes)
+    )
+
+    if direct:
+        provider_index = {idx: fields.fieldOriginIndex(idx) for idx in field_indexes}
+        provider_changes = {
+            fid: {provider_index[idx]: value for idx, value in attrs.items()}
+            for fid, attrs in changes.items()
+        }
+        provider.clearErrors()
+        if not provider.changeAttributeValues(provider_changes):
+            details = "; ".join(provider.errors()) if provider.hasErrors() else "provider rejected the changes"
+            raise RuntimeError(f"Failed to write attribute values to layer '{layer.name()}': {details}")
+        layer.reload()
+        layer.triggerRepaint()
+        return
+
+    if layer.isEditable():
+        layer.beginEditCommand("Update attribute values")
+        for fid, attrs in changes.items():
+            layer.changeAttributeValues(fid, attrs)
+        layer.endEditCommand()
+        return
+
+    with edit(layer):
+        for fid, attrs in changes.items():
+            layer.changeAttributeValues(fid, attrs)
+
+
 def generate_unique_code(existing):
     while True:
         c = str(uuid.uuid4())[:8]
@@ -147,19 +198,20 @@ def process_layer(layer, log=None):
             if code_idx < 0:
                 raise RuntimeError(f"Could not locate/create 'code' field for layer: {layer.name()}")
 
-            existing_codes = collect_existing_codes(layer, code_idx)
-            updated = 0
-            for f in layer.getFeatures():
-                val = f[code_idx]
-                if val is None or str(val).strip() == "":
-                    new_code = generate_unique_code(existing_codes)
-                    layer.changeAttributeValue(f.id(), code_idx, new_code)
-                    updated += 1
-
-            if updated > 0:
-                log(f"Filled {updated} missing code value(s) for: {layer.name()}")
-            else:
-                log(f"All features already had codes in: {layer.name()}")
+        code_idx = layer.fields().indexOf("code")
+        existing_codes = collect_existing_codes(layer, code_idx)
+        changes = {}
+        request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry).setSubsetOfAttributes([code_idx])
+        for f in layer.getFeatures(request):
+            val = f[code_idx]
+            if val is None or str(val).strip() == "":
+                changes[f.id()] = {code_idx: generate_unique_code(existing_codes)}
+
+        write_attribute_values(layer, changes)
+        if changes:
+            log(f"Filled {len(changes)} missing code value(s) for: {layer.name()}")
+        else:
+            log(f"All features already had codes in: {layer.name()}")
 
     except Exception as e:
         provider_name, source_uri, missing = describe_edit_blockers(layer)
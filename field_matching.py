@@ -0,0 +1,87 @@
+"""
+Fuzzy matching of layer fields to KeSMIS API attributes.
+
+All layer fields are scored against all API attributes in one rapidfuzz
+cdist matrix. Each API attribute is then given to at most one layer field
+by solving the assignment problem (scipy's linear_sum_assignment when it is
+installed, a greedy best-score-first pass otherwise).
+"""
+
+import numpy as np
+from rapidfuzz import fuzz, process
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:
+    linear_sum_assignment = None
+
+
+SCORE_CUTOFF = 70
+
+
+def _assign(scores):
+    """Return (row, column) pairs maximising the total score, one per row/column."""
+    if linear_sum_assignment is not None:
+        rows, cols = linear_sum_assignment(scores, maximize=True)
+        return list(zip(rows.tolist(), cols.tolist()))
+
+    pairs = []
+    used_rows, used_cols = set(), set()
+    order = np.argsort(-scores, axis=None, kind="stable")
+    for flat in order.tolist():
+        row, col = divmod(flat, scores.shape[1])
+        if row in used_rows or col in used_cols:
+            continue
+        if scores[row, col] <= 0:
+            break
+        pairs.append((row, col))
+        used_rows.add(row)
+        used_cols.add(col)
+    return pairs
+
+
+def match_fields(layer_fields, api_fields, score_cutoff=SCORE_CUTOFF):
+    """Match layer fields to API attributes.
+
+    Returns:
+        (field_mapping, table_data): {layer_field: api_field or None} and
+        [(layer_field, api_field or "", score text)] rows in layer field order.
+    """
+    layer_fields = list(layer_fields)
+    api_fields = list(api_fields)
+    field_mapping = {field: None for field in layer_fields}
+    best = {}
+
+    if layer_fields and api_fields:
+        scores = process.cdist(layer_fields, api_fields, scorer=fuzz.ratio, dtype=np.float32, workers=-1)
+        scores = np.where(scores >= score_cutoff, scores, 0.0)
+        for row, col in _assign(scores):
+            if scores[row, col] > 0:
+                field_mapping[layer_fields[row]] = api_fields[col]
+                best[layer_fields[row]] = scores[row, col]
+
+    table_data = [
+        (field, field_mapping[field], str(int(best[field])))
+        if field_mapping[field] else (field, "", "-")
+        for field in layer_fields
+    ]
+    return field_mapping, table_data
+
+
+def apply_saved_mapping(layer_fields, api_fields, saved):
+    """Build (field_mapping, table_data) from a remembered mapping.
+
+    Entries pointing at API attributes that no longer exist are dropped.
+    """
+    available = set(api_fields)
+    field_mapping = {}
+    table_data = []
+    for field in layer_fields:
+        api_field = saved.get(field)
+        if api_field in available:
+            field_mapping[field] = api_field
+            table_data.append((field, api_field, "saved"))
+        else:
+            field_mapping[field] = None
+            table_data.append((field, "", "-"))
+    return field_mapping, table_data
@@ -0,0 +1,261 @@
+"""
+On-disk caches for KeSMIS lookups that rarely change between runs.
+
+Cache files live under ~/Documents/ODK_Data/kesmis_cache (next to the
+parent GeoJSON files the import tool already saves), one JSON file per
+server and cache kind.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+from .kesmis_payload import EntityLookups
+
+
+CACHE_DIR = os.path.join(os.path.expanduser("~/Documents"), "ODK_Data", "kesmis_cache")
+
+
+def _server_key(server_url):
+    return hashlib.sha1((server_url or "").rstrip("/").encode("utf-8")).hexdigest()[:12]
+
+
+def cache_path(kind, server_url, name=""):
+    """Return the cache file path for a cache kind on a given server."""
+    suffix = f"_{name}" if name else ""
+    return os.path.join(CACHE_DIR, f"{kind}_{_server_key(server_url)}{suffix}.json")
+
+
+def clear_cache_dir():
+    """Delete every cached KeSMIS lookup. Returns the number of files removed."""
+    if not os.path.isdir(CACHE_DIR):
+        return 0
+    removed = 0
+    for filename in os.listdir(CACHE_DIR):
+        if filename.endswith(".json"):
+            try:
+                os.remove(os.path.join(CACHE_DIR, filename))
+                removed += 1
+            except OSError:
+                continue
+    return removed
+
+
+class JsonStore:
+    """A small JSON document persisted atomically to disk."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.data = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        with self._lock:
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(self.data, f, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+                return True
+            except OSError:
+                return False
+
+    def clear(self):
+        with self._lock:
+            self.data = {}
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class PcodeResolutionCache(JsonStore):
+    """Persistent code -> parent id hierarchy lookups for one parent model.
+
+    Entries older than ``ttl`` seconds are treated as misses so renamed or
+    re-parented admin units are picked up again.
+    """
+
+    DEFAULT_TTL = 7 * 24 * 3600
+
+    def __init__(self, server_url, model, ttl=DEFAULT_TTL, path=None):
+        super().__init__(path or cache_path("pcode", server_url, model.lower()))
+        self.ttl = ttl
+        self.data.setdefault("entries", {})
+
+    def get_many(self, codes):
+        """Return {code: ids} for codes with a fresh cache entry."""
+        now = time.time()
+        entries = self.data["entries"]
+        found = {}
+        with self._lock:
+            for code in codes:
+                entry = entries.get(code)
+                if entry and now - entry.get("ts", 0) <= self.ttl:
+                    found[code] = entry["ids"]
+        return found
+
+    def put_many(self, resolved):
+        """Store {code: ids} results from the server."""
+        now = time.time()
+        with self._lock:
+            entries = self.data["entries"]
+            for code, ids in resolved.items():
+                entries[code] = {"ids": ids, "ts": now}
+
+    def invalidate(self, codes=None):
+        """Drop cached entries for ``codes``, or every entry when codes is None."""
+        with self._lock:
+            if codes is None:
+                self.data["entries"] = {}
+            else:
+                for code in codes:
+                    self.data["entries"].pop(code, None)
+        self.save()
+
+
+class EndpointCapabilityCache(JsonStore):
+    """Remembers which variant of a KeSMIS endpoint works on a server.
+
+    Some servers expose geo/minimal and others only geo/full; some accept
+    data/many/id and others data/many/ids. The first variant that works is
+    tried first next time, so the failing round-trips are paid only once per
+    server until the entry expires.
+    """
+
+    DEFAULT_TTL = 30 * 24 * 3600
+
+    def __init__(self, server_url, ttl=DEFAULT_TTL, path=None):
+        super().__init__(path or cache_path("capabilities", server_url))
+        self.ttl = ttl
+        self.data.setdefault("endpoints", {})
+
+    def known(self, kind):
+        """Return the remembered working variant for ``kind``, or None."""
+        with self._lock:
+            entry = self.data["endpoints"].get(kind)
+        if entry and time.time() - entry.get("ts", 0) <= self.ttl:
+            return entry.get("variant")
+        return None
+
+    def ordered(self, kind, variants, key=None):
+        """Return ``variants`` with the remembered working one moved to the front.
+
+        ``key`` maps a variant to its name when variants are not plain strings.
+        """
+        known = self.known(kind)
+        if known is None:
+            return list(variants)
+        name = key or (lambda variant: variant)
+        return sorted(variants, key=lambda variant: name(variant) != known)
+
+    def remember(self, kind, variant):
+        """Record ``variant`` as the working endpoint for ``kind`` and save."""
+        with self._lock:
+            entry = self.data["endpoints"].get(kind)
+            if entry and entry.get("variant") == variant and time.time() - entry.get("ts", 0) <= self.ttl:
+                return
+            self.data["endpoints"][kind] = {"variant": variant, "ts": time.time()}
+        self.save()
+
+    def forget(self, kind):
+        with self._lock:
+            removed = self.data["endpoints"].pop(kind, None)
+        if removed is not None:
+            self.save()
+
+
+def layer_schema_hash(field_names):
+    """Stable hash of a layer's field names, independent of field order."""
+    joined = "\n".join(sorted(str(name) for name in field_names))
+    return hashlib.sha1(joined.encode("utf-8")).hexdigest()[:16]
+
+
+class FieldMappingMemory(JsonStore):
+    """Field mappings the user confirmed, keyed by entity and layer schema."""
+
+    def __init__(self, server_url, path=None):
+        super().__init__(path or cache_path("mappings", server_url))
+        self.data.setdefault("mappings", {})
+
+    @staticmethod
+    def _key(entity, field_names):
+        return f"{(entity or '').lower()}:{layer_schema_hash(field_names)}"
+
+    def recall(self, entity, field_names):
+        """Return the saved {layer_field: api_field} mapping, or None."""
+        with self._lock:
+            entry = self.data["mappings"].get(self._key(entity, field_names))
+        return dict(entry["mapping"]) if entry else None
+
+    def remember(self, entity, field_names, mapping):
+        """Save a confirmed mapping for this entity and layer schema."""
+        with self._lock:
+            self.data["mappings"][self._key(entity, field_names)] = {
+                "mapping": {field: api_field for field, api_field in mapping.items()},
+                "ts": time.time(),
+            }
+        self.save()
+
+
+class ModelCatalogue(JsonStore):
+    """On-disk copy of the /api/v1/models/list response for one server.
+
+    The stored document carries a format version and a digest of the model
+    list, so a refresh can tell whether anything changed. Per-entity
+    lookups (attribute map, writable set, type coercers) are built once per
+    catalogue version and reused.
+    """
+
+    VERSION = 1
+
+    def __init__(self, server_url, path=None):
+        super().__init__(path or cache_path("models", server_url))
+        if self.data.get("version") != self.VERSION or not isinstance(self.data.get("models"), list):
+            self.data = {}
+        self._lookups = {}
+
+    @staticmethod
+    def digest(models):
+        text = json.dumps(models, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def models(self):
+        """Return the cached model list (empty when nothing is cached)."""
+        with self._lock:
+            return list(self.data.get("models") or [])
+
+    def update(self, models):
+        """Store a freshly fetched model list. Returns True when it differs from the cache."""
+        digest = self.digest(models)
+        with self._lock:
+            changed = digest != self.data.get("digest")
+            self.data = {"version": self.VERSION, "digest": digest, "ts": time.time(), "models": models}
+            if changed:
+                self._lookups = {}
+        self.save()
+        return changed
+
+    def lookups(self, entity):
+        """Return the EntityLookups for an entity dict from this catalogue."""
+        key = (entity.get("model") or "").lower()
+        with self._lock:
+            lookups = self._lookups.get(key)
+            if lookups is None:
+                lookups = self._lookups[key] = EntityLookups(entity)
+        return lookups
+
+    def clear(self):
+        super().clear()
+        self._lookups = {}
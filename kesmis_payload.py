@@ -0,0 +1,434 @@
+"""
+Columnar helpers for building KeSMIS upsert payloads from GeoDataFrames.
+
+Each column is converted to JSON-native values once, instead of converting
+every cell of every row separately.
+"""
+
+import gzip
+import hashlib
+import json
+import math
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from .shapely_compat import VECTORIZED_SHAPELY
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+PARENT_ID_FIELDS = ("settlement_id", "ward_id", "subcounty_id", "county_id")
+
+EncodedBody = namedtuple("EncodedBody", ["body", "headers", "json_size", "full_size"])
+
+
+def scalar_to_json(value):
+    """Convert a single numpy/pandas/Python scalar to a JSON-native value."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return value
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    try:
+        if pd.isna(value):
+            return None
+    except (TypeError, ValueError):
+        pass
+    if isinstance(value, np.bool_):
+        return bool(value)
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, np.floating):
+        number = float(value)
+        return number if math.isfinite(number) else None
+    if isinstance(value, (list, tuple)):
+        return [scalar_to_json(item) for item in value]
+    if isinstance(value, dict):
+        return {k: scalar_to_json(v) for k, v in value.items()}
+    if hasattr(value, "item") and not isinstance(value, bytes):
+        try:
+            return scalar_to_json(value.item())
+        except (ValueError, AttributeError, TypeError):
+            pass
+    return str(value)
+
+
+def column_to_json_values(series):
+    """Return the values of a Series as a list of JSON-native values.
+
+    NaN, NaT, pd.NA and +/-inf become None.
+    """
+    dtype = series.dtype
+    if pd.api.types.is_bool_dtype(dtype) and not pd.api.types.is_extension_array_dtype(dtype):
+        return series.to_numpy().tolist()
+    if pd.api.types.is_integer_dtype(dtype) and not pd.api.types.is_extension_array_dtype(dtype):
+        return series.to_numpy().tolist()
+    if pd.api.types.is_float_dtype(dtype) and not pd.api.types.is_extension_array_dtype(dtype):
+        values = series.to_numpy()
+        out = values.tolist()
+        for pos in np.flatnonzero(~np.isfinite(values)):
+            out[pos] = None
+        return out
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        missing = series.isna().to_numpy()
+        out = series.astype(str).tolist()
+        for pos in np.flatnonzero(missing):
+            out[pos] = None
+        return out
+
+    values = series.to_numpy(dtype=object)
+    missing = pd.isna(values)
+    out = values.tolist()
+    native = (str, bool, int)
+    for pos, value in enumerate(out):
+        if missing[pos]:
+            out[pos] = None
+        elif type(value) not in native:
+            out[pos] = scalar_to_json(value)
+    return out
+
+
+def geometries_to_geojson(geometries):
+    """Serialise a GeoSeries/array of geometries to GeoJSON dicts (None for null/empty)."""
+    geoms = np.asarray(geometries, dtype=object)
+    out = [None] * len(geoms)
+    if not len(geoms):
+        return out
+
+    if VECTORIZED_SHAPELY:
+        present = ~(shapely.is_missing(geoms) | shapely.is_empty(geoms))
+        positions = np.flatnonzero(present)
+        if len(positions):
+            texts = shapely.to_geojson(geoms[positions])
+            for pos, text in zip(positions.tolist(), texts.tolist()):
+                out[pos] = json.loads(text)
+        return out
+
+    for pos, geom in enumerate(geoms):
+        if geom is not None and not geom.is_empty:
+            out[pos] = scalar_to_json(geom.__geo_interface__)
+    return out
+
+
+def build_feature_payloads(gdf, field_mapping, parent_data, valid_indices, optional_keys=("code", "pcode")):
+    """Build import/upsert payload dicts for rows of ``gdf`` listed in ``valid_indices``.
+
+    Args:
+        gdf: GeoDataFrame with the layer attributes and geometry (EPSG:4326, 2D).
+        field_mapping: {layer_field: api_field or None}.
+        parent_data: {row index: {parent id field: value}} from parent matching.
+        valid_indices: iterable of row indices that have a resolved parent.
+        optional_keys: layer columns copied as-is when they hold a truthy value.
+
+    Returns:
+        List of payload dicts in layer order.
+    """
+    if gdf is None or gdf.empty:
+        return []
+
+    valid_mask = gdf.index.isin(list(set(valid_indices)))
+    if not valid_mask.any():
+        return []
+    subset = gdf[valid_mask]
+    row_index = subset.index.tolist()
+    columns = subset.columns
+
+    converted = {}
+
+    def column_values(name):
+        if name not in converted:
+            converted[name] = column_to_json_values(subset[name])
+        return converted[name]
+
+    optional = [(key, column_values(key)) for key in optional_keys if key in columns]
+    mapped = []
+    for field, api_field in field_mapping.items():
+        if not api_field:
+            continue
+        if field in columns:
+            mapped.append((api_field, column_values(field), None))
+        else:
+            mapped.append((api_field, None, field))
+
+    try:
+        geometries = geometries_to_geojson(subset.geometry.values)
+    except AttributeError:
+        geometries = [None] * len(subset)
+
+    features = []
+    for pos, idx in enumerate(row_index):
+        feature = {}
+        for key, values in optional:
+            value = values[pos]
+            if value:
+                feature[key] = value
+
+        entity_data = parent_data.get(idx) or {}
+        for id_key in PARENT_ID_FIELDS:
+            if entity_data.get(id_key) is not None:
+                feature[id_key] = entity_data[id_key]
+
+        for api_field, values, entity_field in mapped:
+            if values is not None:
+                feature[api_field] = values[pos]
+            elif entity_field in entity_data:
+                feature[api_field] = scalar_to_json(entity_data[entity_field])
+
+        if geometries[pos] is not None:
+            feature["geom"] = geometries[pos]
+        feature["isApproved"] = True
+        features.append(feature)
+    return features
+
+
+def _to_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ("true", "1", "yes", "y")
+    return bool(value)
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def coercer_for_type(attr_type):
+    """Return a function converting a JSON-native value to an API attribute type, or None."""
+    attr_type = str(attr_type or "").lower()
+    if attr_type in ("boolean", "bool"):
+        return _to_bool
+    if attr_type in ("integer", "int", "number"):
+        return _to_int
+    if attr_type in ("float", "double", "decimal"):
+        return _to_float
+    return None
+
+
+_TRUE_STRINGS = ("true", "1", "yes", "y")
+
+
+def _with_missing(values, valid):
+    out = values.tolist() if hasattr(values, "tolist") else list(values)
+    for pos in np.flatnonzero(~valid):
+        out[pos] = None
+    return out
+
+
+def _text_mask(values):
+    return np.fromiter((isinstance(v, str) for v in values), dtype=bool, count=len(values))
+
+
+def _bool_column(series):
+    values = series.to_numpy(dtype=object)
+    valid = ~pd.isna(values)
+    is_text = _text_mask(values)
+    text = np.array([v.strip().lower() if isinstance(v, str) else "" for v in values], dtype=object)
+    valid &= ~(is_text & (text == ""))
+    flags = np.where(is_text, np.isin(text, _TRUE_STRINGS), np.where(valid, values, False).astype(bool))
+    return _with_missing(flags.astype(bool), valid)
+
+
+def _numeric_array(series):
+    if pd.api.types.is_bool_dtype(series.dtype):
+        series = series.astype("float64")
+    numbers = pd.to_numeric(series, errors="coerce")
+    return np.asarray(numbers.astype("float64"), dtype="float64")
+
+
+def _int_column(series):
+    dtype = series.dtype
+    if pd.api.types.is_integer_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype):
+        if not pd.api.types.is_extension_array_dtype(dtype):
+            return series.to_numpy().tolist()
+        return _with_missing(series.to_numpy(dtype=object), series.notna().to_numpy())
+    numbers = _numeric_array(series)
+    valid = np.isfinite(numbers)
+    out = _with_missing(np.trunc(np.where(valid, numbers, 0)).astype("int64"), valid)
+    if pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype):
+        # Text converts as int() does, so "12.5" and "1e3" are not integers.
+        values = series.to_numpy(dtype=object)
+        for pos in np.flatnonzero(_text_mask(values)):
+            out[pos] = _to_int(values[pos])
+    return out
+
+
+def _float_column(series):
+    numbers = _numeric_array(series)
+    return _with_missing(numbers, np.isfinite(numbers))
+
+
+def _json_column(series):
+    out = column_to_json_values(series)
+    if pd.api.types.is_object_dtype(series.dtype) or pd.api.types.is_string_dtype(series.dtype):
+        for pos, value in enumerate(out):
+            if isinstance(value, str) and not value.strip():
+                out[pos] = None
+    return out
+
+
+class CoercionPlan:
+    """Column-wise conversion of mapped layer fields to typed, JSON-ready API values.
+
+    Built once per entity and field mapping. ``apply`` turns each mapped
+    column of a frame into a list aligned with its rows; values that are
+    missing, blank or not convertible to the attribute type become None.
+    """
+
+    _CONVERTERS = {_to_bool: _bool_column, _to_int: _int_column, _to_float: _float_column}
+
+    def __init__(self, lookups, mapped_fields):
+        self.steps = [
+            (layer_field, api_field, self._CONVERTERS.get(lookups.coercers.get(api_field), _json_column))
+            for layer_field, api_field in mapped_fields
+        ]
+
+    def apply(self, frame):
+        """Return {api_field: [value per row]} for the rows of ``frame``."""
+        return {
+            api_field: convert(frame[layer_field])
+            for layer_field, api_field, convert in self.steps
+            if layer_field in frame.columns
+        }
+
+
+class EntityLookups:
+    """Per-entity lookups derived once from a /api/v1/models/list entry.
+
+    Attributes:
+        attributes: {attribute name: attribute metadata}.
+        writable: names of attributes not flagged read-only.
+        coercers: {attribute name: type conversion function} for typed attributes.
+    """
+
+    def __init__(self, entity):
+        self.model = entity.get("model", "")
+        self.attributes = {
+            attr.get("name"): attr
+            for attr in entity.get("attributes", [])
+            if attr.get("name")
+        }
+        self.writable = frozenset(
+            name for name, attr in self.attributes.items()
+            if not (attr.get("readOnly") or attr.get("readonly"))
+        )
+        self._plans = {}
+        self.coercers = {}
+        for name, attr in self.attributes.items():
+            coercer = coercer_for_type(attr.get("type"))
+            if coercer is not None:
+                self.coercers[name] = coercer
+
+    def coercion_plan(self, mapped_fields):
+        """Return the (cached) CoercionPlan for [(layer_field, api_field)] pairs."""
+        key = tuple(mapped_fields)
+        plan = self._plans.get(key)
+        if plan is None:
+            plan = self._plans[key] = CoercionPlan(self, key)
+        return plan
+
+
+def quantize_coordinates(coords, precision):
+    """Round a nested GeoJSON coordinate array to ``precision`` decimal places."""
+    if not coords:
+        return coords
+    first = coords[0]
+    if isinstance(first, (list, tuple)):
+        return [quantize_coordinates(part, precision) for part in coords]
+    return [round(value, precision) for value in coords]
+
+
+def quantize_geometry(geom, precision):
+    """Return a copy of a GeoJSON geometry dict with rounded coordinates."""
+    if not isinstance(geom, dict):
+        return geom
+    if geom.get("type") == "GeometryCollection":
+        return {
+            "type": "GeometryCollection",
+            "geometries": [quantize_geometry(part, precision) for part in geom.get("geometries", [])],
+        }
+    if "coordinates" not in geom:
+        return geom
+    return {"type": geom["type"], "coordinates": quantize_coordinates(geom["coordinates"], precision)}
+
+
+def dumps_json(payload):
+    """Serialise a payload to compact UTF-8 JSON, using orjson when it is installed."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+        except (TypeError, orjson.JSONEncodeError):
+            pass
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def content_hash(feature, exclude=("isApproved",)):
+    """SHA-1 of a payload dict's canonical JSON, ignoring keys in ``exclude``.
+
+    Used to tell whether a feature changed since it was last uploaded. The
+    standard json module is used on purpose so the hash does not depend on
+    whether orjson is installed.
+    """
+    content = {key: value for key, value in feature.items() if key not in exclude}
+    text = json.dumps(content, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def encode_upsert_body(payload, compress=False, precision=None, geometry_key="geom"):
+    """Encode an import/upsert payload for sending with ``requests.post(data=...)``.
+
+    Args:
+        payload: {"model": ..., "data": [feature dicts], ...}.
+        compress: gzip the body and set ``Content-Encoding: gzip``.
+        precision: decimal places kept in geometry coordinates, or None for full precision.
+
+    Returns:
+        EncodedBody(body, headers, json_size, full_size) where json_size is the
+        uncompressed size of what was sent and full_size the size of the
+        full-precision JSON (equal to json_size when no quantisation is applied).
+    """
+    full_size = None
+    if precision is not None and payload.get("data"):
+        full_size = len(dumps_json(payload))
+        payload = dict(payload)
+        payload["data"] = [
+            {**feature, geometry_key: quantize_geometry(feature[geometry_key], precision)}
+            if feature.get(geometry_key) is not None else feature
+            for feature in payload["data"]
+        ]
+
+    body = dumps_json(payload)
+    json_size = len(body)
+    headers = {"Content-Type": "application/json"}
+    if compress:
+        body = gzip.compress(body, compresslevel=6)
+        headers["Content-Encoding"] = "gzip"
+    return EncodedBody(body, headers, json_size, full_size if full_size is not None else json_size)
+
+
+def format_byte_size(size):
+    """Human-readable byte count for log messages."""
+    if size < 1024:
+        return f"{size} B"
+    if size < 1024 * 1024:
+        return f"{size / 1024:.1f} KB"
+    return f"{size / (1024 * 1024):.1f} MB"
@@ -0,0 +1,272 @@
+"""
+Fast conversion of QGIS vector layers to GeoDataFrames.
+
+File-backed OGR layers without pending edits are read directly with
+pyogrio. Any other layer is read once through the QGIS API, collecting
+WKB and attribute values. The WKB is decoded in bulk with shapely and the
+attributes become typed pandas columns.
+"""
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from PyQt5.QtCore import QVariant
+from qgis.core import QgsFeatureRequest, QgsFields, QgsProviderRegistry, QgsWkbTypes
+
+from .shapely_compat import VECTORIZED_SHAPELY
+
+try:
+    import pyogrio
+except ImportError:
+    pyogrio = None
+
+
+FID_COLUMN = "_qgis_fid"
+
+_INT_TYPES = {QVariant.Int, QVariant.UInt, QVariant.LongLong, QVariant.ULongLong}
+_FLOAT_TYPES = {QVariant.Double}
+
+
+def drop_z(geometries):
+    """Return 2D copies of an array/GeoSeries of geometries."""
+    values = np.asarray(geometries, dtype=object)
+    if VECTORIZED_SHAPELY:
+        return shapely.force_2d(values)
+    from shapely.ops import transform
+    return np.array(
+        [transform(lambda x, y, z=None: (x, y), geom) if geom is not None else None for geom in values],
+        dtype=object,
+    )
+
+
+def layer_crs(layer):
+    """CRS definition for a layer usable by geopandas/pyproj."""
+    crs = layer.crs()
+    srid = crs.postgisSrid()
+    if srid:
+        return f"EPSG:{srid}"
+    return crs.toWkt() or "EPSG:4326"
+
+
+def _plain_value(value):
+    if value is None:
+        return None
+    if isinstance(value, QVariant):
+        return None if value.isNull() else _plain_value(value.value())
+    if hasattr(value, "toPyDateTime"):
+        return value.toPyDateTime() if value.isValid() else None
+    if hasattr(value, "toPyDate"):
+        return value.toPyDate() if value.isValid() else None
+    if hasattr(value, "toPyTime"):
+        return value.toPyTime().isoformat() if value.isValid() else None
+    return value
+
+
+def _typed_column(values, field_type):
+    """Build a typed pandas array from raw QGIS attribute values."""
+    if field_type in _INT_TYPES:
+        try:
+            return pd.array([_plain_value(v) for v in values], dtype="Int64")
+        except (TypeError, ValueError):
+            pass
+    elif field_type in _FLOAT_TYPES:
+        return pd.to_numeric(
+            pd.Series([_plain_value(v) for v in values], dtype=object), errors="coerce"
+        ).to_numpy(dtype="float64")
+    elif field_type == QVariant.Bool:
+        return pd.array([_plain_value(v) for v in values], dtype="boolean")
+    elif field_type in (QVariant.Date, QVariant.DateTime):
+        return pd.to_datetime(pd.Series([_plain_value(v) for v in values], dtype=object), errors="coerce").to_numpy()
+
+    column = [_plain_value(v) for v in values]
+    return np.array(
+        [v if v is None or isinstance(v, (str, int, float, bool)) else str(v) for v in column],
+        dtype=object,
+    )
+
+
+def _ogr_source(layer):
+    """Return (path, layer name) when the layer can be read straight from its file."""
+    if pyogrio is None or layer.providerType() != "ogr":
+        return None
+    if layer.isModified() or layer.subsetString():
+        return None
+    fields = layer.fields()
+    if any(fields.fieldOrigin(i) != QgsFields.OriginProvider for i in range(fields.count())):
+        return None
+    parts = QgsProviderRegistry.instance().decodeUri("ogr", layer.source())
+    path = parts.get("path")
+    if not path:
+        return None
+    return path, parts.get("layerName") or None
+
+
+def _read_with_pyogrio(layer, source, include_fid):
+    path, layer_name = source
+    fields = layer.fields()
+    field_names = [field.name() for field in fields]
+    gdf = pyogrio.read_dataframe(path, layer=layer_name, fid_as_index=True)
+    # Primary keys such as a GeoPackage's fid are QGIS fields but OGR
+    # returns them as the feature id, not as a column.
+    for index in layer.dataProvider().pkAttributeIndexes():
+        name = fields.at(index).name()
+        if name not in gdf.columns:
+            gdf[name] = gdf.index.to_numpy()
+    if any(name not in gdf.columns for name in field_names):
+        return None
+    gdf = gdf[field_names + [gdf.geometry.name]]
+    if include_fid:
+        gdf[FID_COLUMN] = gdf.index.to_numpy()
+        gdf = gdf.reset_index(drop=True)
+    if gdf.crs is None:
+        gdf = gdf.set_crs(layer_crs(layer))
+    return gdf
+
+
+def _read_with_qgis(layer, include_fid):
+    fields = layer.fields()
+    field_names = [field.name() for field in fields]
+    columns = [[] for _ in field_names]
+    wkbs = []
+    fids = []
+
+    request = QgsFeatureRequest()
+    for feature in layer.getFeatures(request):
+        geom = feature.geometry()
+        if geom is None or geom.isNull():
+            wkbs.append(None)
+        else:
+            if QgsWkbTypes.isCurvedType(geom.wkbType()):
+                geom.convertToStraightSegment()
+            wkbs.append(bytes(geom.asWkb()))
+        for column, value in zip(columns, feature.attributes()):
+            column.append(value)
+        fids.append(feature.id())
+
+    if VECTORIZED_SHAPELY:
+        geometries = shapely.from_wkb(np.array(wkbs, dtype=object), on_invalid="ignore")
+    else:
+        from shapely import wkb as shapely_wkb
+        geometries = [shapely_wkb.loads(data) if data else None for data in wkbs]
+
+    data = {
+        name: _typed_column(column, fields.at(i).type())
+        for i, (name, column) in enumerate(zip(field_names, columns))
+    }
+    if include_fid:
+        data[FID_COLUMN] = np.array(fids, dtype="int64")
+    return gpd.GeoDataFrame(data, geometry=gpd.GeoSeries(geometries), crs=layer_crs(layer))
+
+
+def layer_to_gdf(layer, include_fid=False, target_epsg=4326):
+    """Read a QGIS vector layer into a 2D GeoDataFrame in ``target_epsg``.
+
+    With ``include_fid`` the QGIS feature id is kept in a ``_qgis_fid`` column.
+    """
+    gdf = None
+    source = _ogr_source(layer)
+    if source is not None:
+        try:
+            gdf = _read_with_pyogrio(layer, source, include_fid)
+        except Exception:
+            gdf = None
+    if gdf is None:
+        gdf = _read_with_qgis(layer, include_fid)
+
+    if gdf.geometry.name != "geometry":
+        gdf = gdf.rename_geometry("geometry")
+    if gdf.empty:
+        return gdf
+    gdf["geometry"] = drop_z(gdf.geometry.values)
+    if target_epsg is not None:
+        gdf = gdf.to_crs(epsg=target_epsg)
+    return gdf
+
+
+class LayerSnapshotCache:
+    """Keeps the last GeoDataFrame read from each layer until the layer changes.
+
+    Snapshots are keyed by layer id and target CRS and always carry the
+    ``_qgis_fid`` column, so one read serves callers with and without fids.
+    A snapshot is dropped as soon as the layer reports an edit, a commit or a
+    provider data change, and is also checked against the layer's edit state,
+    subset filter and CRS before being reused.
+    """
+
+    _INVALIDATING_SIGNALS = (
+        "layerModified",
+        "committedFeaturesAdded",
+        "committedFeaturesRemoved",
+        "committedAttributeValuesChanges",
+        "committedGeometriesChanges",
+        "dataChanged",
+        "subsetStringChanged",
+        "crsChanged",
+    )
+
+    def __init__(self):
+        self._snapshots = {}
+        self._connections = {}
+
+    @staticmethod
+    def _state(layer):
+        return (
+            layer.isModified(),
+            layer.featureCount(),
+            layer.subsetString(),
+            layer.crs().authid() or layer.crs().toWkt(),
+        )
+
+    def get(self, layer, include_fid=False, target_epsg=4326):
+        """Return a copy of the layer's GeoDataFrame, reading it only when needed."""
+        layer_id = layer.id()
+        key = (layer_id, target_epsg)
+        state = self._state(layer)
+        cached = self._snapshots.get(key)
+        if cached is None or cached[0] != state:
+            gdf = layer_to_gdf(layer, include_fid=True, target_epsg=target_epsg)
+            self._snapshots[key] = (state, gdf)
+            self._watch(layer)
+        else:
+            gdf = cached[1]
+
+        if include_fid or FID_COLUMN not in gdf.columns:
+            return gdf.copy()
+        return gdf.drop(columns=[FID_COLUMN])
+
+    def invalidate(self, layer_id):
+        for key in [key for key in self._snapshots if key[0] == layer_id]:
+            del self._snapshots[key]
+
+    def clear(self):
+        """Drop every snapshot and disconnect from all watched layers."""
+        self._snapshots.clear()
+        for layer, slots in list(self._connections.values()):
+            for name, slot in slots:
+                try:
+                    getattr(layer, name).disconnect(slot)
+                except (TypeError, RuntimeError):
+                    pass
+        self._connections.clear()
+
+    def _watch(self, layer):
+        layer_id = layer.id()
+        if layer_id in self._connections:
+            return
+        slots = []
+        for name in self._INVALIDATING_SIGNALS:
+            signal = getattr(layer, name, None)
+            if signal is None:
+                continue
+            slot = lambda *args, layer_id=layer_id: self.invalidate(layer_id)
+            signal.connect(slot)
+            slots.append((name, slot))
+
+        def forget(*args, layer_id=layer_id):
+            self.invalidate(layer_id)
+            self._connections.pop(layer_id, None)
+
+        layer.willBeDeleted.connect(forget)
+        slots.append(("willBeDeleted", forget))
+        self._connections[layer_id] = (layer, slots)
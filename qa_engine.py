@@ -0,0 +1,1538 @@
+"""
+QA/QC checks for File Geodatabase layers.
+
+Every check is a plain function of a GeoDataFrame and its parameters, and
+nothing in this module imports Qt or QGIS. That lets ``run_layer`` (read ->
+validate -> checks -> reports for one layer) run in a separate Python
+process. ``iter_layer_results`` sends the selected layers to a process
+pool and yields each layer's summary as soon as it finishes. The dialog
+only collects those summaries for the PDF report. Layers larger than
+``chunk_size`` features are read and checked in chunks, with a tiled pass
+for overlaps, so they never have to fit in memory at once. Other layers
+keep per-feature content hashes and findings in the output folder, so a
+re-run only checks what changed (LayerQAState).
+"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+from contextlib import nullcontext
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from rapidfuzz import process, utils
+from shapely.geometry import LineString, MultiLineString, Polygon, MultiPolygon, box
+from shapely.strtree import STRtree
+
+from .kesmis_cache import JsonStore
+from .shapely_compat import VECTORIZED_SHAPELY
+
+try:
+    import pyogrio
+except ImportError:
+    pyogrio = None
+
+try:
+    import pyarrow as pa
+    _PARQUET = True
+except ImportError:
+    _PARQUET = False
+
+try:
+    from shapely.validation import explain_validity, make_valid
+except ImportError:
+    def explain_validity(geom):
+        return "Invalid geometry"
+
+    def make_valid(geom):
+        if geom is None:
+            return None
+        try:
+            return geom.buffer(0)
+        except Exception:
+            return None
+
+
+METRIC_EPSG = 21037
+
+DEFAULT_PARAMS = {
+    "min_angle": 1,
+    "max_angle": 45,
+    "min_length": 10,
+    "overlap_tolerance": 0.01,
+    "duplicate_tolerance": 0,
+    "dictionary": None,
+    "excel": True,
+    "chunk_size": 250000,
+    "incremental": True,
+}
+
+SUMMARY_KEYS = (
+    "invalid_geometries",
+    "duplicates",
+    "overlaps",
+    "line_issues",
+    "short_lines",
+    "attribute_issues",
+)
+
+
+def repair_geometry(geom, tolerance=1e-8):
+    """Make a geometry valid and snap away precision noise; None if that fails."""
+    if geom is None:
+        return None
+    try:
+        if not geom.is_valid:
+            geom = make_valid(geom)
+            if geom is None:
+                return None
+        if hasattr(geom, "simplify"):
+            geom = geom.simplify(tolerance, preserve_topology=True)
+        if geom.is_valid and not geom.is_empty:
+            return geom
+        return None
+    except Exception:
+        try:
+            minx, miny, maxx, maxy = geom.bounds
+            return box(minx, miny, maxx, maxy)
+        except Exception:
+            return None
+
+
+GEOMETRY_NOTE_COLUMN = "_qa_geometry_note"
+
+
+def _repair_each(geometries, notes):
+    """Per-geometry repair for when bulk make_valid fails; updates both arrays in place."""
+    for i, geom in enumerate(geometries):
+        try:
+            fixed = repair_geometry(geom)
+        except Exception as exc:
+            notes[i] = f"Repair failed: {exc}"
+            continue
+        if fixed is None:
+            notes[i] = "Repair failed — geometry could not be fixed"
+        else:
+            geometries[i] = fixed
+
+
+def validate_geodataframe(gdf, tolerance=1e-8):
+    """Repair invalid geometries once for a whole layer.
+
+    Validity is tested and invalid geometries are repaired with bulk
+    shapely.is_valid / make_valid calls. Returns a copy of ``gdf`` with a
+    ``_qa_geometry_note`` column that describes every feature that is null,
+    empty or could not be repaired (None for the rest).
+    """
+    if "geometry" in gdf.columns and gdf.geometry.name != "geometry":
+        gdf = gdf.set_geometry("geometry", inplace=False)
+    gdf = gdf.copy()
+    geometries = np.array(gdf.geometry.values, dtype=object)
+    notes = np.full(len(geometries), None, dtype=object)
+
+    if VECTORIZED_SHAPELY:
+        missing = shapely.is_missing(geometries) | shapely.is_empty(geometries)
+        invalid = np.flatnonzero(~missing & ~shapely.is_valid(geometries))
+        notes[missing] = "Geometry is null or empty"
+        if len(invalid):
+            try:
+                fixed = shapely.simplify(shapely.make_valid(geometries[invalid]), tolerance, preserve_topology=True)
+                repaired = shapely.is_valid(fixed) & ~shapely.is_empty(fixed)
+                geometries[invalid[repaired]] = fixed[repaired]
+                notes[invalid[~repaired]] = "Repair failed — geometry could not be fixed"
+            except Exception:
+                subset, subset_notes = geometries[invalid], notes[invalid]
+                _repair_each(subset, subset_notes)
+                geometries[invalid], notes[invalid] = subset, subset_notes
+    else:
+        for i, geom in enumerate(geometries):
+            if geom is None or geom.is_empty:
+                notes[i] = "Geometry is null or empty"
+            elif not geom.is_valid:
+                _repair_each(geometries[i:i + 1], notes[i:i + 1])
+
+    gdf.geometry = gpd.GeoSeries(geometries, index=gdf.index, crs=gdf.crs)
+    gdf[GEOMETRY_NOTE_COLUMN] = pd.Series(notes, index=gdf.index, dtype=object)
+    return gdf
+
+
+def make_timezone_naive(gdf):
+    for col in gdf.columns:
+        if pd.api.types.is_datetime64_any_dtype(gdf[col]):
+            gdf[col] = gdf[col].dt.tz_localize(None)
+    return gdf
+
+
+def _safe_intersects(geom1, geom2):
+    try:
+        return geom1.intersects(geom2)
+    except Exception:
+        return False
+
+
+def _safe_intersection(geom1, geom2):
+    try:
+        return geom1.intersection(geom2)
+    except Exception:
+        return None
+
+
+def check_invalid_geometries(gdf, notes):
+    """Report features that validation flagged (``notes``) or that are still invalid."""
+    notes = np.asarray(notes, dtype=object)
+    flagged = pd.notna(notes)
+    geometries = np.asarray(gdf.geometry.values, dtype=object)
+    if VECTORIZED_SHAPELY:
+        still_invalid = ~flagged & ~shapely.is_valid(geometries) & ~shapely.is_missing(geometries)
+    else:
+        still_invalid = np.array(
+            [not f and geom is not None and not geom.is_valid for f, geom in zip(flagged, geometries)], dtype=bool
+        )
+
+    issue_details = [(int(i), "Repair Failed", notes[i], None, None) for i in np.flatnonzero(flagged)]
+    issue_details += [
+        (int(i), "Invalid Geometry", explain_validity(geometries[i]), None, None)
+        for i in np.flatnonzero(still_invalid)
+    ]
+    if issue_details:
+        issue_details.sort(key=lambda detail: detail[0])
+        return gdf.iloc[np.flatnonzero(flagged | still_invalid)], issue_details
+    return None, None
+
+
+_HASH_CHUNK = 20000
+
+
+def _geometry_digests(geometries, grid_size=None):
+    """Yield (position, digest) for non-empty geometries, hashing normalised WKB chunk by chunk.
+
+    Normalising makes ring start vertex and orientation irrelevant; with
+    ``grid_size`` coordinates are also snapped to that grid first. Only the
+    16-byte digests are kept, so memory does not grow with vertex count.
+    """
+    for start in range(0, len(geometries), _HASH_CHUNK):
+        chunk = geometries[start:start + _HASH_CHUNK]
+        if VECTORIZED_SHAPELY:
+            positions = np.flatnonzero(~(shapely.is_missing(chunk) | shapely.is_empty(chunk)))
+            geoms = chunk[positions]
+            if grid_size:
+                geoms = shapely.set_precision(geoms, grid_size)
+            blobs = shapely.to_wkb(shapely.normalize(geoms))
+        else:
+            positions = [i for i, geom in enumerate(chunk) if geom is not None and not geom.is_empty]
+            blobs = [chunk[i].normalize().wkb for i in positions]
+        for position, blob in zip(positions, blobs):
+            yield start + int(position), hashlib.blake2b(blob, digest_size=16).digest()
+
+
+def check_duplicate_geometries(gdf, grid_size=None, seen=None, offset=0):
+    """Find features with the same geometry.
+
+    Returns (duplicates_gdf, [(first position, duplicate position), ...]).
+    ``grid_size`` (metres, measured in EPSG:21037) treats geometries that
+    agree after snapping to that grid as duplicates. When a layer is checked
+    chunk by chunk, pass the same ``seen`` dict for every chunk and the
+    chunk's first layer position as ``offset``; pair positions are then
+    layer positions and a pair's first feature may lie in an earlier chunk.
+    """
+    geoms = gdf.geometry
+    if grid_size and gdf.crs is not None and gdf.crs != f"EPSG:{METRIC_EPSG}":
+        geoms = geoms.to_crs(epsg=METRIC_EPSG)
+    geometries = np.asarray(geoms.values, dtype=object)
+
+    duplicate_pairs = []
+    seen = {} if seen is None else seen
+    for position, digest in _geometry_digests(geometries, grid_size):
+        position += offset
+        first = seen.setdefault(digest, position)
+        if first != position:
+            duplicate_pairs.append((first, position))
+    if duplicate_pairs:
+        duplicate_positions = sorted({idx - offset for pair in duplicate_pairs for idx in pair if idx >= offset})
+        return gdf.iloc[duplicate_positions], duplicate_pairs
+    return None, None
+
+
+def check_duplicate_attributes(gdf, seen=None):
+    """Return the features whose attributes repeat an earlier feature's, or None.
+
+    The QA ``feature_id`` column is not compared. With a ``seen`` set the
+    check streams over chunks: only row hashes are kept between calls.
+    """
+    attr_columns = [col for col in gdf.columns if col not in ("geometry", "feature_id")]
+    if not attr_columns:
+        return None
+    if seen is None:
+        duplicates = gdf[gdf.duplicated(subset=attr_columns, keep=False)]
+        exact_duplicates = duplicates[duplicates.duplicated(subset=attr_columns, keep="first")]
+    else:
+        hashes = pd.util.hash_pandas_object(gdf[attr_columns], index=False)
+        repeated = hashes.duplicated(keep="first").to_numpy() | hashes.isin(seen).to_numpy()
+        seen.update(hashes.tolist())
+        exact_duplicates = gdf[repeated]
+    return exact_duplicates if not exact_duplicates.empty else None
+
+
+_POLYGON_TYPE_IDS = (3, 6)  # Polygon, MultiPolygon
+
+
+def _pair_intersection_areas(left, right):
+    """Intersection areas of geometry pairs; pairs that GEOS cannot intersect get 0."""
+    try:
+        return shapely.area(shapely.intersection(left, right))
+    except Exception:
+        areas = np.zeros(len(left))
+        for i, (geom1, geom2) in enumerate(zip(left, right)):
+            intersection = _safe_intersection(geom1, geom2)
+            if intersection is not None and not intersection.is_empty:
+                areas[i] = intersection.area
+        return areas
+
+
+def overlapping_pairs(geometries, tolerance=0.01, subset=None):
+    """Return (left, right, area) arrays for polygon pairs sharing more than ``tolerance`` area.
+
+    Positions refer to ``geometries``; each pair is reported once, with
+    left < right. Candidate pairs come from one bulk STRtree query and the
+    intersection areas are computed on the whole pair arrays. With
+    ``subset`` (positions) only pairs involving at least one of those
+    geometries are looked for.
+    """
+    geometries = np.asarray(geometries, dtype=object)
+    polygon_positions = np.flatnonzero(np.isin(shapely.get_type_id(geometries), _POLYGON_TYPE_IDS))
+    polygons = geometries[polygon_positions]
+    tree = STRtree(polygons)
+    if subset is None:
+        queried = np.arange(len(polygons))
+    else:
+        queried = np.flatnonzero(np.isin(polygon_positions, subset))
+    try:
+        left, right = tree.query(polygons[queried], predicate="intersects")
+    except Exception:
+        left, right = tree.query(polygons[queried])
+    left = queried[left]
+    if subset is None:
+        keep = left < right
+    else:
+        # Pairs within the subset are found from both sides; keep one.
+        keep = (left < right) | ((left > right) & ~np.isin(right, queried))
+    left, right = left[keep], right[keep]
+    left, right = polygon_positions[np.minimum(left, right)], polygon_positions[np.maximum(left, right)]
+
+    areas = _pair_intersection_areas(geometries[left], geometries[right])
+    mask = areas > tolerance
+    return left[mask], right[mask], areas[mask]
+
+
+def _overlapping_pairs_loop(geometries, tolerance):
+    tree = STRtree(list(geometries))
+    left, right, areas = [], [], []
+    for idx, geom in enumerate(geometries):
+        if not isinstance(geom, (Polygon, MultiPolygon)):
+            continue
+        for idx2 in tree.query(geom):
+            idx2 = int(idx2)
+            geom2 = geometries[idx2]
+            if idx2 <= idx or not isinstance(geom2, (Polygon, MultiPolygon)):
+                continue
+            if not _safe_intersects(geom, geom2):
+                continue
+            intersection = _safe_intersection(geom, geom2)
+            if intersection is not None and not intersection.is_empty and intersection.area > tolerance:
+                left.append(idx)
+                right.append(idx2)
+                areas.append(intersection.area)
+    return np.array(left, dtype=int), np.array(right, dtype=int), np.array(areas)
+
+
+def check_overlapping_polygons(gdf, tolerance=0.01):
+    if gdf.crs != f"EPSG:{METRIC_EPSG}":
+        gdf = gdf.to_crs(epsg=METRIC_EPSG)
+    geometries = np.asarray(gdf.geometry.values, dtype=object)
+    if VECTORIZED_SHAPELY:
+        left, right, areas = overlapping_pairs(geometries, tolerance)
+    else:
+        left, right, areas = _overlapping_pairs_loop(geometries, tolerance)
+    if len(left):
+        overlap_pairs = list(zip(left.tolist(), right.tolist(), areas.tolist()))
+        return gdf.iloc[np.union1d(left, right)], overlap_pairs
+    return None, None
+
+
+_LINE_TYPE_IDS = (1, 2, 5)  # LineString, LinearRing, MultiLineString
+
+
+def _turn_angles(coords, part_ids):
+    """Angle in degrees at every vertex of ``coords`` whose neighbours lie on the same part.
+
+    Returns (vertex positions, angles); the first and last vertex of each
+    part have no angle.
+    """
+    if len(coords) < 3:
+        return np.empty(0, dtype=int), np.empty(0)
+    same_part = (part_ids[:-2] == part_ids[1:-1]) & (part_ids[2:] == part_ids[1:-1])
+    vertices = np.flatnonzero(same_part) + 1
+    v1 = coords[vertices - 1] - coords[vertices]
+    v2 = coords[vertices + 1] - coords[vertices]
+    dot_product = np.einsum("ij,ij->i", v1, v2)
+    if coords.shape[1] == 2:
+        cross_product = np.abs(v1[:, 0] * v2[:, 1] - v1[:, 1] * v2[:, 0])
+    else:
+        cross_product = np.linalg.norm(np.cross(v1, v2), axis=1)
+    return vertices, np.degrees(np.arctan2(cross_product, dot_product))
+
+
+def _line_parts(geometries):
+    """Split line features into single parts; returns (parts, feature position of each part)."""
+    if VECTORIZED_SHAPELY:
+        line_positions = np.flatnonzero(np.isin(shapely.get_type_id(geometries), _LINE_TYPE_IDS))
+        parts, part_features = shapely.get_parts(geometries[line_positions], return_index=True)
+        return parts, line_positions[part_features]
+    parts, part_features = [], []
+    for idx, geom in enumerate(geometries):
+        if isinstance(geom, LineString):
+            parts.append(geom)
+            part_features.append(idx)
+        elif isinstance(geom, MultiLineString):
+            parts.extend(geom.geoms)
+            part_features.extend([idx] * len(geom.geoms))
+    return np.array(parts, dtype=object), np.array(part_features, dtype=int)
+
+
+def _part_coordinates(parts):
+    """All vertices of ``parts`` in one array, with the part index of each vertex."""
+    if VECTORIZED_SHAPELY:
+        include_z = bool(len(parts)) and bool(shapely.has_z(parts).any())
+        coords, part_ids = shapely.get_coordinates(parts, include_z=include_z, return_index=True)
+        if include_z:
+            coords[:, 2] = np.nan_to_num(coords[:, 2])
+        return coords, part_ids
+    arrays = [np.asarray(part.coords)[:, :2] for part in parts]
+    if not arrays:
+        return np.empty((0, 2)), np.empty(0, dtype=int)
+    part_ids = np.repeat(np.arange(len(arrays)), [len(a) for a in arrays])
+    return np.concatenate(arrays), part_ids
+
+
+def _self_intersection_details(idx, line):
+    try:
+        if line.is_simple:
+            return []
+        intersections = _safe_intersection(line, line)
+        if intersections is None:
+            return [(idx, "Invalid Line", "Could not test self-intersection", None, None)]
+        if intersections.geom_type == "Point":
+            return [(idx, "Self-Intersection", None, intersections.x, intersections.y)]
+        if intersections.geom_type == "MultiPoint":
+            return [(idx, "Self-Intersection", None, pt.x, pt.y) for pt in intersections.geoms]
+        return []
+    except Exception as exc:
+        return [(idx, "Invalid Line", str(exc), None, None)]
+
+
+def check_sharp_turns_self_intersections(gdf, min_angle, max_angle):
+    """Flag line vertices turning within [min_angle, max_angle] degrees, and self-intersections.
+
+    Turn angles are computed for every vertex of every line in one pass
+    over the layer's coordinate array. ``gdf`` must already be validated.
+    """
+    geometries = np.asarray(gdf.geometry.values, dtype=object)
+    parts, part_features = _line_parts(geometries)
+    coords, part_ids = _part_coordinates(parts)
+
+    vertices, angles = _turn_angles(coords, part_ids)
+    sharp = (angles >= min_angle) & (angles <= max_angle)
+    vertices, angles = vertices[sharp], np.round(angles[sharp], 2)
+    sharp_features = part_features[part_ids[vertices]]
+    sharp_details = list(zip(
+        sharp_features.tolist(),
+        ["Sharp Turn"] * len(vertices),
+        angles.tolist(),
+        coords[vertices, 0].tolist(),
+        coords[vertices, 1].tolist(),
+    ))
+
+    if VECTORIZED_SHAPELY and len(parts):
+        try:
+            candidates = np.flatnonzero(~shapely.is_simple(parts))
+        except Exception:
+            candidates = range(len(parts))
+    else:
+        candidates = range(len(parts))
+    intersection_details = []
+    for part in candidates:
+        intersection_details.extend(_self_intersection_details(int(part_features[part]), parts[part]))
+
+    issue_details = sorted(sharp_details + intersection_details, key=lambda detail: detail[0])
+    if issue_details:
+        issue_positions = sorted({detail[0] for detail in issue_details})
+        return gdf.iloc[issue_positions], issue_details
+    return None, None
+
+
+def check_short_linear_features(gdf, min_length):
+    if gdf.crs != f"EPSG:{METRIC_EPSG}":
+        gdf = gdf.to_crs(epsg=METRIC_EPSG)
+    short_positions = []
+    short_features = []
+    for pos, geom in enumerate(gdf.geometry):
+        if isinstance(geom, (LineString, MultiLineString)) and geom.length < min_length:
+            short_positions.append(pos)
+            short_features.append((gdf["feature_id"].iloc[pos], geom.length))
+    if short_features:
+        return gdf.iloc[short_positions], short_features
+    return None, None
+
+
+_TYPE_MAPPING = {
+    "String": "object",
+    "text": "object",
+    "Integer": "int64",
+    "Float": "float64",
+    "decimal": "float64",
+    "Boolean": "bool",
+    "Date": "datetime64[ns]",
+    "Array": "object",
+}
+_GEOMETRY_TYPES = ("point", "linestring", "polygon")
+
+QA_CACHE_DIR = os.path.join(os.path.expanduser("~/Documents"), "ODK_Data", "qa_cache")
+DICTIONARY_CACHE_VERSION = 2
+
+
+def _file_sha1(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _plain(value):
+    return None if pd.isna(value) else value
+
+
+def _optional_float(value):
+    value = _plain(value)
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _optional_text(value):
+    value = _plain(value)
+    return str(value).strip() or None if value is not None else None
+
+
+def compile_sheet(specs_df):
+    """Turn one dictionary sheet into a list of field specs, or None without Attribute/Type columns.
+
+    Each spec is a plain dict (field, type, dtype, geometry, options,
+    max_length, min, max, pattern, condition) so compiled dictionaries can
+    be stored as JSON and sent to worker processes. The optional sheet
+    columns Min/Max (numeric range), Pattern (regular expression the whole
+    value must match) and Condition (a pandas expression over the layer's
+    fields that must hold wherever the field has a value, e.g.
+    ``floors >= 1`` or ``end_date >= start_date``) add extra rules.
+    """
+    if not all(col in specs_df.columns for col in ("Attribute", "Type")):
+        return None
+    specs = []
+    for row in specs_df.to_dict("records"):
+        field, expected_type = _plain(row.get("Attribute")), _plain(row.get("Type"))
+        if field is None or expected_type is None:
+            continue
+        expected_type = str(expected_type)
+        options = _plain(row.get("Options"))
+        if isinstance(options, str):
+            options = [v.strip() for v in options.split(",") if v.strip()] or None
+        else:
+            options = None
+        max_length = _plain(row.get("LEN"))
+        if expected_type.lower() not in ("string", "text"):
+            max_length = None
+        specs.append({
+            "field": str(field),
+            "type": expected_type,
+            "dtype": _TYPE_MAPPING.get(expected_type, expected_type),
+            "geometry": expected_type.lower() in _GEOMETRY_TYPES,
+            "options": options,
+            "max_length": float(max_length) if max_length is not None else None,
+            "min": _optional_float(row.get("Min")),
+            "max": _optional_float(row.get("Max")),
+            "pattern": _optional_text(row.get("Pattern")),
+            "condition": _optional_text(row.get("Condition")),
+        })
+    return specs
+
+
+def load_attribute_dictionary(excel_file, cache_path=None):
+    """Return {sheet name: compiled specs or None} for the dictionary workbook.
+
+    The workbook is parsed once and the compiled specs are stored as JSON
+    under ~/Documents/ODK_Data/qa_cache. Later runs reuse them while the
+    file's size and modification time are unchanged, or while its SHA-1 still
+    matches after it was touched. Returns None when there is no workbook.
+    """
+    if not excel_file or not os.path.exists(excel_file):
+        return None
+    store = JsonStore(cache_path or os.path.join(QA_CACHE_DIR, "dictionary.json"))
+    stat = os.stat(excel_file)
+    source = {"path": os.path.abspath(excel_file), "size": stat.st_size, "mtime": stat.st_mtime}
+    cached = store.data
+    if cached.get("version") == DICTIONARY_CACHE_VERSION and cached.get("path") == source["path"]:
+        if cached.get("size") == source["size"] and cached.get("mtime") == source["mtime"]:
+            return cached["sheets"]
+        sha1 = _file_sha1(excel_file)
+        if cached.get("sha1") == sha1:
+            store.data.update(source)
+            store.save()
+            return cached["sheets"]
+    else:
+        sha1 = _file_sha1(excel_file)
+
+    workbook = pd.read_excel(excel_file, sheet_name=None, engine="openpyxl")
+    sheets = {
+        name: compile_sheet(specs_df)
+        for name, specs_df in workbook.items()
+        if name.lower() != "how to"
+    }
+    store.data = {"version": DICTIONARY_CACHE_VERSION, "sha1": sha1, **source, "sheets": sheets}
+    store.save()
+    return sheets
+
+
+def match_dictionary_sheet(layer_name, dictionary, score_cutoff=70):
+    """Return (sheet name, score) of the dictionary sheet best matching a layer name, or None."""
+    # default_process lowercases and strips punctuation, as fuzzywuzzy did.
+    match = process.extractOne(
+        layer_name, list(dictionary), processor=utils.default_process, score_cutoff=score_cutoff
+    )
+    return (match[0], match[1]) if match else None
+
+
+ATTRIBUTE_ISSUE_COLUMNS = ["FeatureIndex", "IssueType", "Description", "x", "y"]
+
+
+def _describe(prefix, values, suffix=""):
+    """Vectorised f"{prefix}{value}{suffix}" over a Series."""
+    return prefix + values.astype(str) + suffix
+
+
+def _field_rules(gdf, spec):
+    """Yield (issue type, violation mask, description) for each rule of one field spec.
+
+    ``description`` is a string or a Series aligned with ``gdf``.
+    """
+    field = spec["field"]
+    column = gdf[field]
+    present = column.notna()
+
+    yield "Missing Value", ~present, f"Field {field} is required but has missing value"
+
+    valid_values = spec["options"]
+    if valid_values:
+        yield (
+            "Invalid Value",
+            present & ~column.isin(valid_values),
+            _describe(f"Field {field} has invalid value ", column, f", expected one of {valid_values}"),
+        )
+
+    max_length = spec["max_length"]
+    if max_length is not None:
+        yield (
+            "Exceeds Max Length",
+            (column.str.len() > max_length).fillna(False).astype(bool),
+            _describe(f"Field {field} value ", column, f" exceeds max length {max_length}"),
+        )
+
+    minimum, maximum = spec.get("min"), spec.get("max")
+    if minimum is not None or maximum is not None:
+        numbers = pd.to_numeric(column, errors="coerce")
+        outside = numbers.isna()
+        if minimum is not None:
+            outside |= numbers < minimum
+        if maximum is not None:
+            outside |= numbers > maximum
+        bounds = "[{}, {}]".format("" if minimum is None else minimum, "" if maximum is None else maximum)
+        yield (
+            "Out Of Range",
+            present & outside,
+            _describe(f"Field {field} value ", column, f" is outside the range {bounds}"),
+        )
+
+    if spec.get("pattern"):
+        matches = column.astype(str).str.fullmatch(spec["pattern"])
+        yield (
+            "Pattern Mismatch",
+            present & ~matches.fillna(False).astype(bool),
+            _describe(f"Field {field} value ", column, f" does not match pattern {spec['pattern']}"),
+        )
+
+    if spec.get("condition"):
+        holds = pd.Series(gdf.drop(columns="geometry").eval(spec["condition"]), index=gdf.index)
+        yield (
+            "Condition Failed",
+            present & ~holds.fillna(False).astype(bool),
+            _describe(f"Field {field} value ", column, f" fails condition {spec['condition']}"),
+        )
+
+
+def check_attributes(gdf, layer_name, dictionary, log):
+    """Validate attributes against the dictionary sheet that best matches the layer name.
+
+    Every rule is evaluated as a boolean mask over the whole column and the
+    violations are emitted as one DataFrame (ATTRIBUTE_ISSUE_COLUMNS) per
+    rule, concatenated at the end. ``dictionary`` is the result of
+    load_attribute_dictionary. Returns (issues_gdf, issues_df, matched):
+    ``issues_gdf`` holds only the features a rule flagged (layer-wide
+    findings appear in ``issues_df`` alone) and ``matched`` is False when
+    the layer has no sheet in the dictionary.
+    """
+    if not dictionary:
+        log(f"No Excel file available for attribute validation of layer {layer_name}.")
+        return None, None, False
+
+    match = match_dictionary_sheet(layer_name, dictionary)
+    if not match:
+        log(f"No matching sheet found for layer {layer_name} (similarity score below 70).")
+        return None, None, False
+    matched_sheet, score = match
+    log(f"Matched layer {layer_name} to sheet {matched_sheet} with similarity score {round(score)}")
+    specs = dictionary[matched_sheet]
+    if specs is None:
+        log(f"Sheet {matched_sheet} missing required columns: ['Attribute', 'Type']")
+        return None, None, True
+
+    gdf_columns = [col for col in gdf.columns if col != "geometry"]
+    layer_issues = []
+    missing_fields = [spec["field"] for spec in specs if spec["field"] not in gdf_columns and not spec["geometry"]]
+    if missing_fields:
+        layer_issues.append(("Missing Fields", f"Required fields missing: {', '.join(missing_fields)}"))
+
+    frames = []
+    flagged = np.zeros(len(gdf), dtype=bool)
+    for spec in specs:
+        field = spec["field"]
+        if spec["geometry"]:
+            continue
+        if field not in gdf_columns:
+            layer_issues.append(("Missing Field", f"Field {field} is required but missing"))
+            continue
+        actual_type = str(gdf[field].dtype)
+        if actual_type != spec["dtype"]:
+            layer_issues.append(("Incorrect Data Type", f"Field {field} has type {actual_type}, expected {spec['dtype']}"))
+        try:
+            for issue_type, mask, description in _field_rules(gdf, spec):
+                mask = np.asarray(mask, dtype=bool)
+                if not mask.any():
+                    continue
+                flagged |= mask
+                frames.append(pd.DataFrame({
+                    "FeatureIndex": gdf.index[mask],
+                    "IssueType": issue_type,
+                    "Description": description[mask].to_numpy() if isinstance(description, pd.Series) else description,
+                }))
+        except Exception as exc:
+            layer_issues.append(("Invalid Rule", f"Rules for field {field} could not be evaluated: {exc}"))
+
+    if layer_issues:
+        frames.insert(0, pd.DataFrame({
+            "FeatureIndex": -1,
+            "IssueType": [issue_type for issue_type, _ in layer_issues],
+            "Description": [description for _, description in layer_issues],
+        }))
+    if not frames:
+        return None, None, True
+
+    issues = pd.concat(frames, ignore_index=True)
+    issues["x"] = None
+    issues["y"] = None
+    issues = issues[ATTRIBUTE_ISSUE_COLUMNS]
+    return (gdf.iloc[np.flatnonzero(flagged)] if flagged.any() else None), issues, True
+
+
+ISSUE_GPKG = "qa_issues.gpkg"
+EXCEL_ROW_LIMIT = 1048575
+
+# Issue layers from every worker process go into the same GeoPackage, so
+# writes to it are serialised with a lock handed to each worker at start-up.
+_gpkg_lock = None
+
+
+def _init_worker(lock):
+    global _gpkg_lock
+    _gpkg_lock = lock
+
+
+def prepare_output_folder(output_folder):
+    """Create the output folder and remove the previous run's issue GeoPackage."""
+    os.makedirs(output_folder, exist_ok=True)
+    path = os.path.join(output_folder, ISSUE_GPKG)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _write_issue_layer(gdf, output_folder, name):
+    """Write (or replace) one issue layer in the run's GeoPackage."""
+    path = os.path.join(output_folder, ISSUE_GPKG)
+    with _gpkg_lock or nullcontext():
+        gdf.to_file(path, layer=name, driver="GPKG")
+
+
+def _write_table(df, output_folder, name):
+    """Write a table as Parquet when pyarrow is available, CSV otherwise. Returns the file name."""
+    base = os.path.join(output_folder, name)
+    if _PARQUET:
+        try:
+            df.to_parquet(f"{base}.parquet", index=False)
+            return f"{name}.parquet"
+        except (TypeError, ValueError, ImportError, pa.ArrowException):
+            pass
+    df.to_csv(f"{base}.csv", index=False)
+    return f"{name}.csv"
+
+
+def _write_excel(filepath, sheets):
+    """Write Excel output, replacing any existing file."""
+    if os.path.exists(filepath):
+        os.remove(filepath)
+    with pd.ExcelWriter(filepath, engine="xlsxwriter", mode="w") as writer:
+        for sheet_name, dataframe in sheets.items():
+            dataframe.to_excel(writer, sheet_name=sheet_name, index=False)
+
+
+def _with_feature_ids(details_df, columns):
+    # feature_id is always the layer position + 1.
+    details_df["feature_id"] = details_df["FeatureIndex"] + 1
+    return details_df[["feature_id", "FeatureIndex"] + columns]
+
+
+def _issue_tables(results):
+    """Return {table name: (sheet title, DataFrame)} for the checks that found something."""
+    issue_columns = ["FeatureIndex", "IssueType", "Description", "x", "y"]
+    tables = {}
+
+    invalid_geom_details = results["invalid geometries"][1]
+    if invalid_geom_details:
+        tables["invalid_geometries"] = ("Invalid Geometries", _with_feature_ids(
+            pd.DataFrame(invalid_geom_details, columns=issue_columns), issue_columns[1:]
+        ))
+
+    duplicate_pairs = results["duplicate geometries"][1]
+    if duplicate_pairs:
+        pairs_df = pd.DataFrame(duplicate_pairs, columns=["Feature1", "Feature2"])
+        pairs_df[["Feature1", "Feature2"]] = np.sort(pairs_df[["Feature1", "Feature2"]], axis=1)
+        tables["duplicates"] = ("Duplicate Pairs", pairs_df.drop_duplicates())
+
+    overlap_pairs = results["overlapping polygons"][1]
+    if overlap_pairs:
+        tables["overlaps"] = ("Overlap Pairs", pd.DataFrame(
+            overlap_pairs, columns=["Feature1", "Feature2", "Overlap Area (m²)"]
+        ))
+
+    line_issue_details = results["line issues"][1]
+    if line_issue_details:
+        columns = ["FeatureIndex", "IssueType", "Angle", "x", "y"]
+        tables["line_issues"] = ("Line Issues", _with_feature_ids(
+            pd.DataFrame(line_issue_details, columns=columns), columns[1:]
+        ))
+
+    short_line_details = results["short lines"][1]
+    if short_line_details:
+        tables["short_lines"] = ("Short Lines", pd.DataFrame(short_line_details, columns=["FeatureID", "Length (m)"]))
+
+    attribute_issue_details = results["attributes"][1]
+    if attribute_issue_details is not None and len(attribute_issue_details):
+        details_df = attribute_issue_details.copy()
+        feature_index = details_df["FeatureIndex"].to_numpy()
+        details_df["feature_id"] = pd.Series(feature_index + 1, dtype="Int64").mask(feature_index < 0)
+        tables["attribute_issues"] = ("Attribute Issues", details_df[["feature_id"] + issue_columns])
+    return tables
+
+
+_ISSUE_LAYERS = (
+    ("invalid geometries", "invalid_geometries"),
+    ("duplicate geometries", "duplicate_geometries"),
+    ("duplicate attributes", "duplicate_attributes"),
+    ("overlapping polygons", "overlapping_polygons"),
+    ("line issues", "line_issues"),
+    ("short lines", "short_lines"),
+    ("attributes", "attribute_issues"),
+)
+
+
+def features_table(gdf):
+    """The layer's attribute table with feature_id first, as written to <layer>_features."""
+    all_features_df = pd.DataFrame(gdf.drop(columns="geometry"))
+    return all_features_df[["feature_id"] + [col for col in all_features_df.columns if col != "feature_id"]]
+
+
+def write_layer_reports(gdf, layer, results, output_folder, excel=True):
+    """Write one layer's check results.
+
+    Issue features become ``<layer>_<issue>`` layers of the run's
+    qa_issues.gpkg. Each issue table and the layer's attribute table are
+    written once as Parquet (CSV without pyarrow). With ``excel`` a single
+    <layer>_qa.xlsx workbook also holds every issue table and the attribute
+    table; tables longer than Excel's row limit are left out of it.
+    ``gdf`` is None when the attribute table was already streamed to
+    <layer>_features.csv by a chunked run.
+    Returns the list of files written besides the GeoPackage.
+    """
+    for check_name, issue_name in _ISSUE_LAYERS:
+        result = results[check_name]
+        issues_gdf = result if check_name == "duplicate attributes" else result[0]
+        if issues_gdf is not None:
+            _write_issue_layer(issues_gdf, output_folder, f"{layer}_{issue_name}")
+
+    tables = _issue_tables(results)
+    if not tables:
+        return []
+    written = []
+    sheets = {title: df for title, df in tables.values() if len(df) <= EXCEL_ROW_LIMIT}
+    if gdf is not None:
+        all_features_df = features_table(gdf)
+        written.append(_write_table(all_features_df, output_folder, f"{layer}_features"))
+        if len(all_features_df) <= EXCEL_ROW_LIMIT:
+            sheets["All Features"] = all_features_df
+    written += [_write_table(df, output_folder, f"{layer}_{name}") for name, (_, df) in tables.items()]
+    if excel:
+        excel_file = f"{layer}_qa.xlsx"
+        _write_excel(os.path.join(output_folder, excel_file), sheets)
+        written.append(excel_file)
+    return written
+
+
+QA_STATE_DIR = "qa_state"
+QA_STATE_VERSION = 1
+
+# Checks whose findings for a feature depend on that feature alone.
+_PER_FEATURE_CHECKS = ("invalid geometries", "line issues", "short lines", "attributes")
+
+
+def feature_hashes(gdf):
+    """Content hash of every feature (geometry and attribute values), as hex strings.
+
+    Geometries are hashed as normalised WKB, so rewriting a feature without
+    changing it keeps its hash. The QA feature_id column is not included.
+    """
+    geometries = np.asarray(gdf.geometry.values, dtype=object)
+    geometry_digests = [b""] * len(gdf)
+    for position, digest in _geometry_digests(geometries):
+        geometry_digests[position] = digest
+    attr_columns = [col for col in gdf.columns if col not in (gdf.geometry.name, "feature_id")]
+    if attr_columns:
+        attribute_hashes = pd.util.hash_pandas_object(gdf[attr_columns], index=False).to_numpy()
+    else:
+        attribute_hashes = np.zeros(len(gdf), dtype=np.uint64)
+    return [
+        hashlib.blake2b(digest + int(value).to_bytes(8, "little"), digest_size=12).hexdigest()
+        for digest, value in zip(geometry_digests, attribute_hashes)
+    ]
+
+
+def _state_settings(gdf, layer, params):
+    """Digest of everything besides feature content that the findings depend on."""
+    match = match_dictionary_sheet(layer, params["dictionary"]) if params["dictionary"] else None
+    settings = {
+        "version": QA_STATE_VERSION,
+        "params": {key: params[key] for key in (
+            "min_angle", "max_angle", "min_length", "overlap_tolerance", "duplicate_tolerance"
+        )},
+        "schema": [(str(col), str(dtype)) for col, dtype in gdf.dtypes.items()],
+        "crs": str(gdf.crs),
+        "sheet": [match[0], params["dictionary"][match[0]]] if match else None,
+    }
+    text = json.dumps(settings, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _finding_rows(check_name, result, positions):
+    """Per-feature findings of a check as (layer position, *fields) tuples.
+
+    ``positions`` maps the positions the check reported (it may have run on
+    a subset of the layer) to layer positions. Layer-wide attribute
+    findings are not included.
+    """
+    _, details = result
+    if details is None:
+        return []
+    if check_name == "short lines":
+        return [(int(feature_id) - 1, length) for feature_id, length in details]
+    if check_name == "attributes":
+        rows = details[details["FeatureIndex"] >= 0]
+        return list(zip(rows["FeatureIndex"].tolist(), rows["IssueType"].tolist(), rows["Description"].tolist()))
+    return [(int(positions[detail[0]]),) + tuple(detail[1:]) for detail in details]
+
+
+def _result_from_rows(check_name, rows, gdf, result):
+    """Rebuild a per-feature check result for the whole layer from finding rows.
+
+    ``result`` is the check's result on the changed features; its
+    layer-wide attribute findings are kept.
+    """
+    rows = sorted(rows, key=lambda row: row[0])
+    if check_name == "attributes":
+        _, details = result
+        layer_rows = details[details["FeatureIndex"] < 0] if details is not None else None
+        frames = [layer_rows, pd.DataFrame(rows, columns=["FeatureIndex", "IssueType", "Description"])]
+        frames = [frame for frame in frames if frame is not None and len(frame)]
+        if not frames:
+            return None, None
+        issues = pd.concat(frames, ignore_index=True)
+        issues["x"] = None
+        issues["y"] = None
+        flagged = gdf.iloc[sorted({row[0] for row in rows})] if rows else None
+        return flagged, issues[ATTRIBUTE_ISSUE_COLUMNS]
+    if not rows:
+        return None, None
+    issues = gdf.iloc[sorted({row[0] for row in rows})]
+    if check_name == "short lines":
+        if issues.crs != f"EPSG:{METRIC_EPSG}":
+            issues = issues.to_crs(epsg=METRIC_EPSG)
+        return issues, [(position + 1, length) for position, length in rows]
+    return issues, [tuple(row) for row in rows]
+
+
+def _merge_overlaps(gdf, positions, carried, tolerance):
+    """Overlap check that only looks for pairs involving ``positions``, plus ``carried`` pairs."""
+    if gdf.crs != f"EPSG:{METRIC_EPSG}":
+        gdf = gdf.to_crs(epsg=METRIC_EPSG)
+    left, right, areas = overlapping_pairs(np.asarray(gdf.geometry.values, dtype=object), tolerance, subset=positions)
+    overlap_pairs = sorted(list(zip(left.tolist(), right.tolist(), areas.tolist())) + carried)
+    if overlap_pairs:
+        involved = sorted({position for pair in overlap_pairs for position in pair[:2]})
+        return gdf.iloc[involved], overlap_pairs
+    return None, None
+
+
+class LayerQAState(JsonStore):
+    """What the last QA run found in one layer, kept in <output>/qa_state.
+
+    Findings are stored against feature content hashes rather than
+    positions, so features keep their findings when others are added or
+    removed. A feature is re-checked when its hash is new, or when the
+    number of features sharing its hash changed. Per-feature findings and
+    overlaps between two unchanged features are carried forward; overlaps
+    are looked for again around every changed feature. Duplicate checks
+    only hash geometries and rows, so they always run on the whole layer.
+    The state is dropped when the settings digest (check parameters,
+    layer schema and CRS, dictionary sheet) differs from the stored one.
+    """
+
+    def __init__(self, output_folder, layer, settings):
+        super().__init__(os.path.join(output_folder, QA_STATE_DIR, f"{layer}.json"))
+        if self.data.get("settings") != settings:
+            self.data = {}
+        self.settings = settings
+
+    def changed(self, hashes):
+        """Boolean array: True for features that must be checked again."""
+        previous = self.data.get("hashes") or {}
+        counts = pd.Series(hashes, dtype=object).value_counts().to_dict()
+        return np.array([previous.get(digest) != counts[digest] for digest in hashes], dtype=bool)
+
+    @staticmethod
+    def unchanged_positions(hashes, changed):
+        """{hash: layer positions} of the features that are not checked again."""
+        positions = {}
+        for position in np.flatnonzero(~changed).tolist():
+            positions.setdefault(hashes[position], []).append(position)
+        return positions
+
+    def carried_findings(self, check_name, positions):
+        """Stored findings of a per-feature check for the unchanged features, as rows.
+
+        ``positions`` is the unchanged_positions mapping.
+        """
+        rows = []
+        for digest, *fields in self.data.get("findings", {}).get(check_name, []):
+            rows.extend((position, *fields) for position in positions.get(digest, ()))
+        return rows
+
+    def carried_overlaps(self, positions):
+        """Stored overlap pairs between unchanged features, as (left, right, area)."""
+        pairs = []
+        for digest1, digest2, area in self.data.get("overlaps", []):
+            if digest1 == digest2:
+                same = positions.get(digest1, [])
+                pairs.extend((a, b, area) for i, a in enumerate(same) for b in same[i + 1:])
+            else:
+                pairs.extend(
+                    (min(a, b), max(a, b), area)
+                    for a in positions.get(digest1, ()) for b in positions.get(digest2, ())
+                )
+        return pairs
+
+    def update(self, hashes, results):
+        """Replace the stored state with this run's hashes and findings, and save."""
+        counts = pd.Series(hashes, dtype=object).value_counts().to_dict()
+        first = {}
+        for position, digest in enumerate(hashes):
+            first.setdefault(digest, position)
+        identity = np.arange(len(hashes))
+        findings = {
+            check_name: [
+                [hashes[row[0]], *row[1:]]
+                for row in _finding_rows(check_name, results[check_name], identity)
+                if first[hashes[row[0]]] == row[0]
+            ]
+            for check_name in _PER_FEATURE_CHECKS
+        }
+        overlaps = {}
+        for left, right, area in results["overlapping polygons"][1] or []:
+            overlaps.setdefault(tuple(sorted((hashes[left], hashes[right]))), area)
+        data = {
+            "settings": self.settings,
+            "hashes": {digest: int(count) for digest, count in counts.items()},
+            "findings": findings,
+            "overlaps": [[digest1, digest2, area] for (digest1, digest2), area in overlaps.items()],
+        }
+        if data != self.data:
+            self.data = data
+            self.save()
+
+
+def _prepare_features(gdf, offset=0):
+    """Validate freshly read features and number them from ``offset`` + 1.
+
+    Returns (gdf, geometry notes); checks and reports see the layer's own
+    columns plus feature_id only.
+    """
+    gdf = validate_geodataframe(gdf)
+    geometry_notes = gdf.pop(GEOMETRY_NOTE_COLUMN)
+    gdf["feature_id"] = np.arange(offset + 1, offset + len(gdf) + 1)
+    return make_timezone_naive(gdf), geometry_notes
+
+
+def _run_checks(checks, layer, log):
+    """Run (name, function) checks. Returns (results, names of the checks that failed)."""
+    results = {}
+    failed = []
+    for check_name, check_func in checks:
+        try:
+            results[check_name] = check_func()
+        except Exception as exc:
+            log(f"Layer {layer}: {check_name} check skipped due to error: {exc}")
+            results[check_name] = None if check_name == "duplicate attributes" else (None, None)
+            failed.append(check_name)
+    return results, failed
+
+
+def _check_layer(gdb_path, layer, output_folder, params, log, outcome):
+    """Check a layer read into memory in one piece. Returns (gdf, results).
+
+    With ``incremental`` only features whose content changed since the
+    last run of the same settings are checked; see LayerQAState.
+    """
+    raw = gpd.read_file(gdb_path, layer=layer)
+    gdf, geometry_notes = _prepare_features(raw)
+    outcome["features"] = len(gdf)
+
+    state = None
+    changed = np.ones(len(gdf), dtype=bool)
+    if params["incremental"]:
+        hashes = feature_hashes(raw)
+        state = LayerQAState(output_folder, layer, _state_settings(raw, layer, params))
+        changed = state.changed(hashes)
+    del raw
+    positions = np.flatnonzero(changed)
+    partial = len(positions) < len(gdf)
+    subset = gdf.iloc[positions] if partial else gdf
+    subset_notes = geometry_notes.iloc[positions] if partial else geometry_notes
+    if partial:
+        unchanged = state.unchanged_positions(hashes, changed)
+        log(
+            f"Layer {layer}: {len(positions)} of {len(gdf)} feature(s) new or changed since the last run; "
+            f"findings for the rest carried forward."
+        )
+
+    def attributes():
+        issues, details, matched = check_attributes(subset, layer, params["dictionary"], log)
+        outcome["unmatched"] = not matched
+        return issues, details
+
+    def overlaps():
+        if not partial or not VECTORIZED_SHAPELY:
+            return check_overlapping_polygons(gdf, params["overlap_tolerance"])
+        return _merge_overlaps(gdf, positions, state.carried_overlaps(unchanged), params["overlap_tolerance"])
+
+    checks = [
+        ("invalid geometries", lambda: check_invalid_geometries(subset, subset_notes)),
+        ("duplicate geometries", lambda: check_duplicate_geometries(gdf, params["duplicate_tolerance"])),
+        ("duplicate attributes", lambda: check_duplicate_attributes(gdf)),
+        ("overlapping polygons", overlaps),
+        ("line issues", lambda: check_sharp_turns_self_intersections(subset, params["min_angle"], params["max_angle"])),
+        ("short lines", lambda: check_short_linear_features(subset, params["min_length"])),
+        ("attributes", attributes),
+    ]
+    results, failed = _run_checks(checks, layer, log)
+
+    if partial:
+        for check_name in _PER_FEATURE_CHECKS:
+            if check_name not in failed:
+                rows = _finding_rows(check_name, results[check_name], positions)
+                rows += state.carried_findings(check_name, unchanged)
+                results[check_name] = _result_from_rows(check_name, rows, gdf, results[check_name])
+    if state is not None:
+        if failed:
+            state.clear()
+        else:
+            state.update(hashes, results)
+    return gdf, results
+
+
+def layer_feature_count(gdb_path, layer):
+    """Feature count from the layer metadata, or None when it cannot be read cheaply."""
+    if pyogrio is None:
+        return None
+    try:
+        count = pyogrio.read_info(gdb_path, layer=layer)["features"]
+    except Exception:
+        return None
+    return count if count >= 0 else None
+
+
+def _use_chunks(gdb_path, layer, params):
+    chunk_size = params.get("chunk_size")
+    if not chunk_size or pyogrio is None or not VECTORIZED_SHAPELY:
+        return False
+    count = layer_feature_count(gdb_path, layer)
+    return count is not None and count > chunk_size
+
+
+def _shift(details, offset):
+    """Move chunk positions in check details to layer positions."""
+    return [(position + offset,) + tuple(rest) for position, *rest in details or []]
+
+
+def _concat_issues(frames):
+    frames = [frame for frame in frames if frame is not None and len(frame)]
+    if not frames:
+        return None
+    return pd.concat(frames) if len(frames) > 1 else frames[0]
+
+
+def _read_positions(gdb_path, layer, fids, positions):
+    """Read the features at layer ``positions`` by FID, prepared like a chunk."""
+    positions = np.asarray(sorted(positions), dtype=int)
+    gdf = pyogrio.read_dataframe(gdb_path, layer=layer, fids=fids[positions])
+    gdf.index = pd.Index(positions)
+    gdf, _ = _prepare_features(gdf)
+    gdf["feature_id"] = positions + 1
+    return gdf
+
+
+def _read_fids(gdb_path, layer, bbox=None):
+    """FIDs of the layer's features (within ``bbox``), without reading any geometry or field."""
+    _, fids, _, _ = pyogrio.raw.read(
+        gdb_path, layer=layer, read_geometry=False, columns=[], return_fids=True, bbox=bbox
+    )
+    return fids
+
+
+_MAX_TILE_DEPTH = 8
+
+
+def _layer_tiles(gdb_path, layer, bounds, count, tile_limit):
+    """Yield bounding boxes covering ``bounds``, each holding at most ``tile_limit`` features.
+
+    The layer extent is split into a grid sized from the feature count;
+    tiles that still hold too many features (dense areas) are split into
+    quarters. Counting a tile reads FIDs only.
+    """
+    minx, miny, maxx, maxy = bounds
+    tile_count = max(1, int(np.ceil(count / tile_limit)))
+    columns = int(np.ceil(np.sqrt(tile_count)))
+    rows = int(np.ceil(tile_count / columns))
+    width = (maxx - minx) / columns or 1.0
+    height = (maxy - miny) / rows or 1.0
+    pending = [
+        (minx + i * width, miny + j * height, minx + (i + 1) * width, miny + (j + 1) * height, 0)
+        for i in range(columns) for j in range(rows)
+    ]
+    while pending:
+        x0, y0, x1, y1, depth = pending.pop()
+        if depth < _MAX_TILE_DEPTH:
+            if len(_read_fids(gdb_path, layer, bbox=(x0, y0, x1, y1))) > tile_limit:
+                xm, ym = (x0 + x1) / 2, (y0 + y1) / 2
+                pending += [
+                    (x0, y0, xm, ym, depth + 1), (xm, y0, x1, ym, depth + 1),
+                    (x0, ym, xm, y1, depth + 1), (xm, ym, x1, y1, depth + 1),
+                ]
+                continue
+        yield x0, y0, x1, y1
+
+
+def check_overlapping_polygons_tiled(gdb_path, layer, fids, tolerance=0.01, tile_limit=250000):
+    """Overlap check for a layer too large to hold in memory.
+
+    Each tile is read with a bounding-box filter, which also returns every
+    feature that crosses the tile border, so tiles overlap by exactly the
+    features straddling them. Two polygons that overlap share a point that
+    lies in some tile, and both are read with that tile, so every pair is
+    found; pairs seen again in a neighbouring tile are dropped. ``fids`` maps
+    layer positions to FIDs. Returns the same (issues_gdf, pairs) as
+    check_overlapping_polygons, with layer positions.
+    """
+    bounds = pyogrio.read_info(gdb_path, layer=layer)["total_bounds"]
+    if bounds is None or not np.all(np.isfinite(bounds)):
+        return None, None
+    fid_positions = pd.Index(fids)
+    found = {}
+    frames = []
+    for bbox in _layer_tiles(gdb_path, layer, bounds, len(fids), tile_limit):
+        tile = pyogrio.read_dataframe(gdb_path, layer=layer, bbox=bbox, fid_as_index=True)
+        if len(tile) < 2:
+            continue
+        positions = fid_positions.get_indexer(tile.index)
+        tile, _ = _prepare_features(tile.reset_index(drop=True))
+        tile["feature_id"] = positions + 1
+        issues, pairs = check_overlapping_polygons(tile, tolerance)
+        if not pairs:
+            continue
+        new_rows = set()
+        for left, right, area in pairs:
+            key = tuple(sorted((int(positions[left]), int(positions[right]))))
+            if key not in found:
+                found[key] = area
+                new_rows.update((left, right))
+        if new_rows:
+            rows = issues[issues["feature_id"].isin(positions[sorted(new_rows)] + 1)]
+            frames.append(rows.set_index(rows["feature_id"].to_numpy() - 1))
+    if not found:
+        return None, None
+    issues = _concat_issues(frames)
+    issues = issues[~issues.index.duplicated()].sort_index()
+    return issues, [(left, right, area) for (left, right), area in sorted(found.items())]
+
+
+def _check_layer_chunked(gdb_path, layer, output_folder, params, log, outcome):
+    """Check a layer ``chunk_size`` features at a time. Returns (None, results).
+
+    Per-feature checks run on each chunk as it is read. Duplicate geometries
+    and attributes stream over the chunks keeping only hashes, and overlaps
+    run as a separate tiled pass. The attribute table is appended to
+    <layer>_features.csv chunk by chunk instead of being held in memory.
+    """
+    chunk_size = params["chunk_size"]
+    fids = _read_fids(gdb_path, layer)
+    outcome["features"] = len(fids)
+    log(f"Layer {layer}: {len(fids)} features, checked in chunks of {chunk_size}.")
+
+    features_path = os.path.join(output_folder, f"{layer}_features.csv")
+    if os.path.exists(features_path):
+        os.remove(features_path)
+
+    per_chunk = ("invalid geometries", "duplicate geometries", "line issues", "short lines", "attributes")
+    frames = {name: [] for name in per_chunk + ("duplicate attributes",)}
+    details = {name: [] for name in per_chunk}
+    geometry_digests, attribute_hashes = {}, set()
+
+    for offset in range(0, len(fids), chunk_size):
+        chunk = pyogrio.read_dataframe(gdb_path, layer=layer, skip_features=offset, max_features=chunk_size)
+        chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+        chunk, geometry_notes = _prepare_features(chunk, offset)
+
+        # Sheet matching and layer-wide findings (FeatureIndex -1) are
+        # reported with the first chunk only.
+        chunk_log = log if offset == 0 else (lambda message: None)
+
+        def attributes():
+            issues, issue_details, matched = check_attributes(chunk, layer, params["dictionary"], chunk_log)
+            outcome["unmatched"] = not matched
+            if offset and issue_details is not None:
+                issue_details = issue_details[issue_details["FeatureIndex"] >= 0]
+            return issues, issue_details
+
+        checks = [
+            ("invalid geometries", lambda: check_invalid_geometries(chunk, geometry_notes)),
+            ("duplicate geometries", lambda: check_duplicate_geometries(
+                chunk, params["duplicate_tolerance"], seen=geometry_digests, offset=offset
+            )),
+            ("duplicate attributes", lambda: check_duplicate_attributes(chunk, seen=attribute_hashes)),
+            ("line issues", lambda: check_sharp_turns_self_intersections(chunk, params["min_angle"], params["max_angle"])),
+            ("short lines", lambda: check_short_linear_features(chunk, params["min_length"])),
+            ("attributes", attributes),
+        ]
+        results, _ = _run_checks(checks, layer, log)
+
+        frames["duplicate attributes"].append(results["duplicate attributes"])
+        for name in per_chunk:
+            issues, issue_details = results[name]
+            frames[name].append(issues)
+            if issue_details is None:
+                continue
+            if name in ("invalid geometries", "line issues"):
+                issue_details = _shift(issue_details, offset)
+            details[name].append(issue_details)
+
+        features_table(chunk).to_csv(features_path, mode="a", header=offset == 0, index=False)
+
+    results = {
+        "duplicate attributes": _concat_issues(frames["duplicate attributes"]),
+        "attributes": (
+            _concat_issues(frames["attributes"]),
+            pd.concat(details["attributes"], ignore_index=True) if details["attributes"] else None,
+        ),
+    }
+    for name in ("invalid geometries", "duplicate geometries", "line issues", "short lines"):
+        merged = [detail for chunk_details in details[name] for detail in chunk_details]
+        results[name] = (_concat_issues(frames[name]), merged or None)
+
+    # Features that a later chunk duplicated were not kept in memory; fetch them back.
+    duplicate_issues, duplicate_pairs = results["duplicate geometries"]
+    if duplicate_pairs:
+        earlier = {first for first, _ in duplicate_pairs}.difference(duplicate_issues.index)
+        if earlier:
+            duplicate_issues = pd.concat([duplicate_issues, _read_positions(gdb_path, layer, fids, earlier)])
+            results["duplicate geometries"] = (duplicate_issues.sort_index(), duplicate_pairs)
+
+    try:
+        results["overlapping polygons"] = check_overlapping_polygons_tiled(
+            gdb_path, layer, fids, params["overlap_tolerance"], tile_limit=chunk_size
+        )
+    except Exception as exc:
+        log(f"Layer {layer}: overlapping polygons check skipped due to error: {exc}")
+        results["overlapping polygons"] = (None, None)
+    return None, results
+
+
+def run_layer(gdb_path, layer, output_folder, params):
+    """Read one layer, run every check and write its reports.
+
+    Layers with more than ``chunk_size`` features (when pyogrio is
+    available) are read and checked in chunks so they need not fit in
+    memory. Returns a picklable dict: layer, features, summary (issue
+    counts), unmatched (no dictionary sheet), messages (log lines) and error.
+    """
+    params = {**DEFAULT_PARAMS, **params}
+    messages = []
+    log = messages.append
+    outcome = {"layer": layer, "features": 0, "summary": None, "unmatched": False, "messages": messages, "error": None}
+    try:
+        if _use_chunks(gdb_path, layer, params):
+            gdf, results = _check_layer_chunked(gdb_path, layer, output_folder, params, log, outcome)
+        else:
+            gdf, results = _check_layer(gdb_path, layer, output_folder, params, log, outcome)
+
+        details = {
+            "invalid_geometries": results["invalid geometries"][1],
+            "duplicates": results["duplicate geometries"][1],
+            "overlaps": results["overlapping polygons"][1],
+            "line_issues": results["line issues"][1],
+            "short_lines": results["short lines"][1],
+            "attribute_issues": results["attributes"][1],
+        }
+        outcome["summary"] = {key: 0 if details[key] is None else len(details[key]) for key in SUMMARY_KEYS}
+
+        invalid_geom_details = details["invalid_geometries"]
+        if results["invalid geometries"][0] is not None:
+            log(
+                f"Layer {layer}: {len(invalid_geom_details or [])} feature(s) with bad geometry "
+                f"(repair failed or still invalid after repair)."
+            )
+            for feat_idx, issue_type, description, _, _ in invalid_geom_details or []:
+                log(f"  feature_id {feat_idx + 1}: {issue_type} — {description}")
+
+        write_layer_reports(gdf, layer, results, output_folder, excel=params["excel"])
+    except Exception as exc:
+        outcome["error"] = str(exc)
+    return outcome
+
+
+def python_executable():
+    """Return a Python interpreter that can host worker processes, or None.
+
+    Inside QGIS ``sys.executable`` is the QGIS application (qgis-bin.exe on
+    Windows, the QGIS app bundle on macOS), which cannot be started as a
+    multiprocessing child. The interpreter shipped next to QGIS's Python is
+    used instead.
+    """
+    executable = sys.executable or ""
+    if os.path.basename(executable).lower().startswith("python"):
+        return executable
+    if sys.platform == "win32":
+        candidates = ["pythonw.exe", "python.exe"]
+        folders = [sys.exec_prefix, os.path.dirname(executable)]
+    else:
+        candidates = [f"python{sys.version_info.major}.{sys.version_info.minor}", "python3"]
+        folders = [os.path.join(sys.exec_prefix, "bin"), os.path.dirname(executable)]
+    for folder in folders:
+        for name in candidates:
+            path = os.path.join(folder, name)
+            if os.path.isfile(path):
+                return path
+    return None
+
+
+# How often a pool run checks for a cancel while layers are still running.
+STOP_POLL_SECONDS = 0.5
+
+
+def default_worker_count(layer_count):
+    return max(1, min(layer_count, (os.cpu_count() or 2) - 1))
+
+
+def _process_pool(max_workers):
+    executable = python_executable()
+    if executable is None:
+        return None
+    context = multiprocessing.get_context("spawn")
+    context.set_executable(executable)
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(context.Lock(),),
+    )
+
+
+def iter_layer_results(gdb_path, layers, output_folder, params, max_workers=None, should_stop=None):
+    """Run ``run_layer`` for every layer and yield the results as they complete.
+
+    Layers are spread over a process pool. When no usable interpreter is
+    found, or the pool breaks, the remaining layers run in this process.
+    ``should_stop`` is polled every STOP_POLL_SECONDS while pool layers
+    run, and between layers run in this process. Once it returns True no
+    more results are yielded and pending layers are cancelled; layers
+    already running in the pool finish in the background.
+    """
+    layers = list(layers)
+    should_stop = should_stop or (lambda: False)
+    workers = max_workers or default_worker_count(len(layers))
+    remaining = list(layers)
+    prepare_output_folder(output_folder)
+
+    pool = _process_pool(workers) if workers > 1 else None
+    if pool is not None:
+        try:
+            futures = {
+                pool.submit(run_layer, gdb_path, layer, output_folder, params): layer for layer in layers
+            }
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=STOP_POLL_SECONDS, return_when=FIRST_COMPLETED)
+                if should_stop():
+                    return
+                for future in done:
+                    result = future.result()
+                    remaining.remove(futures[future])
+                    yield result
+        except BrokenProcessPool:
+            pass
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    for layer in remaining:
+        if should_stop():
+            return
+        yield run_layer(gdb_path, layer, output_folder, params)
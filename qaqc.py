@@ -1,35 +1,69 @@
 import sys
 import os
 import shutil
-import numpy as np
-import pandas as pd
-import geopandas as gpd
 import fiona
-from shapely.geometry import LineString, MultiLineString, Polygon, MultiPolygon
-from shapely.strtree import STRtree
-try:
-    from shapely.validation import explain_validity
-except ImportError:
-    def explain_validity(geom):
-        return "Invalid geometry"
-
-from .upload import validate_and_repair_geometry
 from fpdf import FPDF
-import pyproj
-from fuzzywuzzy import process
 from PyQt5.QtWidgets import (
     QDialog, QProgressBar, QVBoxLayout, QPushButton, QLabel, QCheckBox, QLineEdit,
-    QSpinBox, QFileDialog, QHBoxLayout, QMessageBox, QGroupBox,
+    QSpinBox, QDoubleSpinBox, QFileDialog, QHBoxLayout, QMessageBox, QGroupBox,
     QTextEdit, QTextBrowser, QScrollArea, QGridLayout, QWidget, QApplication, QSizePolicy,
     QSplitter,
 )
-from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtCore import Qt, QTimer, QObject, QThread, pyqtSignal
 from PyQt5.QtGui import QGuiApplication, QDesktopServices
-from qgis.core import (
-    QgsProject, QgsVectorLayer, QgsFeatureRequest, QgsFields, QgsFeature, QgsWkbTypes
-)
 
 from .help_panel import configure_qgis_dialog
+from .qa_engine import iter_layer_results, load_attribute_dictionary
+
+
+class QAWorker(QObject):
+    """Runs the QA engine for the selected layers in a background thread.
+
+    The per-layer work happens in worker processes (see qa_engine); this
+    object only relays each layer's summary back to the dialog.
+    """
+    progress = pyqtSignal(int, str)  # layers done, message
+    log = pyqtSignal(str)
+    layer_done = pyqtSignal(object)  # result dict from qa_engine.run_layer
+    finished = pyqtSignal(bool)  # True when cancelled
+
+    def __init__(self, gdb_path, layers, output_folder, params):
+        super().__init__()
+        self.gdb_path = gdb_path
+        self.layers = layers
+        self.output_folder = output_folder
+        self.params = params
+        self._stop = False
+
+    def stop(self):
+        self._stop = True
+
+    def run(self):
+        done = 0
+        params = dict(self.params)
+        excel_file = params.pop("excel_file", None)
+        try:
+            # Parsed (or loaded from the compiled cache) once per run, then
+            # shared with every layer's worker process.
+            params["dictionary"] = load_attribute_dictionary(excel_file)
+        except Exception as e:
+            self.log.emit(f"Error reading attribute dictionary {excel_file}: {e}")
+            params["dictionary"] = None
+        try:
+            results = iter_layer_results(
+                self.gdb_path,
+                self.layers,
+                self.output_folder,
+                params,
+                should_stop=lambda: self._stop,
+            )
+            for result in results:
+                done += 1
+                self.progress.emit(done, f"Finished layer {done} of {len(self.layers)}: {result['layer']}")
+                self.layer_done.emit(result)
+        except Exception as e:
+            self.log.emit(f"QA run failed: {e}")
+        self.finished.emit(self._stop)
 
 
 class ProcessGDBDialog(QDialog):
@@ -50,6 +84,10 @@ class ProcessGDBDialog(QDialog):
             self.excel_file = None
             print(f"Warning: dictionary.xlsx not found in plugin folder: {plugin_dir}")
 
+        self.qa_thread = QThread()
+        self.qa_worker = None
+        self._qa_run = None
+
         content_widget = QWidget()
         main_layout = QVBoxLayout(content_widget)
         main_layout.setSpacing(8)
@@ -108,7 +146,42 @@ class ProcessGDBDialog(QDialog):
         self.min_length_spinbox.setValue(10)
         parameters_layout.addWidget(self.min_angle_spinbox, 0, 0)
         parameters_layout.addWidget(self.max_angle_spinbox, 0, 1)
-        parameters_layout.addWidget(self.min_length_spinbox, 1, 0, 1, 2)
+        self.duplicate_tolerance_spinbox = QDoubleSpinBox()
+        self.duplicate_tolerance_spinbox.setRange(0, 5)
+        self.duplicate_tolerance_spinbox.setDecimals(3)
+        self.duplicate_tolerance_spinbox.setSingleStep(0.01)
+        self.duplicate_tolerance_spinbox.setPrefix("Dup. Tolerance(m): ")
+        self.duplicate_tolerance_spinbox.setSpecialValueText("Dup. Tolerance: exact")
+        self.duplicate_tolerance_spinbox.setToolTip(
+            "Treat geometries as duplicates when they match after snapping coordinates to this grid (0 = exact match)."
+        )
+        parameters_layout.addWidget(self.min_length_spinbox, 1, 0)
+        parameters_layout.addWidget(self.duplicate_tolerance_spinbox, 1, 1)
+        self.excel_report_checkbox = QCheckBox("Excel workbook per layer")
+        self.excel_report_checkbox.setChecked(True)
+        self.excel_report_checkbox.setToolTip(
+            "Also write <layer>_qa.xlsx. Issue tables are always saved as Parquet (or CSV); "
+            "skipping Excel makes large runs noticeably faster."
+        )
+        self.chunk_size_spinbox = QSpinBox()
+        self.chunk_size_spinbox.setRange(0, 5000000)
+        self.chunk_size_spinbox.setSingleStep(50000)
+        self.chunk_size_spinbox.setPrefix("Chunk Size: ")
+        self.chunk_size_spinbox.setSpecialValueText("Chunking: off")
+        self.chunk_size_spinbox.setValue(250000)
+        self.chunk_size_spinbox.setToolTip(
+            "Layers with more features than this are read and checked in chunks of this many features "
+            "instead of all at once (0 = always read whole layers)."
+        )
+        parameters_layout.addWidget(self.excel_report_checkbox, 2, 0)
+        parameters_layout.addWidget(self.chunk_size_spinbox, 2, 1)
+        self.incremental_checkbox = QCheckBox("Only re-check features changed since the last run")
+        self.incremental_checkbox.setChecked(True)
+        self.incremental_checkbox.setToolTip(
+            "Reuse the findings stored in the output folder's qa_state for features that have not changed. "
+            "Untick to check every feature again."
+        )
+        parameters_layout.addWidget(self.incremental_checkbox, 3, 0, 1, 2)
         parameters_box.setLayout(parameters_layout)
         main_layout.addWidget(parameters_box)
 
@@ -148,6 +221,10 @@ class ProcessGDBDialog(QDialog):
         self.run_all_button.setEnabled(False)
         self.run_all_button.clicked.connect(self.run_all_checks)
         button_layout.addWidget(self.run_all_button)
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(self.cancel_checks)
+        button_layout.addWidget(self.cancel_button)
         button_layout.addStretch()
 
         log_box = QGroupBox("Log")
@@ -388,22 +465,29 @@ class ProcessGDBDialog(QDialog):
 
         <h4>Checks performed</h4>
         <ul>
-            <li><b>Duplicate geometries</b> &mdash; features with identical geometry.</li>
+            <li><b>Duplicate geometries</b> &mdash; features with identical geometry, regardless of vertex start point or ring direction.</li>
             <li><b>Duplicate attributes</b> &mdash; rows with identical non-geometry fields.</li>
             <li><b>Overlapping polygons</b> &mdash; polygon pairs sharing area above 0.01&nbsp;m&sup2; (uses EPSG:21037).</li>
             <li><b>Line issues</b> &mdash; sharp turns within the min/max angle range, and self-intersections.</li>
             <li><b>Short lines</b> &mdash; line features shorter than the minimum length (uses EPSG:21037).</li>
-            <li><b>Attribute issues</b> &mdash; validates fields against the bundled <code>dictionary.xlsx</code> (fuzzy sheet name match).</li>
+            <li><b>Attribute issues</b> &mdash; validates fields against the bundled <code>dictionary.xlsx</code> (fuzzy sheet name match): missing values, allowed <code>Options</code> and <code>LEN</code>. Optional sheet columns <code>Min</code>/<code>Max</code> (numeric range), <code>Pattern</code> (regular expression) and <code>Condition</code> (an expression over the layer's fields, e.g. <code>end_date &gt;= start_date</code>) add further rules.</li>
         </ul>
 
         <h4>Parameters</h4>
         <ul>
             <li><b>Min / Max Angle</b> &mdash; flag vertices where the turn angle falls inside this range (default 1&deg;&ndash;45&deg;).</li>
             <li><b>Min Length (m)</b> &mdash; flag linear features shorter than this value (default 10&nbsp;m).</li>
+            <li><b>Dup. Tolerance (m)</b> &mdash; also treat geometries as duplicates when they agree after snapping to this grid (uses EPSG:21037; default exact match).</li>
+            <li><b>Chunk Size</b> &mdash; layers with more features than this are checked in chunks (default 250,000; 0 turns chunking off).</li>
         </ul>
 
         <h4>Outputs</h4>
-        <p>For each layer and issue type, a <code>.gpkg</code> and <code>.xlsx</code> are saved. A summary PDF (<code>database_summary_report.pdf</code>) is written to the output folder. Use the links below the log when processing finishes.</p>
+        <p>Issue features from all layers are saved as separate layers (<code>&lt;layer&gt;_&lt;issue&gt;</code>) of one <code>qa_issues.gpkg</code>. For each layer with issues, the issue tables and the attribute table are written once as Parquet files (CSV when pyarrow is not installed), and, with <b>Excel workbook per layer</b> ticked, together in <code>&lt;layer&gt;_qa.xlsx</code>. A summary PDF (<code>database_summary_report.pdf</code>) is written to the output folder. Use the links below the log when processing finishes.</p>
+
+        <h4>Performance</h4>
+        <p>Selected layers are checked in parallel, one layer per CPU core, in separate Python processes. The dialog stays responsive and the log reports each layer as it finishes.</p>
+        <p>Layers larger than <b>Chunk Size</b> are never loaded whole: features are read and checked one chunk at a time, duplicates are found by hashing across chunks, and overlaps are checked tile by tile over the layer extent. For these layers the attribute table is written as <code>&lt;layer&gt;_features.csv</code> and left out of the Excel workbook.</p>
+        <p>With <b>Only re-check features changed since the last run</b> ticked, the output folder keeps a <code>qa_state</code> folder with a content hash and the findings of every feature. Re-running into the same folder checks only new or edited features (and looks for overlaps around them); findings for unchanged features are carried forward, and the reports are complete as before. Changing a parameter, the layer's fields or its dictionary sheet makes that layer run in full again. Chunked layers are always checked in full.</p>
         """
 
     def _resize_to_available_screen(self):
@@ -425,20 +509,6 @@ class ProcessGDBDialog(QDialog):
     def log_message(self, message):
         self.log_textedit.append(message)
 
-    def _write_gpkg(self, gdf, filepath):
-        """Write a GeoPackage, replacing any existing file or layer."""
-        if os.path.exists(filepath):
-            os.remove(filepath)
-        gdf.to_file(filepath, driver="GPKG", mode="w")
-
-    def _write_excel(self, filepath, sheets):
-        """Write Excel output, replacing any existing file."""
-        if os.path.exists(filepath):
-            os.remove(filepath)
-        with pd.ExcelWriter(filepath, engine="xlsxwriter", mode="w") as writer:
-            for sheet_name, dataframe in sheets.items():
-                dataframe.to_excel(writer, sheet_name=sheet_name, index=False)
-
     def select_gdb(self):
         gdb_path = QFileDialog.getExistingDirectory(self, "Select GeoDatabase Folder")
         if gdb_path:
@@ -482,310 +552,6 @@ class ProcessGDBDialog(QDialog):
             col = i % columns
             self.layer_selection_layout.addWidget(checkbox, row, col)
 
-    def validate_geodataframe(self, gdf):
-        if "geometry" in gdf.columns and gdf.geometry.name != "geometry":
-            gdf = gdf.set_geometry("geometry", inplace=False)
-        gdf = gdf.copy()
-        repaired = []
-        self._geometry_repair_notes = {}
-        for idx, geom in gdf.geometry.items():
-            if geom is None or geom.is_empty:
-                self._geometry_repair_notes[idx] = "Geometry is null or empty"
-                repaired.append(geom)
-                continue
-            was_invalid = not geom.is_valid
-            try:
-                if was_invalid:
-                    fixed = validate_and_repair_geometry(geom)
-                    if fixed is None:
-                        self._geometry_repair_notes[idx] = (
-                            "Repair failed — geometry could not be fixed"
-                        )
-                        repaired.append(geom)
-                    elif not fixed.is_valid:
-                        self._geometry_repair_notes[idx] = explain_validity(fixed)
-                        repaired.append(fixed)
-                    else:
-                        repaired.append(fixed)
-                else:
-                    repaired.append(geom)
-            except Exception as exc:
-                fixed = validate_and_repair_geometry(geom)
-                if fixed is None or (fixed is not None and not fixed.is_valid):
-                    self._geometry_repair_notes[idx] = (
-                        f"Repair failed: {exc}"
-                    )
-                    repaired.append(fixed if fixed is not None else geom)
-                else:
-                    repaired.append(fixed)
-        gdf.geometry = repaired
-        return gdf
-
-    @staticmethod
-    def _safe_intersects(geom1, geom2):
-        try:
-            return geom1.intersects(geom2)
-        except Exception:
-            return False
-
-    @staticmethod
-    def _safe_intersection(geom1, geom2):
-        try:
-            return geom1.intersection(geom2)
-        except Exception:
-            return None
-
-    def check_invalid_geometries(self, gdf):
-        issue_indices = set()
-        issue_details = []
-        repair_notes = getattr(self, "_geometry_repair_notes", {})
-        for idx, geom in gdf.geometry.items():
-            if idx in repair_notes:
-                issue_indices.add(idx)
-                issue_details.append(
-                    (idx, "Repair Failed", repair_notes[idx], None, None)
-                )
-            elif geom is None or geom.is_empty:
-                issue_indices.add(idx)
-                issue_details.append(
-                    (idx, "Empty Geometry", "Geometry is null or empty", None, None)
-                )
-            elif not geom.is_valid:
-                issue_indices.add(idx)
-                reason = explain_validity(geom)
-                issue_details.append(
-                    (idx, "Invalid Geometry", reason, None, None)
-                )
-        if issue_indices:
-            return gdf.iloc[list(issue_indices)], issue_details
-        return None, None
-
-    def make_timezone_naive(self, gdf):
-        for col in gdf.columns:
-            if pd.api.types.is_datetime64_any_dtype(gdf[col]):
-                gdf[col] = gdf[col].dt.tz_localize(None)
-        return gdf
-    
-    def check_duplicate_geometries(self, gdf):
-        duplicate_pairs = []
-        seen = {}
-        for idx, geom in gdf.geometry.items():
-            if geom is None or geom.is_empty:
-                print(f"Skipping None or empty geometry at index {idx}")
-                continue
-            geom_wkt = geom.wkt
-            if geom_wkt in seen:
-                duplicate_pairs.append((seen[geom_wkt], idx))
-            else:
-                seen[geom_wkt] = idx
-        if duplicate_pairs:
-            duplicate_indices = {idx for pair in duplicate_pairs for idx in pair}
-            return gdf.loc[list(duplicate_indices)], duplicate_pairs
-        return None, None
-
-    def check_duplicate_attributes(self, gdf):
-        attr_columns = [col for col in gdf.columns if col != "geometry"]
-        duplicates = gdf[gdf.duplicated(subset=attr_columns, keep=False)]
-        exact_duplicates = duplicates[duplicates.duplicated(subset=attr_columns, keep="first")]
-        return exact_duplicates if not exact_duplicates.empty else None
-
-    def check_overlapping_polygons(self, gdf, tolerance=0.01):
-        if gdf.crs != "EPSG:21037":
-            print("Reprojecting to EPSG:21037 for accurate area calculation...")
-            gdf = gdf.to_crs(epsg=21037)
-        tree = STRtree(gdf.geometry)
-        overlap_pairs = []
-        for idx, geom in gdf.geometry.items():
-            if isinstance(geom, (Polygon, MultiPolygon)):
-                possible_matches = [i for i in tree.query(geom) if i != idx]
-                for idx2 in possible_matches:
-                    geom2 = gdf.geometry.iloc[idx2]
-                    if not isinstance(geom2, (Polygon, MultiPolygon)):
-                        continue
-                    if not self._safe_intersects(geom, geom2):
-                        continue
-                    intersection = self._safe_intersection(geom, geom2)
-                    if intersection is None or intersection.is_empty:
-                        continue
-                    if intersection.area > tolerance:
-                        overlap_area = intersection.area
-                        overlap_pairs.append((idx, idx2, overlap_area))
-        if overlap_pairs:
-            overlap_indices = set([idx for pair in overlap_pairs for idx in [pair[0], pair[1]]])
-            return gdf.iloc[list(overlap_indices)], overlap_pairs
-        return None, None
-
-    def check_sharp_turns_self_intersections(self, gdf):
-        gdf = self.validate_geodataframe(gdf)
-        issue_indices = set()
-        issue_details = []
-        lower_angle_threshold = self.min_angle_spinbox.value()
-        upper_angle_threshold = self.max_angle_spinbox.value()
-        for idx, geom in enumerate(gdf.geometry):
-            if geom is None:
-                continue
-            lines = [geom] if isinstance(geom, LineString) else list(geom.geoms) if isinstance(geom, MultiLineString) else []
-            for line in lines:
-                if len(line.coords) < 3:
-                    continue
-                coords = np.array(line.coords)
-                for i in range(1, len(coords) - 1):
-                    p1, p2, p3 = coords[i - 1], coords[i], coords[i + 1]
-                    v1 = p1 - p2
-                    v2 = p3 - p2
-                    dot_product = np.dot(v1, v2)
-                    cross_product = np.linalg.norm(np.cross(v1, v2))
-                    angle_radians = np.arctan2(cross_product, dot_product)
-                    angle_degrees = np.degrees(angle_radians)
-                    if lower_angle_threshold <= angle_degrees <= upper_angle_threshold:
-                        issue_indices.add(idx)
-                        issue_details.append((idx, "Sharp Turn", round(angle_degrees, 2), p2[0], p2[1]))
-                try:
-                    if not line.is_simple:
-                        intersections = self._safe_intersection(line, line)
-                        if intersections is None:
-                            issue_indices.add(idx)
-                            issue_details.append(
-                                (idx, "Invalid Line", "Could not test self-intersection", None, None)
-                            )
-                        elif intersections.geom_type == "Point":
-                            issue_indices.add(idx)
-                            issue_details.append((idx, "Self-Intersection", None, intersections.x, intersections.y))
-                        elif intersections.geom_type == "MultiPoint":
-                            for pt in intersections.geoms:
-                                issue_indices.add(idx)
-                                issue_details.append((idx, "Self-Intersection", None, pt.x, pt.y))
-                except Exception as exc:
-                    issue_indices.add(idx)
-                    issue_details.append(
-                        (idx, "Invalid Line", str(exc), None, None)
-                    )
-        if issue_indices:
-            return gdf.iloc[list(issue_indices)], issue_details
-        return None, None
-
-    def check_short_linear_features(self, gdf):
-        try:
-            gdf = self.validate_geodataframe(gdf)
-            length_threshold = self.min_length_spinbox.value()
-            if gdf.crs != "EPSG:21037":
-                print("Reprojecting to EPSG:21037 for accurate length calculation...")
-                gdf = gdf.to_crs(epsg=21037)
-            short_features = []
-            for idx, geom in gdf.geometry.items():
-                try:
-                    if isinstance(geom, (LineString, MultiLineString)):
-                        length = geom.length
-                        if length < length_threshold:
-                            short_features.append((gdf.iloc[idx]["feature_id"], length))
-                except Exception as e:
-                    print(f"Error processing geometry at index {idx}: {e}")
-            if short_features:
-                short_indices = [idx for idx, _ in short_features]
-                return gdf.iloc[short_indices], short_features
-        except Exception as e:
-            print(f"An error occurred: {e}")
-        return None, None
-    
-    def check_attributes(self, gdf, layer_name, unmatched_layers):
-        """Validate attributes of a GeoDataFrame against specifications in the Excel file using fuzzy matching."""
-        if not self.excel_file:
-            self.log_message(f"No Excel file available for attribute validation of layer {layer_name}.")
-            unmatched_layers.append(layer_name)
-            return None, None
-        
-        try:
-            xl = pd.ExcelFile(self.excel_file, engine='openpyxl')
-            sheet_names = [s for s in xl.sheet_names if s.lower() != 'how to']
-            match = process.extractOne(layer_name, sheet_names, score_cutoff=70)
-            if not match:
-                self.log_message(f"No matching sheet found for layer {layer_name} (similarity score below 70).")
-                unmatched_layers.append(layer_name)
-                return None, None
-            matched_sheet, score = match[0], match[1]
-            self.log_message(f"Matched layer {layer_name} to sheet {matched_sheet} with similarity score {score}")
-            specs_df = pd.read_excel(self.excel_file, sheet_name=matched_sheet, engine='openpyxl')
-            required_cols = ['Attribute', 'Type']
-            print("specs_df", specs_df)
-            if not all(col in specs_df.columns for col in required_cols):
-                self.log_message(f"Sheet {matched_sheet} missing required columns: {required_cols}")
-                return None, None
-        except Exception as e:
-            self.log_message(f"Error reading Excel sheet for layer {layer_name}: {str(e)}")
-            return None, None
-
-        issue_indices = set()
-        issue_details = []
-        type_mapping = {
-            "String": "object",
-            "text": "object",
-            "Integer": "int64",
-            "Float": "float64",
-            "decimal": "float64",
-            "Boolean": "bool",
-            "Date": "datetime64[ns]",
-            "Array": "object"
-        }
-        geometry_types = ["point", "linestring", "polygon"]
-        gdf_columns = [col for col in gdf.columns if col != "geometry"]
-        required_fields = specs_df['Attribute'].tolist()
-        missing_fields = [field for field in required_fields if field not in gdf_columns and specs_df[specs_df['Attribute'] == field]['Type'].iloc[0].lower() not in geometry_types]
-        
-        # Track if any layer-wide issues exist
-        has_layer_wide_issues = False
-        
-        if missing_fields:
-            issue_details.append((-1, "Missing Fields", f"Required fields missing: {', '.join(missing_fields)}", None, None))
-            has_layer_wide_issues = True
-
-        for _, spec in specs_df.iterrows():
-            field = spec['Attribute']
-            expected_type = spec['Type']
-            max_length = spec.get('LEN', np.nan)
-            valid_values = spec.get('Options', '')
-            if expected_type.lower() in geometry_types:
-                continue
-            if field not in gdf_columns:
-                issue_details.append((-1, "Missing Field", f"Field {field} is required but missing", None, None))
-                has_layer_wide_issues = True
-                continue
-            actual_type = str(gdf[field].dtype)
-            expected_pandas_type = type_mapping.get(expected_type, expected_type)
-            if actual_type != expected_pandas_type:
-                issue_details.append((-1, "Incorrect Data Type", f"Field {field} has type {actual_type}, expected {expected_pandas_type}", None, None))
-                has_layer_wide_issues = True
-            if gdf[field].isna().any():
-                na_indices = gdf[gdf[field].isna()].index.tolist()
-                for idx in na_indices:
-                    issue_indices.add(idx)
-                    issue_details.append((idx, "Missing Value", f"Field {field} is required but has missing value", None, None))
-            if valid_values and isinstance(valid_values, str):
-                valid_values = [v.strip() for v in valid_values.split(',') if v.strip()]
-                invalid_mask = ~gdf[field].isin(valid_values) & gdf[field].notna()
-                if invalid_mask.any():
-                    invalid_indices = gdf[invalid_mask].index.tolist()
-                    for idx in invalid_indices:
-                        issue_indices.add(idx)
-                        value = gdf.loc[idx, field]
-                        issue_details.append((idx, "Invalid Value", f"Field {field} has invalid value {value}, expected one of {valid_values}", None, None))
-            if not pd.isna(max_length) and expected_type.lower() in ["string", "text"]:
-                long_values = gdf[field].str.len() > max_length
-                if long_values.any():
-                    long_indices = gdf[long_values].index.tolist()
-                    for idx in long_indices:
-                        issue_indices.add(idx)
-                        value = gdf.loc[idx, field]
-                        issue_details.append((idx, "Exceeds Max Length", f"Field {field} value {value} exceeds max length {max_length}", None, None))
-
-        # If there are layer-wide issues or feature-specific issues, return the full GeoDataFrame
-        if issue_details:  # Changed from `if issue_indices` to ensure layer-wide issues are captured
-            if has_layer_wide_issues or issue_indices:
-                # Return the full GeoDataFrame if there are any issues
-                return gdf, issue_details
-            return gdf.loc[list(issue_indices)], issue_details
-        return None, None
-
- 
     def generate_summary_pdf(self, output_dir, layer_summary, total_layers, total_features, unmatched_layers):
         pdf = FPDF(orientation="L", unit="mm", format="A4")
         pdf.add_page()
@@ -870,10 +636,12 @@ class ProcessGDBDialog(QDialog):
             (
                 "Duplicates",
                 "Counts duplicate geometry pairs: two or more features whose shape is exactly the same "
-                "(compared using geometry WKT), even if their attribute values differ. Each matching pair "
-                "is counted once. Flagged features are exported to *_duplicate_geometries.gpkg, with "
-                "pair details in *_duplicates.xlsx. Duplicate attribute rows (identical non-geometry "
-                "fields) are checked separately and saved to *_duplicate_attributes.gpkg when found.",
+                "(compared after normalising vertex order, and optionally snapping to the duplicate tolerance "
+                "grid), even if their attribute values differ. Each matching pair "
+                "is counted once. Flagged features are exported to the *_duplicate_geometries layer of "
+                "qa_issues.gpkg, with pair details in *_duplicates. Duplicate attribute rows (identical "
+                "non-geometry fields) are checked separately and saved to the *_duplicate_attributes layer "
+                "when found.",
             ),
             (
                 "Overlaps",
@@ -924,206 +692,116 @@ class ProcessGDBDialog(QDialog):
         self.folder_link_label.show()
 
     def run_all_checks(self):
+        selected_layers = self.get_selected_layers()
+        if not selected_layers:
+            QMessageBox.warning(self, "No Layers Selected", "Please select at least one layer to process.")
+            return
+        if self.qa_thread.isRunning():
+            return
         try:
-            selected_layers = self.get_selected_layers()
-            if not selected_layers:
-                QMessageBox.warning(self, "No Layers Selected", "Please select at least one layer to process.")
-                return
-            self.progress_bar.show()
-            self.progress_label.show()
-            self.progress_bar.setValue(0)
             os.makedirs(self.output_folder, exist_ok=True)
-            layer_summary = {}
-            total_features = 0
-            unmatched_layers = []
+        except OSError as e:
+            QMessageBox.critical(self, "Error", f"An error occurred: {str(e)}")
+            return
 
-            with fiona.Env():
-                total_layers = len(selected_layers)
-                self.log_message(f"Total Number of selected layers: {total_layers}")
-                self.progress_bar.setRange(0, total_layers)
-
-                for i, layer in enumerate(selected_layers):
-                    self.progress_bar.setValue(i + 1)
-                    self.progress_label.setText(f"Processing Layer {i + 1} of {total_layers}: {layer}")
-                    QApplication.processEvents()
-                    self.log_message(f"Processing Layer: {layer}")
-                    gdf = gpd.read_file(self.gdb_path, layer=layer)
-                    gdf = self.validate_geodataframe(gdf)
-                    total_features += len(gdf)
-                    gdf["feature_id"] = range(1, len(gdf) + 1)
-                    gdf = self.make_timezone_naive(gdf)
-
-                    invalid_geoms, invalid_geom_details = None, None
-                    duplicate_geoms, duplicate_pairs = None, None
-                    duplicate_attrs = None
-                    overlapping_polys, overlap_pairs = None, None
-                    line_issues, line_issue_details = None, None
-                    short_lines, short_line_details = None, None
-                    attribute_issues, attribute_issue_details = None, None
-
-                    checks = [
-                        ("invalid geometries", lambda: self.check_invalid_geometries(gdf)),
-                        ("duplicate geometries", lambda: self.check_duplicate_geometries(gdf)),
-                        ("duplicate attributes", lambda: self.check_duplicate_attributes(gdf)),
-                        ("overlapping polygons", lambda: self.check_overlapping_polygons(gdf)),
-                        ("line issues", lambda: self.check_sharp_turns_self_intersections(gdf)),
-                        ("short lines", lambda: self.check_short_linear_features(gdf)),
-                        ("attributes", lambda: self.check_attributes(gdf, layer, unmatched_layers)),
-                    ]
-                    results = {}
-                    for check_name, check_func in checks:
-                        try:
-                            result = check_func()
-                            results[check_name] = result
-                        except Exception as exc:
-                            self.log_message(
-                                f"Layer {layer}: {check_name} check skipped due to error: {exc}"
-                            )
-                            if check_name == "duplicate attributes":
-                                results[check_name] = None
-                            else:
-                                results[check_name] = (None, None)
-
-                    invalid_geoms, invalid_geom_details = results["invalid geometries"]
-                    duplicate_geoms, duplicate_pairs = results["duplicate geometries"]
-                    duplicate_attrs = results["duplicate attributes"]
-                    overlapping_polys, overlap_pairs = results["overlapping polygons"]
-                    line_issues, line_issue_details = results["line issues"]
-                    short_lines, short_line_details = results["short lines"]
-                    attribute_issues, attribute_issue_details = results["attributes"]
-                    print('attribute_issues',attribute_issues)
-                    print('attribute_issue_details',attribute_issue_details)
-                    layer_summary[layer] = {
-                        "invalid_geometries": len(invalid_geom_details) if invalid_geom_details else 0,
-                        "duplicates": len(duplicate_pairs) if duplicate_pairs else 0,
-                        "overlaps": len(overlap_pairs) if overlap_pairs else 0,
-                        "line_issues": len(line_issue_details) if line_issue_details else 0,
-                        "short_lines": len(short_line_details) if short_line_details else 0,
-                        "attribute_issues": len(attribute_issue_details) if attribute_issue_details else 0
-                    }
-                    if invalid_geoms is not None:
-                        count = len(invalid_geom_details) if invalid_geom_details else 0
-                        self.log_message(
-                            f"Layer {layer}: {count} feature(s) with bad geometry "
-                            f"(repair failed or still invalid after repair)."
-                        )
-                        if invalid_geom_details:
-                            for detail in invalid_geom_details:
-                                feat_idx, issue_type, description, _, _ = detail
-                                feature_id = gdf.iloc[feat_idx]["feature_id"]
-                                self.log_message(
-                                    f"  feature_id {feature_id}: {issue_type} — {description}"
-                                )
-                        issue_file = os.path.join(self.output_folder, f"{layer}_invalid_geometries.gpkg")
-                        self._write_gpkg(invalid_geoms, issue_file)
-                        print(f"  - Invalid geometries saved to {issue_file}")
-                        if invalid_geom_details:
-                            invalid_geom_details_df = pd.DataFrame(
-                                invalid_geom_details,
-                                columns=["FeatureIndex", "IssueType", "Description", "x", "y"]
-                            )
-                            invalid_geom_details_df["feature_id"] = gdf.iloc[
-                                invalid_geom_details_df["FeatureIndex"]
-                            ]["feature_id"].values
-                            invalid_geom_details_df = invalid_geom_details_df[
-                                ["feature_id", "FeatureIndex", "IssueType", "Description", "x", "y"]
-                            ]
-                            all_features_df = gdf[["feature_id"] + [col for col in gdf.columns if col != "geometry"]]
-                            excel_file = os.path.join(self.output_folder, f"{layer}_invalid_geometries.xlsx")
-                            self._write_excel(excel_file, {
-                                "Invalid Geometries": invalid_geom_details_df,
-                                "All Features": all_features_df,
-                            })
-                            print(f"  - Invalid geometry details saved to {excel_file}")
-                    if duplicate_geoms is not None:
-                        issue_file = os.path.join(self.output_folder, f"{layer}_duplicate_geometries.gpkg")
-                        self._write_gpkg(duplicate_geoms, issue_file)
-                        print(f"  - Duplicate geometries saved to {issue_file}")
-                        if duplicate_pairs:
-                            duplicate_pairs_df = pd.DataFrame(duplicate_pairs, columns=["Feature1", "Feature2"])
-                            duplicate_pairs_df[["Feature1", "Feature2"]] = np.sort(duplicate_pairs_df[["Feature1", "Feature2"]], axis=1)
-                            duplicate_pairs_df = duplicate_pairs_df.drop_duplicates()
-                            all_features_df = gdf[["feature_id"] + [col for col in gdf.columns if col != "geometry"]]
-                            excel_file = os.path.join(self.output_folder, f"{layer}_duplicates.xlsx")
-                            self._write_excel(excel_file, {
-                                "Duplicate Pairs": duplicate_pairs_df,
-                                "All Features": all_features_df,
-                            })
-                            print(f"  - Unique duplicate pairs and all features saved to {excel_file}")
-                    if duplicate_attrs is not None:
-                        issue_file = os.path.join(self.output_folder, f"{layer}_duplicate_attributes.gpkg")
-                        self._write_gpkg(duplicate_attrs, issue_file)
-                        print(f"  - Duplicate attributes saved to {issue_file}")
-                    if overlapping_polys is not None:
-                        issue_file = os.path.join(self.output_folder, f"{layer}_overlapping_polygons.gpkg")
-                        self._write_gpkg(overlapping_polys, issue_file)
-                        print(f"  - Overlapping polygons saved to {issue_file}")
-                        if overlap_pairs:
-                            overlap_pairs_df = pd.DataFrame(overlap_pairs, columns=["Feature1", "Feature2", "Overlap Area (m²)"])
-                            all_features_df = gdf[["feature_id"] + [col for col in gdf.columns if col != "geometry"]]
-                            excel_file = os.path.join(self.output_folder, f"{layer}_overlaps.xlsx")
-                            self._write_excel(excel_file, {
-                                "Overlap Pairs": overlap_pairs_df,
-                                "All Features": all_features_df,
-                            })
-                            print(f"  - Overlapping pairs and all features saved to {excel_file}")
-                    if line_issues is not None:
-                        issue_file = os.path.join(self.output_folder, f"{layer}_line_issues.gpkg")
-                        self._write_gpkg(line_issues, issue_file)
-                        print(f"  - Line issues saved to {issue_file}")
-                        if line_issue_details:
-                            line_issue_details_df = pd.DataFrame(line_issue_details, columns=["FeatureIndex", "IssueType", "Angle", "x", "y"])
-                            line_issue_details_df["feature_id"] = gdf.iloc[line_issue_details_df["FeatureIndex"]]["feature_id"].values
-                            line_issue_details_df = line_issue_details_df[["feature_id", "FeatureIndex", "IssueType", "Angle", "x", "y"]]
-                            all_features_df = gdf[["feature_id"] + [col for col in gdf.columns if col != "geometry"]]
-                            excel_file = os.path.join(self.output_folder, f"{layer}_line_issues.xlsx")
-                            self._write_excel(excel_file, {
-                                "Line Issues": line_issue_details_df,
-                                "All Features": all_features_df,
-                            })
-                            print(f"  - Line issues and all features saved to {excel_file}")
-                    if short_lines is not None:
-                        issue_file = os.path.join(self.output_folder, f"{layer}_short_lines.gpkg")
-                        self._write_gpkg(short_lines, issue_file)
-                        print(f"  - Short linear features saved to {issue_file}")
-                        if short_line_details:
-                            short_line_details_df = pd.DataFrame(short_line_details, columns=["FeatureID", "Length (m)"])
-                            all_features_df = gdf[["feature_id"] + [col for col in gdf.columns if col != "geometry"]]
-                            excel_file = os.path.join(self.output_folder, f"{layer}_short_lines.xlsx")
-                            self._write_excel(excel_file, {
-                                "Short Lines": short_line_details_df,
-                                "All Features": all_features_df,
-                            })
-                            print(f"  - Short linear features and all features saved to {excel_file}")
-                    if attribute_issues is not None:
-                        issue_file = os.path.join(self.output_folder, f"{layer}_attribute_issues.gpkg")
-                        self._write_gpkg(attribute_issues, issue_file)
-                        print(f"  - Attribute issues saved to {issue_file}")
-                        if attribute_issue_details:
-                            attribute_issue_details_df = pd.DataFrame(
-                                attribute_issue_details,
-                                columns=["FeatureIndex", "IssueType", "Description", "x", "y"]
-                            )
-                            attribute_issue_details_df["feature_id"] = attribute_issue_details_df["FeatureIndex"].apply(
-                                lambda x: gdf.iloc[x]["feature_id"] if x >= 0 else None
-                            )
-                            attribute_issue_details_df = attribute_issue_details_df[["feature_id", "FeatureIndex", "IssueType", "Description", "x", "y"]]
-                            all_features_df = gdf[["feature_id"] + [col for col in gdf.columns if col != "geometry"]]
-                            excel_file = os.path.join(self.output_folder, f"{layer}_attribute_issues.xlsx")
-                            self._write_excel(excel_file, {
-                                "Attribute Issues": attribute_issue_details_df,
-                                "All Features": all_features_df,
-                            })
-                            print(f"  - Attribute issues and all features saved to {excel_file}")
-            self.generate_summary_pdf(self.output_folder, layer_summary, total_layers, total_features, unmatched_layers)
-            self.progress_bar.hide()
-            self.progress_label.hide()
+        total_layers = len(selected_layers)
+        self.log_message(f"Total Number of selected layers: {total_layers}")
+        self.progress_bar.setRange(0, total_layers)
+        self.progress_bar.setValue(0)
+        self.progress_bar.show()
+        self.progress_label.setText(f"Processing {total_layers} layer(s)...")
+        self.progress_label.show()
+        self.run_all_button.setEnabled(False)
+        self.cancel_button.setEnabled(True)
+
+        self._qa_run = {
+            "total_layers": total_layers,
+            "total_features": 0,
+            "layer_summary": {},
+            "unmatched_layers": [],
+        }
+        params = {
+            "min_angle": self.min_angle_spinbox.value(),
+            "max_angle": self.max_angle_spinbox.value(),
+            "min_length": self.min_length_spinbox.value(),
+            "duplicate_tolerance": self.duplicate_tolerance_spinbox.value(),
+            "excel": self.excel_report_checkbox.isChecked(),
+            "chunk_size": self.chunk_size_spinbox.value(),
+            "incremental": self.incremental_checkbox.isChecked(),
+            "excel_file": self.excel_file,
+        }
+        self.qa_worker = QAWorker(self.gdb_path, selected_layers, self.output_folder, params)
+        self.qa_worker.moveToThread(self.qa_thread)
+        self.qa_worker.progress.connect(self._on_qa_progress)
+        self.qa_worker.log.connect(self.log_message)
+        self.qa_worker.layer_done.connect(self._on_qa_layer_done)
+        self.qa_worker.finished.connect(self._on_qa_finished)
+        self.qa_thread.started.connect(self.qa_worker.run)
+        self.qa_thread.start()
+
+    def cancel_checks(self):
+        """Stop the running QA run after the layers that are already being checked."""
+        if self.qa_worker is None:
+            return
+        self.qa_worker.stop()
+        self.cancel_button.setEnabled(False)
+        self.progress_label.setText("Cancelling...")
+        self.log_message("Cancelling QA run; layers already being checked finish in the background.")
+
+    def _on_qa_progress(self, done, message):
+        self.progress_bar.setValue(done)
+        self.progress_label.setText(message)
+
+    def _on_qa_layer_done(self, result):
+        layer = result["layer"]
+        self.log_message(f"Processed Layer: {layer}")
+        for message in result["messages"]:
+            self.log_message(message)
+        if result["error"]:
+            self.log_message(f"Layer {layer} failed: {result['error']}")
+            return
+        run = self._qa_run
+        run["total_features"] += result["features"]
+        run["layer_summary"][layer] = result["summary"]
+        if result["unmatched"]:
+            run["unmatched_layers"].append(layer)
+
+    def _on_qa_finished(self, cancelled):
+        self.qa_thread.quit()
+        self.qa_thread.wait()
+        self.qa_thread.started.disconnect()
+        self.qa_worker.deleteLater()
+        self.qa_worker = None
+        self.run_all_button.setEnabled(True)
+        self.cancel_button.setEnabled(False)
+        self.progress_bar.hide()
+        self.progress_label.hide()
+
+        run, self._qa_run = self._qa_run, None
+        if cancelled:
+            self.log_message("QA run cancelled.")
+            return
+        try:
+            self.generate_summary_pdf(
+                self.output_folder,
+                run["layer_summary"],
+                run["total_layers"],
+                run["total_features"],
+                run["unmatched_layers"],
+            )
             QMessageBox.information(self, "Run All Checks", "All checks have been completed.")
         except Exception as e:
-            self.progress_label.setText(f"Error: {str(e)}")
-            self.progress_bar.hide()
             QMessageBox.critical(self, "Error", f"An error occurred: {str(e)}")
 
+    def closeEvent(self, event):
+        if self.qa_worker is not None:
+            self.qa_worker.stop()
+        if self.qa_thread.isRunning():
+            self.qa_thread.quit()
+            self.qa_thread.wait()
+        super().closeEvent(event)
+
+
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     dialog = ProcessGDBDialog()
@@ -0,0 +1,13 @@
+"""
+Shapely version probe shared by the plugin modules.
+
+The payload, layer reading and QA code use shapely 2's vectorised array
+functions when they are available and fall back to per-geometry calls on
+shapely 1.8.
+"""
+
+try:
+    import shapely
+    VECTORIZED_SHAPELY = hasattr(shapely, "get_type_id")
+except ImportError:
+    VECTORIZED_SHAPELY = False
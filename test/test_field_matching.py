@@ -0,0 +1,48 @@
+# coding=utf-8
+"""Tests for matching layer fields to KeSMIS attributes."""
+
+import unittest
+from unittest import mock
+
+from .utilities import import_plugin_module
+
+field_matching = import_plugin_module("field_matching")
+
+
+class MatchFieldsTest(unittest.TestCase):
+
+    layer_fields = ["settlement_name", "settlement_nam", "households", "remarks"]
+    api_fields = ["settlement_name", "households_count", "county"]
+
+    def test_one_api_field_per_layer_field(self):
+        mapping, table = field_matching.match_fields(self.layer_fields, self.api_fields)
+        self.assertEqual(mapping, {
+            "settlement_name": "settlement_name",
+            "settlement_nam": None,
+            "households": "households_count",
+            "remarks": None,
+        })
+        self.assertEqual([row[0] for row in table], self.layer_fields)
+        self.assertEqual(table[0], ("settlement_name", "settlement_name", "100"))
+        self.assertEqual(table[3], ("remarks", "", "-"))
+
+    def test_greedy_fallback_without_scipy(self):
+        expected = field_matching.match_fields(self.layer_fields, self.api_fields)
+        with mock.patch.object(field_matching, "linear_sum_assignment", None):
+            self.assertEqual(field_matching.match_fields(self.layer_fields, self.api_fields), expected)
+
+    def test_empty_inputs(self):
+        self.assertEqual(field_matching.match_fields([], self.api_fields), ({}, []))
+        mapping, _ = field_matching.match_fields(["name"], [])
+        self.assertEqual(mapping, {"name": None})
+
+    def test_saved_mapping_drops_missing_attributes(self):
+        mapping, table = field_matching.apply_saved_mapping(
+            ["name", "size"], ["settlement_name"], {"name": "settlement_name", "size": "area"}
+        )
+        self.assertEqual(mapping, {"name": "settlement_name", "size": None})
+        self.assertEqual(table, [("name", "settlement_name", "saved"), ("size", "", "-")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+# coding=utf-8
+"""Tests for the on-disk KeSMIS caches."""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from .utilities import import_plugin_module
+
+kesmis_cache = import_plugin_module("kesmis_cache")
+
+
+class CacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def path(self, name):
+        return os.path.join(self.folder, name)
+
+
+class JsonStoreTest(CacheTestCase):
+
+    def test_round_trip_and_clear(self):
+        store = kesmis_cache.JsonStore(self.path("store.json"))
+        store.data["answer"] = 42
+        self.assertTrue(store.save())
+        self.assertEqual(kesmis_cache.JsonStore(self.path("store.json")).data, {"answer": 42})
+        store.clear()
+        self.assertFalse(os.path.exists(self.path("store.json")))
+        self.assertEqual(store.data, {})
+
+    def test_corrupt_file_is_empty(self):
+        with open(self.path("bad.json"), "w", encoding="utf-8") as f:
+            f.write("{not json")
+        self.assertEqual(kesmis_cache.JsonStore(self.path("bad.json")).data, {})
+
+
+class PcodeResolutionCacheTest(CacheTestCase):
+
+    def test_expiry_and_invalidation(self):
+        cache = kesmis_cache.PcodeResolutionCache("https://k", "Ward", ttl=60, path=self.path("pcode.json"))
+        cache.put_many({"001": [1, 2], "002": [3, 4]})
+        cache.save()
+        reloaded = kesmis_cache.PcodeResolutionCache("https://k", "Ward", ttl=60, path=self.path("pcode.json"))
+        self.assertEqual(reloaded.get_many(["001", "002", "003"]), {"001": [1, 2], "002": [3, 4]})
+
+        reloaded.data["entries"]["001"]["ts"] = time.time() - 120
+        self.assertEqual(reloaded.get_many(["001", "002"]), {"002": [3, 4]})
+
+        reloaded.invalidate(["002"])
+        again = kesmis_cache.PcodeResolutionCache("https://k", "Ward", ttl=60, path=self.path("pcode.json"))
+        self.assertNotIn("002", again.data["entries"])
+        again.invalidate()
+        self.assertEqual(again.get_many(["001"]), {})
+
+
+class EndpointCapabilityCacheTest(CacheTestCase):
+
+    def test_remember_order_forget(self):
+        cache = kesmis_cache.EndpointCapabilityCache("https://k", ttl=60, path=self.path("caps.json"))
+        self.assertEqual(cache.ordered("geo", ["minimal", "full"]), ["minimal", "full"])
+        cache.remember("geo", "full")
+        reloaded = kesmis_cache.EndpointCapabilityCache("https://k", ttl=60, path=self.path("caps.json"))
+        self.assertEqual(reloaded.ordered("geo", ["minimal", "full"]), ["full", "minimal"])
+        self.assertEqual(
+            reloaded.ordered("geo", [("minimal", 1), ("full", 2)], key=lambda v: v[0]),
+            [("full", 2), ("minimal", 1)],
+        )
+
+        reloaded.data["endpoints"]["geo"]["ts"] = time.time() - 120
+        self.assertIsNone(reloaded.known("geo"))
+        reloaded.remember("geo", "full")
+        reloaded.forget("geo")
+        self.assertIsNone(reloaded.known("geo"))
+
+
+class FieldMappingMemoryTest(CacheTestCase):
+
+    def test_keyed_by_schema(self):
+        memory = kesmis_cache.FieldMappingMemory("https://k", path=self.path("mappings.json"))
+        memory.remember("Settlement", ["name", "area"], {"name": "settlement_name", "area": None})
+        self.assertEqual(
+            memory.recall("settlement", ["area", "name"]), {"name": "settlement_name", "area": None}
+        )
+        self.assertIsNone(memory.recall("Settlement", ["name", "area", "extra"]))
+        self.assertIsNone(memory.recall("Ward", ["name", "area"]))
+
+
+class ModelCatalogueTest(CacheTestCase):
+
+    models = [{"model": "Settlement", "attributes": [{"name": "households", "type": "integer"}]}]
+
+    def test_update_and_lookups(self):
+        catalogue = kesmis_cache.ModelCatalogue("https://k", path=self.path("models.json"))
+        self.assertEqual(catalogue.models(), [])
+        self.assertTrue(catalogue.update(self.models))
+        lookups = catalogue.lookups(self.models[0])
+        self.assertIs(lookups, catalogue.lookups({"model": "settlement"}))
+
+        self.assertFalse(catalogue.update(self.models))
+        self.assertIs(lookups, catalogue.lookups(self.models[0]))
+
+        changed = [{"model": "Settlement", "attributes": [{"name": "households", "type": "string"}]}]
+        self.assertTrue(catalogue.update(changed))
+        self.assertIsNot(lookups, catalogue.lookups(changed[0]))
+        self.assertEqual(
+            kesmis_cache.ModelCatalogue("https://k", path=self.path("models.json")).models(), changed
+        )
+
+    def test_other_version_is_discarded(self):
+        catalogue = kesmis_cache.ModelCatalogue("https://k", path=self.path("models.json"))
+        catalogue.update(self.models)
+        catalogue.data["version"] = kesmis_cache.ModelCatalogue.VERSION + 1
+        catalogue.save()
+        self.assertEqual(kesmis_cache.ModelCatalogue("https://k", path=self.path("models.json")).models(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,167 @@
+# coding=utf-8
+"""Tests for the columnar KeSMIS payload helpers."""
+
+import gzip
+import json
+import unittest
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from shapely.geometry import Point
+
+from .utilities import import_plugin_module
+
+kesmis_payload = import_plugin_module("kesmis_payload")
+
+
+class ColumnToJsonValuesTest(unittest.TestCase):
+    """Columns become lists of JSON-native values with missing values as None."""
+
+    def test_float_column(self):
+        values = kesmis_payload.column_to_json_values(pd.Series([1.5, np.nan, np.inf, -np.inf]))
+        self.assertEqual(values, [1.5, None, None, None])
+
+    def test_nullable_integer_column(self):
+        values = kesmis_payload.column_to_json_values(pd.Series([1, None, 3], dtype="Int64"))
+        self.assertEqual(values, [1, None, 3])
+        self.assertIs(type(values[0]), int)
+
+    def test_datetime_column(self):
+        series = pd.Series(pd.to_datetime(["2024-01-02", None]))
+        self.assertEqual(kesmis_payload.column_to_json_values(series), ["2024-01-02", None])
+
+    def test_object_column_with_numpy_scalars(self):
+        series = pd.Series([np.int64(4), np.float64(2.5), np.bool_(True), "text", None], dtype=object)
+        values = kesmis_payload.column_to_json_values(series)
+        self.assertEqual(values, [4, 2.5, True, "text", None])
+        json.dumps(values)
+
+
+class BuildFeaturePayloadsTest(unittest.TestCase):
+    """Payload dicts are built for the resolved rows only, in layer order."""
+
+    def setUp(self):
+        self.gdf = gpd.GeoDataFrame(
+            {
+                "name": ["A", "B", "C"],
+                "households": pd.Series([10, None, 30], dtype="Int64"),
+                "code": ["S1", "", None],
+            },
+            geometry=[Point(36.8, -1.3), Point(36.9, -1.2), None],
+            crs="EPSG:4326",
+        )
+
+    def test_payloads(self):
+        features = kesmis_payload.build_feature_payloads(
+            self.gdf,
+            {"name": "settlement_name", "households": "households", "ward": "ward_name", "code": None},
+            {0: {"ward_id": 7, "ward": "Kilimani"}, 2: {"ward_id": 8}},
+            [0, 2],
+        )
+        self.assertEqual(len(features), 2)
+        first, second = features
+        self.assertEqual(first["code"], "S1")
+        self.assertEqual(first["settlement_name"], "A")
+        self.assertEqual(first["households"], 10)
+        self.assertEqual(first["ward_id"], 7)
+        self.assertEqual(first["ward_name"], "Kilimani")
+        self.assertEqual(first["geom"], {"type": "Point", "coordinates": [36.8, -1.3]})
+        self.assertTrue(first["isApproved"])
+
+        self.assertNotIn("code", second)
+        self.assertNotIn("geom", second)
+        self.assertNotIn("ward_name", second)
+        self.assertEqual(second["settlement_name"], "C")
+        self.assertEqual(second["households"], 30)
+
+    def test_no_valid_rows(self):
+        self.assertEqual(kesmis_payload.build_feature_payloads(self.gdf, {"name": "name"}, {}, []), [])
+
+
+class CoercionPlanTest(unittest.TestCase):
+    """Mapped columns are converted to the API attribute types column by column."""
+
+    def setUp(self):
+        entity = {
+            "model": "Settlement",
+            "attributes": [
+                {"name": "is_formal", "type": "boolean"},
+                {"name": "households", "type": "integer"},
+                {"name": "area", "type": "float"},
+                {"name": "name", "type": "string"},
+                {"name": "id", "type": "integer", "readOnly": True},
+            ],
+        }
+        self.lookups = kesmis_payload.EntityLookups(entity)
+
+    def test_lookups(self):
+        self.assertNotIn("id", self.lookups.writable)
+        self.assertIn("households", self.lookups.writable)
+        self.assertNotIn("name", self.lookups.coercers)
+
+    def test_apply(self):
+        frame = pd.DataFrame({
+            "formal": ["yes", "No", "", None, True],
+            "hh": ["12", 3.7, "many", None, np.nan],
+            "size": ["1.5", 2, "x", None, np.inf],
+            "label": ["a", "  ", None, "b", "c"],
+        })
+        plan = self.lookups.coercion_plan(
+            [("formal", "is_formal"), ("hh", "households"), ("size", "area"), ("label", "name"), ("gone", "x")]
+        )
+        self.assertIs(plan, self.lookups.coercion_plan(
+            [("formal", "is_formal"), ("hh", "households"), ("size", "area"), ("label", "name"), ("gone", "x")]
+        ))
+        values = plan.apply(frame)
+        self.assertEqual(values["is_formal"], [True, False, None, None, True])
+        self.assertEqual(values["households"], [12, 3, None, None, None])
+        self.assertEqual(values["area"], [1.5, 2.0, None, None, None])
+        self.assertEqual(values["name"], ["a", None, None, "b", "c"])
+        self.assertNotIn("x", values)
+
+    def test_integer_text_matches_scalar_coercion(self):
+        values = ["12.5", "1e3", " 7 ", "-3", "1_000", "x", "", 4.9, np.int64(5), None]
+        to_int = self.lookups.coercers["households"]
+        plan = self.lookups.coercion_plan([("hh", "households")])
+        converted = plan.apply(pd.DataFrame({"hh": pd.Series(values, dtype=object)}))["households"]
+        self.assertEqual(converted, [None, None, 7, -3, 1000, None, None, 4, 5, None])
+        self.assertEqual(converted, [None if v is None else to_int(v) for v in values])
+        strings = pd.DataFrame({"hh": pd.Series(["12.5", "8"], dtype="string")})
+        self.assertEqual(plan.apply(strings)["households"], [None, 8])
+
+
+class EncodeUpsertBodyTest(unittest.TestCase):
+    """Upsert bodies can be gzip-compressed and coordinate-rounded."""
+
+    payload = {
+        "model": "settlement",
+        "data": [{"name": "A", "geom": {"type": "Point", "coordinates": [36.123456789, -1.987654321]}}],
+    }
+
+    def test_plain(self):
+        encoded = kesmis_payload.encode_upsert_body(self.payload)
+        self.assertEqual(json.loads(encoded.body), self.payload)
+        self.assertNotIn("Content-Encoding", encoded.headers)
+        self.assertEqual(encoded.json_size, encoded.full_size)
+
+    def test_compressed_and_rounded(self):
+        encoded = kesmis_payload.encode_upsert_body(self.payload, compress=True, precision=4)
+        self.assertEqual(encoded.headers["Content-Encoding"], "gzip")
+        body = json.loads(gzip.decompress(encoded.body))
+        self.assertEqual(body["data"][0]["geom"]["coordinates"], [36.1235, -1.9877])
+        self.assertLess(encoded.json_size, encoded.full_size)
+        self.assertEqual(self.payload["data"][0]["geom"]["coordinates"][0], 36.123456789)
+
+
+class ContentHashTest(unittest.TestCase):
+
+    def test_ignores_key_order_and_approval(self):
+        first = kesmis_payload.content_hash({"a": 1, "b": [1, 2], "isApproved": True})
+        second = kesmis_payload.content_hash({"b": [1, 2], "a": 1})
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, kesmis_payload.content_hash({"a": 2, "b": [1, 2]}))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,310 @@
+# coding=utf-8
+"""Tests for the QA engine checks and layer runs."""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from shapely.geometry import LineString, MultiLineString, Point, Polygon, box
+
+from .utilities import import_plugin_module
+
+qa_engine = import_plugin_module("qa_engine")
+
+
+def sharp_turns_loop(gdf, min_angle, max_angle):
+    """The plugin's original vertex-by-vertex sharp turn check."""
+    details = []
+    for idx, geom in enumerate(gdf.geometry):
+        if geom is None:
+            continue
+        lines = [geom] if isinstance(geom, LineString) else list(geom.geoms) if isinstance(geom, MultiLineString) else []
+        for line in lines:
+            if len(line.coords) < 3:
+                continue
+            coords = np.array(line.coords)
+            for i in range(1, len(coords) - 1):
+                p1, p2, p3 = coords[i - 1], coords[i], coords[i + 1]
+                v1 = p1 - p2
+                v2 = p3 - p2
+                cross = abs(v1[0] * v2[1] - v1[1] * v2[0])
+                angle = np.degrees(np.arctan2(cross, np.dot(v1, v2)))
+                if min_angle <= angle <= max_angle:
+                    details.append((idx, "Sharp Turn", round(angle, 2), p2[0], p2[1]))
+            if not line.is_simple:
+                points = line.intersection(line)
+                if points.geom_type == "Point":
+                    details.append((idx, "Self-Intersection", None, points.x, points.y))
+                elif points.geom_type == "MultiPoint":
+                    details.extend((idx, "Self-Intersection", None, pt.x, pt.y) for pt in points.geoms)
+    return details
+
+
+def duplicates_loop(gdf):
+    """Pairwise comparison of normalised geometries."""
+    pairs = []
+    geometries = list(gdf.geometry)
+    for idx, geom in enumerate(geometries):
+        if geom is None or geom.is_empty:
+            continue
+        for first in range(idx):
+            other = geometries[first]
+            if other is not None and not other.is_empty and other.normalize().equals_exact(geom.normalize(), 0):
+                pairs.append((first, idx))
+                break
+    return pairs
+
+
+def random_polygons(count, seed):
+    rng = np.random.default_rng(seed)
+    xs = rng.uniform(0, 500, count)
+    ys = rng.uniform(0, 500, count)
+    return [box(x, y, x + rng.uniform(5, 40), y + rng.uniform(5, 40)) for x, y in zip(xs, ys)]
+
+
+def random_lines(count, seed):
+    rng = np.random.default_rng(seed)
+    lines = []
+    for i in range(count):
+        vertices = np.cumsum(rng.uniform(-20, 20, (rng.integers(2, 7), 2)), axis=0) + (i * 30, 0)
+        lines.append(LineString(vertices))
+    return lines
+
+
+class OverlapTest(unittest.TestCase):
+    """Vectorised overlap pairs match the original STRtree loop."""
+
+    def setUp(self):
+        self.geometries = np.array(
+            random_polygons(300, 1) + [Point(10, 10), None, LineString([(0, 0), (50, 50)])], dtype=object
+        )
+
+    def sorted_pairs(self, left, right, areas):
+        return sorted(zip(left.tolist(), right.tolist(), np.round(areas, 6).tolist()))
+
+    def test_matches_loop(self):
+        expected = self.sorted_pairs(*qa_engine._overlapping_pairs_loop(self.geometries, 1.0))
+        self.assertTrue(expected)
+        self.assertEqual(self.sorted_pairs(*qa_engine.overlapping_pairs(self.geometries, 1.0)), expected)
+
+    def test_subset(self):
+        subset = np.arange(0, 300, 7)
+        expected = [
+            pair for pair in self.sorted_pairs(*qa_engine.overlapping_pairs(self.geometries, 1.0))
+            if pair[0] in subset or pair[1] in subset
+        ]
+        self.assertEqual(self.sorted_pairs(*qa_engine.overlapping_pairs(self.geometries, 1.0, subset=subset)), expected)
+
+
+class DuplicateGeometriesTest(unittest.TestCase):
+
+    def test_matches_pairwise_comparison(self):
+        polygons = random_polygons(50, 2)
+        polygons[10] = polygons[3]
+        polygons[20] = Polygon(list(polygons[3].exterior.coords)[::-1])
+        polygons[30] = polygons[7]
+        polygons[40] = None
+        gdf = gpd.GeoDataFrame(geometry=polygons, crs="EPSG:21037")
+        _, pairs = qa_engine.check_duplicate_geometries(gdf)
+        self.assertEqual(sorted(pairs), sorted(duplicates_loop(gdf)))
+        self.assertEqual(sorted(pairs), [(3, 10), (3, 20), (7, 30)])
+
+    def test_chunks_share_seen(self):
+        polygons = random_polygons(40, 3)
+        polygons[35] = polygons[2]
+        polygons[25] = polygons[22]
+        gdf = gpd.GeoDataFrame(geometry=polygons, crs="EPSG:21037")
+        seen, pairs = {}, []
+        for offset in range(0, 40, 15):
+            _, chunk_pairs = qa_engine.check_duplicate_geometries(gdf.iloc[offset:offset + 15], seen=seen, offset=offset)
+            pairs += chunk_pairs or []
+        self.assertEqual(sorted(pairs), sorted(qa_engine.check_duplicate_geometries(gdf)[1]))
+
+
+class SharpTurnsTest(unittest.TestCase):
+
+    def test_matches_vertex_loop(self):
+        lines = random_lines(200, 4)
+        lines[5] = LineString([(0, 0), (10, 0), (10, 10), (5, -5)])
+        lines[6] = MultiLineString([[(0, 0), (5, 1), (0, 2)], [(0, 0), (1, 0)]])
+        lines[7] = LineString([(0, 0), (1, 0)])
+        lines[8] = None
+        gdf = qa_engine.validate_geodataframe(gpd.GeoDataFrame(geometry=lines, crs="EPSG:21037"))
+        _, details = qa_engine.check_sharp_turns_self_intersections(gdf, 1, 45)
+
+        def key(detail):
+            return tuple(round(v, 6) if isinstance(v, float) else (-1 if v is None else v) for v in detail)
+
+        expected = sharp_turns_loop(gdf, 1, 45)
+        self.assertTrue(expected)
+        self.assertEqual(sorted(map(key, details)), sorted(map(key, expected)))
+
+
+@unittest.skipIf(qa_engine.pyogrio is None, "pyogrio is not installed")
+class RunLayerParityTest(unittest.TestCase):
+    """Chunked and incremental runs write the same findings as a plain whole-layer run."""
+
+    params = {"excel": False, "chunk_size": 0, "incremental": False}
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.gpkg = os.path.join(self.folder, "layers.gpkg")
+        polygons = random_polygons(120, 5)
+        polygons[50] = polygons[10]
+        polygons[60] = Polygon([(0, 0), (10, 10), (10, 0), (0, 10)])
+        self.buildings = gpd.GeoDataFrame({"name": [f"b{i % 110}" for i in range(120)]}, geometry=polygons, crs="EPSG:21037")
+        lines = random_lines(90, 6)
+        lines[40] = lines[4]
+        lines[41] = LineString([(0, 0), (1, 0)])
+        self.roads = gpd.GeoDataFrame({"width": np.arange(90.0)}, geometry=lines, crs="EPSG:21037")
+        self.write(self.buildings, self.roads)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def write(self, buildings, roads):
+        if os.path.exists(self.gpkg):
+            os.remove(self.gpkg)
+        buildings.to_file(self.gpkg, layer="buildings", driver="GPKG")
+        roads.to_file(self.gpkg, layer="roads", driver="GPKG")
+
+    def run_layers(self, name, **params):
+        output_folder = os.path.join(self.folder, name)
+        qa_engine.prepare_output_folder(output_folder)
+        summaries = {}
+        for layer in ("buildings", "roads"):
+            outcome = qa_engine.run_layer(self.gpkg, layer, output_folder, {**self.params, **params})
+            self.assertIsNone(outcome["error"])
+            summaries[layer] = outcome["summary"]
+        return summaries, self.issue_tables(output_folder)
+
+    @staticmethod
+    def issue_tables(output_folder):
+        """{file stem: rows as sorted strings} for every issue table but the attribute table."""
+        tables = {}
+        for name in os.listdir(output_folder):
+            stem, ext = os.path.splitext(name)
+            if ext == ".parquet":
+                df = pd.read_parquet(os.path.join(output_folder, name))
+            elif ext == ".csv":
+                df = pd.read_csv(os.path.join(output_folder, name))
+            else:
+                continue
+            if stem.endswith("_features"):
+                continue
+            tables[stem] = sorted(df.round(6).astype(str).agg("|".join, axis=1))
+        return tables
+
+    def test_chunked_matches_whole_layer(self):
+        whole = self.run_layers("whole")
+        chunked = self.run_layers("chunked", chunk_size=25)
+        self.assertTrue(whole[0]["buildings"]["duplicates"])
+        self.assertTrue(whole[0]["buildings"]["overlaps"])
+        self.assertTrue(whole[0]["roads"]["line_issues"])
+        self.assertEqual(chunked, whole)
+
+    def test_incremental_matches_full_run(self):
+        self.run_layers("incremental", incremental=True)
+
+        buildings = self.buildings.copy()
+        buildings.loc[20, "geometry"] = box(100, 100, 300, 300)
+        buildings.loc[21, "name"] = "renamed"
+        buildings = pd.concat([buildings.drop(index=[30, 31]), buildings.iloc[[10]]], ignore_index=True)
+        roads = self.roads.copy()
+        roads.loc[15, "geometry"] = LineString([(0, 0), (10, 0), (0, 1)])
+        roads = roads.drop(index=[16]).reset_index(drop=True)
+        self.write(gpd.GeoDataFrame(buildings, crs="EPSG:21037"), roads)
+
+        incremental = self.run_layers("incremental", incremental=True)
+        full = self.run_layers("full")
+        self.assertEqual(incremental, full)
+
+
+class CheckAttributesTest(unittest.TestCase):
+    """The attribute issue layer holds the flagged features only."""
+
+    def spec(self, field, **rules):
+        return {
+            "field": field, "type": "String", "dtype": "object", "geometry": False,
+            "options": None, "max_length": None, **rules,
+        }
+
+    def setUp(self):
+        self.gdf = gpd.GeoDataFrame(
+            {"name": ["a", "b", None, "d", "eeeeee"]},
+            geometry=[Point(i, i) for i in range(5)],
+            crs="EPSG:21037",
+        )
+
+    def check(self, *specs):
+        return qa_engine.check_attributes(self.gdf, "Road", {"Road": list(specs)}, lambda message: None)
+
+    def test_flagged_rows_only(self):
+        issues, details, matched = self.check(self.spec("name", max_length=3), self.spec("status"))
+        self.assertTrue(matched)
+        self.assertEqual(issues.index.tolist(), [2, 4])
+        feature_index = details["FeatureIndex"]
+        self.assertEqual(feature_index[feature_index >= 0].tolist(), [2, 4])
+        self.assertIn("Missing Fields", details.loc[feature_index < 0, "IssueType"].tolist())
+
+    def test_layer_wide_findings_only(self):
+        self.gdf.loc[2, "name"] = "c"
+        issues, details, _ = self.check(self.spec("name"), self.spec("status"))
+        self.assertIsNone(issues)
+        self.assertEqual(details["FeatureIndex"].unique().tolist(), [-1])
+
+
+class MatchDictionarySheetTest(unittest.TestCase):
+    """Layer names are matched to dictionary sheets regardless of case."""
+
+    dictionary = {"Road": [], "RoadAsset": [], "Structure": [], "Water Point": []}
+
+    def test_case_insensitive(self):
+        self.assertEqual(qa_engine.match_dictionary_sheet("Road", self.dictionary)[0], "Road")
+        self.assertEqual(qa_engine.match_dictionary_sheet("ROADS", self.dictionary)[0], "Road")
+        self.assertEqual(qa_engine.match_dictionary_sheet("roads", self.dictionary)[0], "Road")
+        self.assertEqual(qa_engine.match_dictionary_sheet("STRUCTURE", self.dictionary), ("Structure", 100))
+        self.assertEqual(qa_engine.match_dictionary_sheet("water_point", self.dictionary)[0], "Water Point")
+
+    def test_no_match(self):
+        self.assertIsNone(qa_engine.match_dictionary_sheet("buildings", self.dictionary))
+
+
+class IterLayerResultsTest(unittest.TestCase):
+    """A cancel is noticed while a long layer is still running in the pool."""
+
+    def test_stop_while_a_layer_runs(self):
+        release = threading.Event()
+
+        def run_layer(gdb_path, layer, output_folder, params):
+            if layer == "large":
+                release.wait(30)
+            return {"layer": layer}
+
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder, True)
+        self.addCleanup(release.set)
+        stop = threading.Event()
+        with mock.patch.object(qa_engine, "run_layer", run_layer), \
+                mock.patch.object(qa_engine, "_process_pool", ThreadPoolExecutor), \
+                mock.patch.object(qa_engine, "STOP_POLL_SECONDS", 0.05):
+            results = qa_engine.iter_layer_results(
+                "layers.gpkg", ["large", "small"], folder, {}, max_workers=2, should_stop=stop.is_set
+            )
+            self.assertEqual(next(results)["layer"], "small")
+            stop.set()
+            started = time.monotonic()
+            self.assertEqual(list(results), [])
+            self.assertLess(time.monotonic() - started, 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+# coding=utf-8
+"""Tests for uploading settlements to KeSMIS."""
+
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import pandas as pd
+
+from .utilities import import_plugin_module
+
+kesmis_payload = import_plugin_module("kesmis_payload")
+try:
+    upload = import_plugin_module("upload")
+except ImportError:
+    upload = None
+
+
+class FakeDialog:
+    """Stands in for KesMISDialog's network and payload helpers."""
+
+    def __init__(self, features, matches):
+        self.features = features
+        self.matches = matches
+        self.submitted = []
+
+    def _fetch_kesmis_geo_gdf(self, model, url, headers):
+        return None
+
+    def _build_settlement_upsert_features(self, layer_gdf, resolved, field_mapping, entity, wards_gdf=None):
+        return list(self.features), list(self.matches)
+
+    def _submit_upsert_batches(self, model, features, sent=None, **kwargs):
+        self.submitted.extend(features)
+        if sent is not None:
+            sent.append((0, len(features)))
+        return 0, len(features), 0, []
+
+
+@unittest.skipIf(upload is None, "QGIS is not available")
+class SettlementSyncWorkerUploadTest(unittest.TestCase):
+
+    features = [{"code": "S1", "name": "A"}, {"code": "S2", "name": "B"}]
+    matches = [
+        {"feature_id": 1, "current_code": "S1", "kesmis_code": "S1", "is_generated": False},
+        {"feature_id": 2, "current_code": "S2", "kesmis_code": "S2", "is_generated": False},
+    ]
+    options = {
+        "url": "https://kesmis",
+        "headers": {},
+        "dry_run": False,
+        "dry_run_limit": None,
+        "transport": (False, None),
+        "delta": True,
+        "hash_field": "kesmis_hash",
+    }
+
+    def run_upload(self, layer_gdf):
+        dialog = FakeDialog(self.features, self.matches)
+        worker = upload.SettlementSyncWorker(dialog, layer_gdf, {"model": "settlement"}, dict(self.options))
+        results, failures = [], []
+        worker.uploaded.connect(results.append)
+        worker.failed.connect(failures.append)
+        worker.run_upload(self.matches, {})
+        self.assertEqual(failures, [])
+        self.assertEqual(len(results), 1)
+        return dialog, results[0]
+
+    def test_changed_only_without_hash_field(self):
+        """The first "Changed only" sync of a layer has no hash field yet and sends everything."""
+        dialog, result = self.run_upload(pd.DataFrame({"_qgis_fid": [1, 2]}))
+        self.assertEqual(dialog.submitted, self.features)
+        self.assertEqual(result["skipped"], 0)
+        self.assertEqual(set(result["hashes"]), {1, 2})
+
+    def test_changed_only_skips_unchanged(self):
+        layer_gdf = pd.DataFrame({
+            "_qgis_fid": [1, 2],
+            "kesmis_hash": [kesmis_payload.content_hash(self.features[0]), "stale"],
+        })
+        dialog, result = self.run_upload(layer_gdf)
+        self.assertEqual(dialog.submitted, self.features[1:])
+        self.assertEqual(result["skipped"], 1)
+
+
+@unittest.skipIf(upload is None, "QGIS is not available")
+class PostUpsertPayloadTest(unittest.TestCase):
+    """Compressed upserts are resent as plain JSON only when the server could not read gzip."""
+
+    payload = {"model": "settlement", "data": [{"code": "S1"}]}
+
+    def post(self, dialog, *responses):
+        answers = [SimpleNamespace(status_code=status, text=text) for status, text in responses]
+        with mock.patch.object(upload.requests, "post", side_effect=answers) as post:
+            resp, _ = upload.KesMISDialog._post_upsert_payload(
+                dialog, "https://kesmis/upsert", self.payload, {}, transport=(True, None)
+            )
+        return resp, [call.kwargs["headers"].get("Content-Encoding") for call in post.call_args_list]
+
+    def dialog(self, accepts_gzip=None):
+        return SimpleNamespace(_server_accepts_gzip=accepts_gzip, log_message=lambda message: None)
+
+    def test_errors_are_not_resent(self):
+        for status, text in ((422, "households must be an integer"), (400, "code is required"), (500, "")):
+            dialog = self.dialog()
+            resp, sent = self.post(dialog, (status, text))
+            self.assertEqual(resp.status_code, status)
+            self.assertEqual(sent, ["gzip"])
+            self.assertIsNone(dialog._server_accepts_gzip)
+
+    def test_gzip_rejection_falls_back_to_plain_json(self):
+        for status, text in ((415, ""), (400, "Unsupported Content-Encoding: gzip")):
+            dialog = self.dialog()
+            resp, sent = self.post(dialog, (status, text), (200, "{}"))
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(sent, ["gzip", None])
+            self.assertIs(dialog._server_accepts_gzip, False)
+
+    def test_no_fallback_once_gzip_worked(self):
+        dialog = self.dialog(accepts_gzip=True)
+        resp, sent = self.post(dialog, (400, "invalid encoding of field name"))
+        self.assertEqual(sent, ["gzip"])
+        self.assertIs(dialog._server_accepts_gzip, True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,8 @@
 # coding=utf-8
 """Common functionality used by regression tests."""
 
+import importlib
+import os
 import sys
 import logging
 
@@ -59,3 +61,16 @@ def get_qgis_app():
         IFACE = QgisInterface(CANVAS)
 
     return QGIS_APP, CANVAS, IFACE, PARENT
+
+
+def import_plugin_module(name):
+    """Import a plugin module by name as part of the plugin package.
+
+    The plugin modules use relative imports, so they are loaded as
+    ``<plugin folder>.<name>`` with the folder's parent on sys.path.
+    """
+    plugin_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parent, package = os.path.split(plugin_dir)
+    if parent not in sys.path:
+        sys.path.insert(0, parent)
+    return importlib.import_module(f"{package}.{name}")
@@ -6,22 +6,35 @@ from PyQt5.QtWidgets import (
     QLineEdit, QSpinBox, QFileDialog, QComboBox, QHBoxLayout, QMessageBox,
     QGroupBox, QTextEdit, QScrollArea, QGridLayout, QWidget, QTableWidget, QApplication,
     QTableWidgetItem, QSizePolicy, QFormLayout, QStackedWidget, QTabWidget,
+    QTableView, QHeaderView, QStyledItemDelegate, QAbstractItemView,
+)
+from PyQt5.QtCore import (
+    QVariant, QSettings, Qt, QThread, pyqtSignal, pyqtSlot, QObject, QTimer,
+    QAbstractTableModel, QModelIndex, QSortFilterProxyModel,
 )
-from PyQt5.QtCore import QVariant, QSettings, Qt, QThread, pyqtSignal, QObject, QTimer
-from fuzzywuzzy import fuzz
 import json
+import numpy as np
 import geopandas as gpd
 import pandas as pd
 from qgis.core import QgsVectorLayer, QgsProject, QgsDataSourceUri
 import shortuuid
+import shapely
 from shapely.geometry import mapping, shape
 import threading
+import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from rapidfuzz import process, fuzz
-
 from .help_panel import CollapsibleHelpMixin, resize_dialog_to_screen, configure_qgis_dialog
-from .code_helper_qgis_console import is_settlement_data_layer, process_layer
+from .code_helper_qgis_console import is_settlement_data_layer, process_layer, write_attribute_values
+from .kesmis_payload import (
+    build_feature_payloads, column_to_json_values, content_hash, encode_upsert_body, format_byte_size,
+)
+from .kesmis_cache import (
+    EndpointCapabilityCache, FieldMappingMemory, ModelCatalogue, PcodeResolutionCache, clear_cache_dir,
+)
+from .field_matching import apply_saved_mapping, match_fields
+from .layer_io import LayerSnapshotCache, drop_z
+from .shapely_compat import VECTORIZED_SHAPELY
 
 
 def _join_ui_text(*parts):
@@ -70,18 +83,81 @@ def validate_and_repair_geometry(geom, tolerance=1e-8):
         return None
 
 
-def _geometries_overlap(geom_a, geom_b):
+def _intersection_area(geom_a, geom_b):
     try:
-        return geom_a.contains(geom_b) or geom_a.intersects(geom_b)
+        return geom_a.intersection(geom_b).area
     except Exception:
-        return False
+        return None
 
 
-def _intersection_area(geom_a, geom_b):
+def _settlement_overlap_pairs(local_geoms, settlements_gdf):
+    """Find every (local, KeSMIS) intersecting pair and its overlap in one pass.
+
+    Returns a DataFrame with positional ``local`` and ``kesmis`` indices and
+    an ``overlap`` score: the intersection area for polygons, 1.0 for points.
+    Pairs with no positive overlap are dropped.
+    """
+    empty = pd.DataFrame({"local": [], "kesmis": [], "overlap": []})
+    local_geoms = np.asarray(local_geoms, dtype=object)
+    if not len(local_geoms) or settlements_gdf.empty:
+        return empty
+
+    present = np.array([g is not None and not g.is_empty for g in local_geoms], dtype=bool)
+    positions = np.flatnonzero(present)
+    if not len(positions):
+        return empty
+
+    sindex = settlements_gdf.sindex
     try:
-        return geom_a.intersection(geom_b).area
-    except Exception:
+        local_idx, kesmis_idx = sindex.query(local_geoms[positions], predicate="intersects")
+    except (TypeError, ValueError):
+        local_idx, kesmis_idx = sindex.query_bulk(local_geoms[positions], predicate="intersects")
+    if not len(local_idx):
+        return empty
+    local_idx = positions[local_idx]
+
+    left = local_geoms[local_idx]
+    right = np.asarray(settlements_gdf.geometry.values, dtype=object)[kesmis_idx]
+    overlap = None
+    if VECTORIZED_SHAPELY:
+        try:
+            is_point = shapely.get_type_id(left) == 0
+            overlap = shapely.area(shapely.intersection(left, right))
+            overlap = np.where(is_point, 1.0, overlap)
+        except Exception:
+            overlap = None
+    if overlap is None:
+        overlap = np.array(
+            [
+                1.0 if a.geom_type == "Point" else (_intersection_area(b, a) or 0.0)
+                for a, b in zip(left, right)
+            ],
+            dtype=float,
+        )
+
+    pairs = pd.DataFrame({"local": local_idx, "kesmis": kesmis_idx, "overlap": overlap})
+    return pairs[pairs["overlap"] > 0]
+
+
+PARENT_ID_KEYS = {
+    "settlement": "settlement_id",
+    "ward": "ward_id",
+    "subcounty": "subcounty_id",
+    "county": "county_id",
+}
+
+
+def _parent_ids_from_record(parent_entity, record):
+    """Build the parent id hierarchy for a matched parent record (settlement/ward/...)."""
+    key = PARENT_ID_KEYS.get((parent_entity or "").lower())
+    if not key or pd.isna(record.get("id")):
         return None
+    data = {key: int(record["id"])}
+    for other_key in PARENT_ID_KEYS.values():
+        value = record.get(other_key)
+        if other_key != key and value is not None and not pd.isna(value):
+            data[other_key] = int(value)
+    return data
 
 
 def _shape_from_geojson(geom_dict):
@@ -173,6 +249,12 @@ class SearchableComboBox(QComboBox):
         self._item_data = {}
         self._populate_dropdown(filter_text="", selected_text="-")
 
+    def clear(self):
+        """Remove every item, including the stored list used for filtering."""
+        self._source_items = []
+        self._item_data = {}
+        super().clear()
+
     def setItemData(self, index, value, role=Qt.UserRole):
         """Persist item data by text so it survives dropdown rebuilds."""
         text = self.itemText(index)
@@ -260,6 +342,148 @@ class SearchableComboBox(QComboBox):
             self._populate_dropdown(filter_text="", selected_text=text)
 
 
+class SettlementMatchModel(QAbstractTableModel):
+    """Table model for the settlement sync review: one row per local feature.
+
+    Rows with several intersecting KeSMIS settlements keep the index of the
+    chosen candidate; rows with none get a generated code for a new settlement.
+    """
+
+    HEADERS = ["Local Settlement", "Current Code", "KeSMIS Match", "Code To Apply", "Action", "Status"]
+    MATCH_COLUMN = 2
+    CandidatesRole = Qt.UserRole + 1
+    ChoiceRole = Qt.UserRole + 2
+
+    def __init__(self, matches, generated_codes, status_func, parent=None):
+        super().__init__(parent)
+        self._matches = matches
+        self._choices = [0] * len(matches)
+        self._generated = {
+            row: {
+                "kesmis_label": "No KeSMIS intersection — new settlement",
+                "kesmis_code": code,
+                "generated": True,
+            }
+            for row, code in generated_codes.items()
+        }
+        self._status_func = status_func
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._matches)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def category(self, row):
+        count = len(self._matches[row]["candidates"])
+        if count > 1:
+            return "multiple"
+        return "single" if count == 1 else "new"
+
+    def selected(self, row):
+        """Return the candidate dict currently applied to ``row``."""
+        candidates = self._matches[row]["candidates"]
+        if candidates:
+            return candidates[self._choices[row]]
+        return self._generated[row]
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.column() == self.MATCH_COLUMN and self.category(index.row()) == "multiple":
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row, column = index.row(), index.column()
+        match = self._matches[row]
+        if role == self.CandidatesRole:
+            return match["candidates"]
+        if role == self.ChoiceRole:
+            return self._choices[row]
+        if role not in (Qt.DisplayRole, Qt.ToolTipRole, Qt.EditRole):
+            return None
+
+        selected = self.selected(row)
+        is_create = selected.get("generated", False)
+        if column == 0:
+            return match["local_label"]
+        if column == 1:
+            return match["current_code"]
+        if column == 2:
+            if len(match["candidates"]) > 1:
+                text = f"{selected['kesmis_label']} ({selected['kesmis_code']})"
+                if role == Qt.ToolTipRole:
+                    return f"{len(match['candidates'])} KeSMIS settlements intersect — double-click to choose"
+                return f"{text} ▾"
+            return selected["kesmis_label"]
+        if column == 3:
+            return selected["kesmis_code"]
+        if column == 4:
+            return "Create on KeSMIS" if is_create else "Update on KeSMIS"
+        return self._status_func(match["current_code"], selected.get("kesmis_code"), is_create=is_create)
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.EditRole or index.column() != self.MATCH_COLUMN:
+            return False
+        row = index.row()
+        candidates = self._matches[row]["candidates"]
+        if not 0 <= value < len(candidates) or value == self._choices[row]:
+            return False
+        self._choices[row] = value
+        self.dataChanged.emit(self.index(row, self.MATCH_COLUMN), self.index(row, len(self.HEADERS) - 1))
+        return True
+
+
+class SettlementMatchFilterProxy(QSortFilterProxyModel):
+    """Text filter across all columns plus a match-category filter."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._category = None
+        self.setFilterKeyColumn(-1)
+        self.setFilterCaseSensitivity(Qt.CaseInsensitive)
+
+    def set_category(self, category):
+        self._category = category or None
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        if self._category and self.sourceModel().category(source_row) != self._category:
+            return False
+        return super().filterAcceptsRow(source_row, source_parent)
+
+
+class CandidateChoiceDelegate(QStyledItemDelegate):
+    """Combo box editor for picking one of several intersecting KeSMIS settlements."""
+
+    def createEditor(self, parent, option, index):
+        candidates = index.data(SettlementMatchModel.CandidatesRole) or []
+        if len(candidates) < 2:
+            return None
+        combo = QComboBox(parent)
+        for candidate in candidates:
+            combo.addItem(f"{candidate['kesmis_label']} ({candidate['kesmis_code']})")
+        combo.activated.connect(lambda _idx, editor=combo: self._commit_and_close(editor))
+        return combo
+
+    def _commit_and_close(self, editor):
+        self.commitData.emit(editor)
+        self.closeEditor.emit(editor)
+
+    def setEditorData(self, editor, index):
+        editor.setCurrentIndex(index.data(SettlementMatchModel.ChoiceRole) or 0)
+
+    def setModelData(self, editor, model, index):
+        model.setData(index, editor.currentIndex(), Qt.EditRole)
+
+
 class Worker(QObject):
     """Worker object to run fetch_pcode_data in a background thread."""
     progress = pyqtSignal(int)
@@ -292,7 +516,7 @@ class Worker(QObject):
         """Convert geometry to 2D by dropping Z dimension."""
         if geom is None:
             return None
-        return shape(mapping(force_2d(geom)))
+        return force_2d(geom)
 
     def fetch_settlements_geojson(self):
         """Fetch parent GeoJSON from the server or a user-selected local cache file."""
@@ -418,59 +642,84 @@ class Worker(QObject):
             self.log.emit(f"Error fetching {self.parent_entity_name} GeoJSON: {str(e)}")
             raise
 
-    def process_pcode_batch(self, start, batch_indices, batch_codes, batch_num, total_items, batch_size):
-        """Process a batch of pcode-based queries."""
-        if not self._is_running:
-            return 0, []
+    def fetch_pcode_batch(self, codes):
+        """Resolve one batch of codes on the server. Returns (records or None on failure, seconds)."""
+        started = time.monotonic()
         try:
-            self.log.emit(
-                f"Processing pcode batch {batch_num} "
-                f"({start+1}–{min(start+batch_size, total_items)} of {total_items})"
-            )
             response = requests.post(
                 f"{self.url}/api/v1/data/many/code",
                 headers={"Authorization": f"Bearer {self.token}", "x-access-token": self.token},
-                json={"model": self.parent_entity_name, "codes": batch_codes},
+                json={"model": self.parent_entity_name, "codes": codes},
                 timeout=30
             )
-            if response.status_code == 200:
-                payload = response.json()
-                records = payload.get("data", [])
-                code_map = {r["code"]: r for r in records}
-                batch_results = []
-                for row_idx, pcode in batch_indices:
-                    rec = code_map.get(pcode)
-                    if rec and rec.get("id"):
-                        parent = self.parent_entity_name.lower()
-                        if parent == "settlement":
-                            key = "settlement_id"
-                        elif parent == "ward":
-                            key = "ward_id"
-                        elif parent == "subcounty":
-                            key = "subcounty_id"
-                        elif parent == "county":
-                            key = "county_id"
-                        else:
-                            key = None
-                        if key:
-                            data = {
-                                key: int(rec["id"]) if rec.get("id") is not None else None,
-                                **({"settlement_id": int(rec.get("settlement_id")) if rec.get("settlement_id") is not None else None} if key != "settlement_id" else {}),
-                                **({"ward_id": int(rec.get("ward_id")) if rec.get("ward_id") is not None else None} if key != "ward_id" else {}),
-                                **({"subcounty_id": int(rec.get("subcounty_id")) if rec.get("subcounty_id") is not None else None} if key != "subcounty_id" else {}),
-                                **({"county_id": int(rec.get("county_id")) if rec.get("county_id") is not None else None} if key != "county_id" else {})
-                            }
-                            batch_results.append((row_idx, data))
-                            self.log.emit(f"Batch-fetched data for index {row_idx}: {data}")
-                    else:
-                        self.log.emit(f"No data for pcode '{pcode}' at index {row_idx}")
-                return len(batch_codes), batch_results
-            else:
-                self.log.emit(f"Batch {batch_num} request failed: {response.text}")
-                return len(batch_codes), []
+            if response.status_code != 200:
+                self.log.emit(f"Pcode batch request failed: {response.text[:300]}")
+                return None, time.monotonic() - started
+            return response.json().get("data", []), time.monotonic() - started
         except Exception as e:
-            self.log.emit(f"Batch {batch_num} error: {str(e)}")
-            return len(batch_codes), []
+            self.log.emit(f"Pcode batch error: {str(e)}")
+            return None, time.monotonic() - started
+
+    def resolve_pcodes(self, codes, max_workers=3, progress_callback=None):
+        """Resolve codes to parent id hierarchies using the local cache first.
+
+        Codes are deduplicated, cache hits skip the network entirely, and the
+        remaining misses are sent in concurrent batches whose size adapts to
+        server latency (halved and retried once on failure).
+        """
+        unique_codes = list(dict.fromkeys(codes))
+        cache = PcodeResolutionCache(self.url, self.parent_entity_name)
+        resolved = cache.get_many(unique_codes)
+        pending = [code for code in unique_codes if code not in resolved]
+        self.log.emit(
+            f"Pcode lookup: {len(unique_codes)} distinct code(s), "
+            f"{len(resolved)} from local cache, {len(pending)} to fetch."
+        )
+
+        batch_size = 500
+        retried = set()
+        fetched = {}
+        done = len(resolved)
+        while pending and self._is_running:
+            wave = []
+            while pending and len(wave) < max_workers:
+                wave.append(pending[:batch_size])
+                pending = pending[batch_size:]
+
+            slowest = 0.0
+            failed = False
+            with ThreadPoolExecutor(max_workers=len(wave)) as executor:
+                futures = {executor.submit(self.fetch_pcode_batch, batch): batch for batch in wave}
+                for future in as_completed(futures):
+                    batch = futures[future]
+                    records, elapsed = future.result()
+                    slowest = max(slowest, elapsed)
+                    if records is None:
+                        failed = True
+                        retry = [code for code in batch if code not in retried]
+                        retried.update(retry)
+                        pending.extend(retry)
+                        continue
+                    for rec in records:
+                        ids = _parent_ids_from_record(self.parent_entity_name, rec)
+                        if ids and rec.get("code") is not None:
+                            fetched[str(rec["code"]).strip()] = ids
+                    done += len(batch)
+                    if progress_callback:
+                        progress_callback(done, len(unique_codes))
+
+            if failed:
+                batch_size = max(50, batch_size // 2)
+            elif slowest < 5:
+                batch_size = min(2000, batch_size * 2)
+            elif slowest > 15:
+                batch_size = max(50, batch_size // 2)
+
+        if fetched:
+            cache.put_many(fetched)
+            cache.save()
+        resolved.update(fetched)
+        return resolved
 
     def run(self):
         """
@@ -509,18 +758,14 @@ class Worker(QObject):
             pcode_entity_data = {}
             valid_feature_indices = []
             lock = threading.Lock()
-            batch_size = 500
             max_workers = 3
             processed_items = 0
             total_items = len(self.gdf)
 
             # ── STEP 1: Local intersection for all rows with geometry ─────────────
             # 1.1: Build a list of indices where geometry is non‐null
-            intersection_indices = [
-                row_idx
-                for row_idx, _ in self.gdf.iterrows()
-                if self.gdf.loc[row_idx, "geojson"] is not None
-            ]
+            has_geometry = self.gdf.geometry.notna() & ~self.gdf.geometry.is_empty
+            intersection_indices = self.gdf.index[has_geometry].tolist()
             self.log.emit(f"Processing {len(intersection_indices)} rows with local intersection.")
 
             if intersection_indices:
@@ -529,9 +774,6 @@ class Worker(QObject):
 
                 # 1.3: Build a GeoDataFrame of all features for intersection
                 unmatched_gdf_full = self.gdf.loc[intersection_indices].copy()
-                unmatched_gdf_full["geometry"] = unmatched_gdf_full["geojson"].apply(
-                    lambda x: shape(x) if x else None
-                )
                 unmatched_gdf_full = unmatched_gdf_full[
                     unmatched_gdf_full["geometry"].notnull()
                 ].reset_index(drop=False)
@@ -594,28 +836,8 @@ class Worker(QObject):
                         if matched_intersect_id is not None:
                             settlement = settlements_gdf.iloc[matched_intersect_id]
                             parent = self.parent_entity_name.lower()
-                            if parent == "settlement":
-                                key = "settlement_id"
-                            elif parent == "ward":
-                                key = "ward_id"
-                            elif parent == "subcounty":
-                                key = "subcounty_id"
-                            elif parent == "county":
-                                key = "county_id"
-                            else:
-                                key = None
-
-                            if key and settlement.get("id") is not None:
-                                data = {key: int(settlement["id"])}
-                                if parent != "settlement" and settlement.get("settlement_id") is not None:
-                                    data["settlement_id"] = int(settlement["settlement_id"])
-                                if parent != "ward" and settlement.get("ward_id") is not None:
-                                    data["ward_id"] = int(settlement["ward_id"])
-                                if parent != "subcounty" and settlement.get("subcounty_id") is not None:
-                                    data["subcounty_id"] = int(settlement["subcounty_id"])
-                                if parent != "county" and settlement.get("county_id") is not None:
-                                    data["county_id"] = int(settlement["county_id"])
-
+                            data = _parent_ids_from_record(parent, settlement)
+                            if data:
                                 with lock:
                                     pcode_entity_data[original_idx] = data
                                     valid_feature_indices.append(original_idx)
@@ -668,28 +890,8 @@ class Worker(QObject):
                         if best_idx is not None:
                             settlement = settlements_gdf.iloc[best_idx]
                             parent = self.parent_entity_name.lower()
-                            if parent == "settlement":
-                                key = "settlement_id"
-                            elif parent == "ward":
-                                key = "ward_id"
-                            elif parent == "subcounty":
-                                key = "subcounty_id"
-                            elif parent == "county":
-                                key = "county_id"
-                            else:
-                                key = None
-
-                            if key and settlement.get("id") is not None:
-                                data = {key: int(settlement["id"])}
-                                if parent != "settlement" and settlement.get("settlement_id") is not None:
-                                    data["settlement_id"] = int(settlement["settlement_id"])
-                                if parent != "ward" and settlement.get("ward_id") is not None:
-                                    data["ward_id"] = int(settlement["ward_id"])
-                                if parent != "subcounty" and settlement.get("subcounty_id") is not None:
-                                    data["subcounty_id"] = int(settlement["subcounty_id"])
-                                if parent != "county" and settlement.get("county_id") is not None:
-                                    data["county_id"] = int(settlement["county_id"])
-
+                            data = _parent_ids_from_record(parent, settlement)
+                            if data:
                                 with lock:
                                     pcode_entity_data[original_idx] = data
                                     valid_feature_indices.append(original_idx)
@@ -743,29 +945,8 @@ class Worker(QObject):
 
                         if matched_settlement is not None:
                             parent = self.parent_entity_name.lower()
-                            if parent == "settlement":
-                                key = "settlement_id"
-                            elif parent == "ward":
-                                key = "ward_id"
-                            elif parent == "subcounty":
-                                key = "subcounty_id"
-                            elif parent == "county":
-                                key = "county_id"
-                            else:
-                                key = None
-
-                            if key and matched_settlement.get("id") is not None:
-                                data = {key: int(matched_settlement["id"])}
-                                # copy up the other parent‐IDs if needed:
-                                if parent != "settlement" and matched_settlement.get("settlement_id") is not None:
-                                    data["settlement_id"] = int(matched_settlement["settlement_id"])
-                                if parent != "ward" and matched_settlement.get("ward_id") is not None:
-                                    data["ward_id"] = int(matched_settlement["ward_id"])
-                                if parent != "subcounty" and matched_settlement.get("subcounty_id") is not None:
-                                    data["subcounty_id"] = int(matched_settlement["subcounty_id"])
-                                if parent != "county" and matched_settlement.get("county_id") is not None:
-                                    data["county_id"] = int(matched_settlement["county_id"])
-
+                            data = _parent_ids_from_record(parent, matched_settlement)
+                            if data:
                                 with lock:
                                     pcode_entity_data[original_idx] = data
                                     valid_feature_indices.append(original_idx)
@@ -777,50 +958,37 @@ class Worker(QObject):
             # ── STEP 2: Pcode matching for unmatched rows ─────────────────────────────────────
             unmatched_indices = [
                 row_idx
-                for row_idx, _ in self.gdf.iterrows()
+                for row_idx in self.gdf.index
                 if row_idx not in pcode_entity_data
             ]
             
             if has_pcode and unmatched_indices:
                 # Filter to only rows that actually have pcode values
+                pcodes = self.gdf.loc[unmatched_indices, "pcode"]
                 index_to_pcode = [
-                    (row_idx, self.gdf.loc[row_idx, "pcode"])
-                    for row_idx in unmatched_indices
-                    if row_idx in self.gdf.index and self.gdf.loc[row_idx].get("pcode")
+                    (row_idx, str(pcode).strip())
+                    for row_idx, pcode in pcodes.items()
+                    if pcode is not None and not pd.isna(pcode) and str(pcode).strip()
                 ]
                 self.log.emit(f"Found {len(index_to_pcode)} unmatched rows with pcode values for fallback matching.")
 
                 if index_to_pcode:
-                    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                        futures = []
-                        for start in range(0, len(index_to_pcode), batch_size):
-                            batch_indices = index_to_pcode[start : start + batch_size]
-                            batch_codes = [p for _, p in batch_indices]
-                            batch_num = (start // batch_size) + 1
-                            futures.append(
-                                executor.submit(
-                                    self.process_pcode_batch,
-                                    start,
-                                    batch_indices,
-                                    batch_codes,
-                                    batch_num,
-                                    len(index_to_pcode),
-                                    batch_size,
-                                )
-                            )
-
-                        for future in as_completed(futures):
-                            if not self._is_running:
-                                self.log.emit("Worker stopped during pcode processing.")
-                                break
-                            processed, batch_results = future.result()
-                            with lock:
-                                processed_items += processed
-                                for row_idx, data in batch_results:
-                                    pcode_entity_data[row_idx] = data
-                                    valid_feature_indices.append(row_idx)
-                                progress = int((processed_items / total_items) * 100)
-                                self.progress.emit(min(progress, 100))  # up to 100% for pcode
+                    def report_progress(done, total_codes):
+                        self.progress.emit(min(int(done / max(total_codes, 1) * 100), 100))
+
+                    resolved = self.resolve_pcodes(
+                        [code for _, code in index_to_pcode],
+                        max_workers=max_workers,
+                        progress_callback=report_progress,
+                    )
+                    for row_idx, pcode in index_to_pcode:
+                        data = resolved.get(pcode)
+                        if data:
+                            pcode_entity_data[row_idx] = dict(data)
+                            valid_feature_indices.append(row_idx)
+                            processed_items += 1
+                        else:
+                            self.log.emit(f"No data for pcode '{pcode}' at index {row_idx}")
 
             # ── FINALIZE ─────────────────────────────────────────────────
             if pcode_entity_data:
@@ -846,11 +1014,12 @@ class FieldMatchingWorker(QObject):
     finished = pyqtSignal()  # Signal when done
     result = pyqtSignal(dict, list)  # Emit field_mapping and table_data
 
-    def __init__(self, layer, entity, pcode_fields):
+    def __init__(self, layer, entity, pcode_fields, mapping_memory=None):
         super().__init__()
         self.layer = layer
         self.entity = entity
         self.pcode_fields = pcode_fields
+        self.mapping_memory = mapping_memory
 
     def stop(self):
         """Signal the worker to stop execution."""
@@ -858,63 +1027,22 @@ class FieldMatchingWorker(QObject):
         self.log.emit("Field matching worker stopped.")
 
     def run(self):
-        """Perform field matching in the background, picking the best match per API field."""
+        """Match layer fields to API attributes, reusing a saved mapping for a known layer schema."""
         try:
             layer_fields    = [f.name() for f in self.layer.fields()]
             fields_to_match = layer_fields + self.pcode_fields
             api_fields      = [attr["name"] for attr in self.entity.get("attributes", [])]
-            field_mapping   = {}
-            table_data      = []
-            scores          = {}  # store scores by layer field
-
-            total = len(fields_to_match)
-            # 1) Initial best‐of‐all matching
-            for idx, field in enumerate(fields_to_match):
-                candidates = process.extract(
-                    field,
-                    api_fields,
-                    scorer=fuzz.ratio,
-                    score_cutoff=70
-                )
-                if candidates:
-                    best_field, best_score, _ = max(candidates, key=lambda x: x[1])
-                    field_mapping[field] = best_field
-                    scores[field] = best_score
-                    table_data.append([field, best_field, str(int(best_score))])
-                else:
-                    field_mapping[field] = None
-                    scores[field] = 0
-                    table_data.append([field, "", "-"])
-
-                # progress update
-                percent = int((idx + 1) / total * 100)
-                self.progress.emit(min(percent, 99))
-                QThread.msleep(50)
-
-            # 2) Enforce unique API-field assignments
-            reverse_map = {}
-            for lf, af in field_mapping.items():
-                if af:
-                    reverse_map.setdefault(af, []).append(lf)
-
-            for api_field, layer_list in reverse_map.items():
-                if len(layer_list) > 1:
-                    # sort by descending score, keep the top one
-                    sorted_layers = sorted(layer_list, key=lambda lf: scores[lf], reverse=True)
-                    for duplicate in sorted_layers[1:]:
-                        field_mapping[duplicate] = None
-                        # clear its entry in table_data
-                        for row in table_data:
-                            if row[0] == duplicate:
-                                row[1] = ""
-                                row[2] = "-"
-                                break
-
-            # 3) Emit results
-            self.log.emit("Field matching completed in background thread.")
-            # convert each row back to tuple for the table
-            final_table = [(row[0], row[1], row[2]) for row in table_data]
-            self.result.emit(field_mapping, final_table)
+            model           = self.entity.get("model", "")
+
+            saved = self.mapping_memory.recall(model, fields_to_match) if self.mapping_memory else None
+            if saved is not None:
+                field_mapping, table_data = apply_saved_mapping(fields_to_match, api_fields, saved)
+                self.log.emit("Reused the field mapping saved for this layer schema.")
+            else:
+                field_mapping, table_data = match_fields(fields_to_match, api_fields)
+                self.log.emit("Field matching completed in background thread.")
+
+            self.result.emit(field_mapping, table_data)
             self.progress.emit(100)
             self.finished.emit()
 
@@ -923,6 +1051,166 @@ class FieldMatchingWorker(QObject):
             self.finished.emit()
 
 
+class SettlementSyncWorker(QObject):
+    """Worker object running the network and matching stages of a settlement sync.
+
+    ``run_matching`` fetches KeSMIS settlements and matches them to the layer.
+    The dialog shows the review on the GUI thread and, when accepted, queues
+    ``run_upload``, which loads ward boundaries, builds the payloads and
+    uploads them. Layer edits are left to the dialog.
+    """
+    progress = pyqtSignal(object, str, bool)  # value (or None), message, indeterminate
+    matched = pyqtSignal(object)  # list of match dicts
+    uploaded = pyqtSignal(object)  # dict with upload counts and errors
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal(object)  # matches of features already uploaded, or None
+
+    def __init__(self, dialog, layer_gdf, entity, options):
+        super().__init__()
+        self.dialog = dialog
+        self.layer_gdf = layer_gdf
+        self.entity = entity
+        self.options = options
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        """Ask the worker to stop at the next stage or upload batch."""
+        self._stop_event.set()
+
+    def is_stopped(self):
+        return self._stop_event.is_set()
+
+    def _report(self, value=None, message="", indeterminate=False):
+        self.progress.emit(value, message or "", indeterminate)
+
+    @pyqtSlot()
+    def run_matching(self):
+        try:
+            self._report(5, "Fetching KeSMIS settlements...", True)
+            settlements_gdf = self.dialog._fetch_kesmis_settlements_gdf(
+                self.options["url"], self.options["headers"]
+            )
+            if self.is_stopped():
+                self.cancelled.emit(None)
+                return
+            matches, _ = self.dialog._compute_settlement_matches(
+                None,
+                settlements_gdf,
+                layer_gdf=self.layer_gdf,
+                progress_callback=self._report,
+            )
+            if self.is_stopped():
+                self.cancelled.emit(None)
+                return
+            self.matched.emit(matches)
+        except Exception as e:
+            self.failed.emit(str(e))
+
+    def _drop_unchanged(self, features, feature_matches, hashes):
+        """Remove features whose content hash matches the one stored at the last sync."""
+        hash_field = self.options["hash_field"]
+        if hash_field not in self.layer_gdf.columns:
+            return features, feature_matches, 0
+        stored = dict(zip(self.layer_gdf["_qgis_fid"].tolist(), self.layer_gdf[hash_field].tolist()))
+        kept, kept_matches = [], []
+        for feature, match in zip(features, feature_matches):
+            unchanged = (
+                not match.get("is_generated")
+                and match.get("current_code") == match.get("kesmis_code")
+                and stored.get(match["feature_id"]) == hashes[match["feature_id"]]
+            )
+            if not unchanged:
+                kept.append(feature)
+                kept_matches.append(match)
+        return kept, kept_matches, len(features) - len(kept)
+
+    def _uploaded_matches(self, resolved, feature_matches, sent):
+        """Resolved matches of the features in batches the server answered before a cancel.
+
+        Codes generated for those features now exist on KeSMIS and must be
+        written back to the layer, or the next sync would create them again.
+        """
+        if self.options["dry_run"] or not sent:
+            return None
+        uploaded = {feature_matches[i]["feature_id"] for start, end in sent for i in range(start, end)}
+        return [match for match in resolved if match["feature_id"] in uploaded]
+
+    @pyqtSlot(object, object)
+    def run_upload(self, resolved, field_mapping):
+        try:
+            self._report(70, "Loading ward boundaries...", True)
+            wards_gdf = self.dialog._fetch_kesmis_geo_gdf(
+                "ward", self.options["url"], self.options["headers"]
+            )
+            if self.is_stopped():
+                self.cancelled.emit(None)
+                return
+
+            self._report(80, "Preparing records for upload...", False)
+            features, feature_matches = self.dialog._build_settlement_upsert_features(
+                self.layer_gdf,
+                resolved,
+                field_mapping,
+                self.entity,
+                wards_gdf=wards_gdf,
+            )
+            hashes = {
+                match["feature_id"]: content_hash(feature)
+                for feature, match in zip(features, feature_matches)
+            }
+            skipped = 0
+            if self.options["delta"]:
+                features, feature_matches, skipped = self._drop_unchanged(features, feature_matches, hashes)
+            result = {"resolved": resolved, "features": len(features), "skipped": skipped, "hashes": {}}
+            sent = []
+            if features:
+                inserted, updated, failed, errors = self.dialog._submit_upsert_batches(
+                    self.entity["model"],
+                    features,
+                    dry_run=self.options["dry_run"],
+                    dry_run_limit=self.options["dry_run_limit"],
+                    progress_start=85,
+                    progress_end=98,
+                    progress_callback=self._report,
+                    should_stop=self.is_stopped,
+                    transport=self.options["transport"],
+                    sent=sent,
+                )
+                result.update(inserted=inserted, updated=updated, failed=failed, errors=errors)
+                # Hashes are only recorded when every record was accepted, so a
+                # partly failed upload is retried in full on the next sync.
+                if not failed and not self.options["dry_run"] and not self.is_stopped():
+                    result["hashes"] = hashes
+            if self.is_stopped():
+                self.cancelled.emit(self._uploaded_matches(resolved, feature_matches, sent))
+                return
+            self.uploaded.emit(result)
+        except Exception as e:
+            self.failed.emit(str(e))
+
+
+class ModelCatalogueWorker(QObject):
+    """Worker object that downloads the KeSMIS model list in a background thread."""
+    log = pyqtSignal(str)  # Emit log messages
+    finished = pyqtSignal()  # Signal when done
+    result = pyqtSignal(list)  # Emit the list of model dicts
+
+    def __init__(self, url, token):
+        super().__init__()
+        self.url = url
+        self.token = token
+
+    def run(self):
+        try:
+            headers = {"Authorization": f"Bearer {self.token}", "x-access-token": self.token}
+            response = requests.get(f"{self.url}/api/v1/models/list", headers=headers, timeout=30)
+            if response.status_code == 200:
+                self.result.emit(response.json().get("models", []))
+            else:
+                self.log.emit(f"Failed to fetch entities: {response.text}")
+        except Exception as e:
+            self.log.emit(f"Error fetching entities: {str(e)}")
+        finally:
             self.finished.emit()
 
 
@@ -986,6 +1274,23 @@ def _format_import_http_error(response, fallback, format_error_lines=None):
     return fallback
 
 
+_GZIP_REJECTION_HINTS = ("encoding", "gzip", "deflate", "compress", "inflate")
+
+
+def _rejects_gzip_body(response):
+    """Return True when an error response says the server could not read a gzip request body.
+
+    That is HTTP 415, or HTTP 400 whose body mentions the (content) encoding
+    or compression. Other errors, such as validation failures, are left
+    alone so the upsert is not sent twice.
+    """
+    if response.status_code == 415:
+        return True
+    if response.status_code != 400:
+        return False
+    text = (response.text or "")[:2000].lower()
+    return any(hint in text for hint in _GZIP_REJECTION_HINTS)
+
 def kesmis_validate_token(url, token):
     """Return True when a saved KeSMIS token is still valid."""
     if not url or not token:
@@ -1188,6 +1493,9 @@ class KesMISLoginDialog(QDialog):
 
 
 class KesMISDialog(QDialog, CollapsibleHelpMixin):
+    settlement_upload_requested = pyqtSignal(object, object)  # resolved matches, field mapping
+    log_requested = pyqtSignal(str)
+
     def __init__(self, parent=None, server_url="", username="", token=None):
         super().__init__(parent)
         configure_qgis_dialog(self, parent)
@@ -1206,6 +1514,11 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
         self.valid_feature_indices = []
         self.gdf = None
         self._full_table_data = []
+        self._server_accepts_gzip = None
+        self._layer_snapshots = LayerSnapshotCache()
+        self._endpoint_capabilities = EndpointCapabilityCache(self.server_url)
+        self._mapping_memory = FieldMappingMemory(self.server_url)
+        self._model_catalogue = ModelCatalogue(self.server_url)
 
         # Main widget and layout
         main_widget = QWidget()
@@ -1239,7 +1552,21 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
         )
         settlement_layout.addWidget(QLabel("Select Settlement Layer:"))
         settlement_layout.addWidget(self.settlement_layer_combo, 1)
+        self.delta_sync_checkbox = QCheckBox("Changed only")
+        self.delta_sync_checkbox.setToolTip(
+            "Send only new settlements and settlements whose mapped attributes or geometry "
+            "changed since the last sync (tracked in the 'kesmis_hash' field)."
+        )
+        self.delta_sync_checkbox.setChecked(self.settings.value("settlement_delta_sync", True, type=bool))
+        self.delta_sync_checkbox.toggled.connect(
+            lambda checked: self.settings.setValue("settlement_delta_sync", checked)
+        )
+        settlement_layout.addWidget(self.delta_sync_checkbox)
         settlement_layout.addWidget(self.sync_settlement_codes_button)
+        self.cancel_settlement_sync_button = QPushButton("Cancel Sync")
+        self.cancel_settlement_sync_button.clicked.connect(self.cancel_settlement_sync)
+        self.cancel_settlement_sync_button.setVisible(False)
+        settlement_layout.addWidget(self.cancel_settlement_sync_button)
 
         self.code_guidance_label = QLabel("")
         self.code_guidance_label.setWordWrap(True)
@@ -1329,6 +1656,36 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
         dry_run_layout.addWidget(self.dry_run_spinbox)
         dry_run_layout.addStretch()
         mapping_layout.addLayout(dry_run_layout)
+
+        # Upload transport options
+        transport_layout = QHBoxLayout()
+        self.compress_upload_checkbox = QCheckBox("Compress uploads (gzip)")
+        self.compress_upload_checkbox.setChecked(
+            str(self.settings.value("upload_compress", "false")).lower() == "true"
+        )
+        self.compress_upload_checkbox.setToolTip(
+            "Send upsert batches gzip-compressed. Falls back to plain JSON if the server or a proxy rejects it."
+        )
+        self.compress_upload_checkbox.toggled.connect(
+            lambda checked: self.settings.setValue("upload_compress", "true" if checked else "false")
+        )
+        transport_layout.addWidget(self.compress_upload_checkbox)
+        transport_layout.addWidget(QLabel("Coordinate decimals:"))
+        self.coordinate_precision_spinbox = QSpinBox()
+        self.coordinate_precision_spinbox.setRange(-1, 15)
+        self.coordinate_precision_spinbox.setSpecialValueText("Full precision")
+        self.coordinate_precision_spinbox.setValue(
+            int(self.settings.value("upload_coordinate_precision", -1))
+        )
+        self.coordinate_precision_spinbox.setToolTip(
+            "Round geometry coordinates before upload (6 decimals ≈ 0.1 m in EPSG:4326)."
+        )
+        self.coordinate_precision_spinbox.valueChanged.connect(
+            lambda value: self.settings.setValue("upload_coordinate_precision", value)
+        )
+        transport_layout.addWidget(self.coordinate_precision_spinbox)
+        transport_layout.addStretch()
+        mapping_layout.addLayout(transport_layout)
         
         self.submit_button = QPushButton("Submit Data to KeSMIS")
         self.submit_button.setEnabled(False)
@@ -1343,11 +1700,18 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
         self.log_textedit.setReadOnly(True)
         self.log_textedit.setFixedHeight(100)
         self.log_textedit.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOn)
+        self.log_requested.connect(self.log_textedit.append)
         log_layout.addWidget(self.log_textedit)
         log_actions = QHBoxLayout()
         self.clear_log_button = QPushButton("Clear Log")
         self.clear_log_button.clicked.connect(self.clear_log)
         log_actions.addWidget(self.clear_log_button)
+        self.clear_cache_button = QPushButton("Clear Cache")
+        self.clear_cache_button.setToolTip(
+            "Forget cached KeSMIS lookups (pcode resolutions) so they are fetched again"
+        )
+        self.clear_cache_button.clicked.connect(self.clear_kesmis_cache)
+        log_actions.addWidget(self.clear_cache_button)
         log_actions.addStretch()
         log_layout.addLayout(log_actions)
         log_box.setLayout(log_layout)
@@ -1372,6 +1736,11 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
         self.thread = QThread()
         self.worker = None
         self.field_matching_worker = None
+        self.catalogue_thread = QThread()
+        self.catalogue_worker = None
+        self.settlement_sync_thread = QThread()
+        self.settlement_sync_worker = None
+        self._settlement_sync_state = None
         self._setup_after_login()
 
     def _setup_after_login(self):
@@ -1383,7 +1752,7 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
         self.fetch_entities(self.server_url)
         self.layer_combo.setEnabled(True)
         self.parent_combo.setEnabled(True)
-        self.entity_combo.setEnabled(True)
+        self.entity_combo.setEnabled(bool(self.api_entities))
         self._update_code_guidance()
 
     def _logout(self):
@@ -1416,12 +1785,23 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
         <h4>Dry run</h4>
         <p>Enable <b>Dry Run</b> to validate a limited number of records on the server. Nothing is saved until you run a full submission.</p>
 
+        <h4>Upload options</h4>
+        <p><b>Compress uploads</b> (off by default) gzips each batch before sending. If the first compressed batch is rejected with any HTTP error, it is resent as plain JSON, and plain JSON is used for the rest of the session when that works. <b>Coordinate decimals</b> rounds geometry coordinates to shrink large polygon batches; leave it at <i>Full precision</i> to send coordinates unchanged. The log reports the bytes saved after each upload.</p>
+
+        <h4>Changed only</h4>
+        <p>With <b>Changed only</b> ticked, a settlement sync sends new settlements and those whose mapped attributes or geometry changed since the last successful sync. A fingerprint of each uploaded record is kept in the <code>kesmis_hash</code> field; clear it (or untick the option) to send everything again.</p>
+
+        <h4>Cached lookups</h4>
+        <p>Pcode resolutions are cached on disk for a week so repeated imports against the same admin units skip the server. The plugin also remembers which KeSMIS endpoint variants the server supports, and the field mapping you submitted for each entity and layer schema; a layer with the same fields reuses that mapping (shown as <i>saved</i> in the Match Score column) instead of matching again. The entity list is loaded from the last download when the dialog opens and refreshed from the server in the background. Click <b>Clear Cache</b> after admin units change on KeSMIS or the server is upgraded.</p>
+
         <h4>Code column</h4>
         <p>When you select a layer, the plugin checks for a <code>code</code> field. If it is missing on a non-settlement layer, you can allow automatic code generation or cancel.</p>
         <p><b>Settlement layers:</b> do not generate random codes. Use <b>Sync Settlements with KeSMIS</b> to map fields, match by geometry, and create or update settlement records on the server.</p>
         """
 
     SETTLEMENT_SYNC_FIELD = "kesmis_sync"
+    SETTLEMENT_HASH_FIELD = "kesmis_hash"
+    SETTLEMENT_MAPPING_KEY = "settlement_sync"
     SETTLEMENT_SKIP_LAYER_FIELDS = {
         "fid", "objectid", "globalid", "ogc_fid",
         "shape_leng", "shape_length", "shape_area", "perimeter", "area",
@@ -1487,7 +1867,6 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
         if not self._progress_anim_timer.isActive():
             self._progress_anim_timer.start()
         self._tick_progress_animation()
-        QApplication.processEvents()
 
     def _finish_settlement_sync_progress(self):
         self._stop_progress_animation()
@@ -1495,7 +1874,6 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
         self.progress_bar.setValue(0)
         self.progress_bar.setFormat("")
         self.progress_bar.setVisible(False)
-        QApplication.processEvents()
 
     def _get_settlement_layers(self):
         return [
@@ -1523,57 +1901,24 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
 
     def _is_skipped_settlement_layer_field(self, field_name):
         lower = field_name.lower()
-        if lower == self.SETTLEMENT_SYNC_FIELD.lower() or lower == "code":
+        if lower in (self.SETTLEMENT_SYNC_FIELD, self.SETTLEMENT_HASH_FIELD, "code"):
             return True
         if lower in self.SETTLEMENT_SKIP_LAYER_FIELDS:
             return True
         return lower.startswith("shape_")
 
+    def _entity_lookups(self, entity):
+        return self._model_catalogue.lookups(entity)
+
     def _get_writable_settlement_api_fields(self, entity):
         allowed = {"code", "geom", "isApproved"}
         allowed.update(self.pcode_fields)
-        for attr in entity.get("attributes", []):
-            name = attr.get("name")
-            if not name:
-                continue
-            if attr.get("readOnly") or attr.get("readonly"):
-                continue
-            if name.lower() in self.SETTLEMENT_SKIP_API_FIELDS:
-                continue
-            allowed.add(name)
+        allowed.update(
+            name for name in self._entity_lookups(entity).writable
+            if name.lower() not in self.SETTLEMENT_SKIP_API_FIELDS
+        )
         return allowed
 
-    def _entity_attr_lookup(self, entity):
-        return {
-            attr.get("name"): attr
-            for attr in entity.get("attributes", [])
-            if attr.get("name")
-        }
-
-    def _coerce_settlement_api_value(self, api_field, value, entity_attrs):
-        if not self._has_meaningful_value(value):
-            return None
-        value = self._convert_to_serializable(value)
-        if value is None:
-            return None
-        attr = entity_attrs.get(api_field) or {}
-        attr_type = str(attr.get("type") or "").lower()
-        if attr_type in ("boolean", "bool"):
-            if isinstance(value, str):
-                return value.strip().lower() in ("true", "1", "yes", "y")
-            return bool(value)
-        if attr_type in ("integer", "int", "number") and "float" not in attr_type:
-            try:
-                return int(value)
-            except (TypeError, ValueError):
-                return None
-        if attr_type in ("float", "double", "decimal", "number"):
-            try:
-                return float(value)
-            except (TypeError, ValueError):
-                return None
-        return value
-
     @staticmethod
     def _has_meaningful_value(value):
         if value is None:
@@ -1591,10 +1936,16 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
         return self._convert_to_serializable(geom.__geo_interface__)
 
     def _fetch_kesmis_geo_gdf(self, model, url, headers):
-        for label, endpoint in (
-            ("geo/minimal", f"{url}/api/v1/data/geo/minimal"),
-            ("geo/full", f"{url}/api/v1/data/geo"),
-        ):
+        kind = f"{model}_geo"
+        attempts = self._endpoint_capabilities.ordered(
+            kind,
+            [
+                ("geo/minimal", f"{url}/api/v1/data/geo/minimal"),
+                ("geo/full", f"{url}/api/v1/data/geo"),
+            ],
+            key=lambda attempt: attempt[0],
+        )
+        for label, endpoint in attempts:
             try:
                 response = requests.get(
                     endpoint,
@@ -1605,42 +1956,68 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
                 response.raise_for_status()
                 gdf = self._build_gdf_from_geojson(response.json())
                 if not gdf.empty:
+                    self._endpoint_capabilities.remember(kind, label)
                     self.log_message(f"Loaded {len(gdf)} KeSMIS {model} feature(s) from {label}.")
                     return gdf
             except Exception as e:
                 self.log_message(f"KeSMIS {model} fetch via {label} failed: {e}")
         return None
 
-    def _lookup_ward_parent_ids(self, geom, wards_gdf):
-        """Return ward/subcounty/county IDs for a geometry using ward boundaries."""
-        if geom is None or wards_gdf is None or wards_gdf.empty:
-            return {}
+    def _lookup_ward_parent_ids(self, geoms, wards_gdf):
+        """Return ward/subcounty/county IDs for each geometry using ward boundaries.
 
-        if geom.geom_type in ("Polygon", "MultiPolygon"):
-            test_geom = geom.centroid
-        else:
-            test_geom = geom
-        if test_geom is None or test_geom.is_empty:
-            return {}
-
-        candidate_idx = list(wards_gdf.sindex.intersection(test_geom.bounds))
-        for cand in candidate_idx:
-            ward_geom = wards_gdf.geometry.iloc[cand]
-            if not _geometries_overlap(ward_geom, test_geom):
-                continue
-            ward = wards_gdf.iloc[cand]
+        Polygons are tested by their centroid. All geometries are joined to
+        the wards in one spatial index query; the result is a list of dicts in
+        input order (empty where no ward contains the geometry).
+        """
+        geoms = np.asarray(geoms, dtype=object)
+        results = [{} for _ in range(len(geoms))]
+        if not len(geoms) or wards_gdf is None or wards_gdf.empty or "id" not in wards_gdf.columns:
+            return results
+
+        test_geoms = np.array(
+            [
+                None if geom is None or geom.is_empty
+                else geom.centroid if geom.geom_type in ("Polygon", "MultiPolygon")
+                else geom
+                for geom in geoms
+            ],
+            dtype=object,
+        )
+        positions = np.flatnonzero([geom is not None and not geom.is_empty for geom in test_geoms])
+        if not len(positions):
+            return results
+
+        wards = wards_gdf[wards_gdf["id"].notna()]
+        if wards.empty:
+            return results
+        try:
+            geom_idx, ward_idx = wards.sindex.query(test_geoms[positions], predicate="intersects")
+        except (TypeError, ValueError):
+            geom_idx, ward_idx = wards.sindex.query_bulk(test_geoms[positions], predicate="intersects")
+        if not len(geom_idx):
+            return results
+
+        pairs = pd.DataFrame({"geom": positions[geom_idx], "ward": ward_idx})
+        pairs = pairs.sort_values(["geom", "ward"], kind="mergesort").drop_duplicates("geom")
+        ward_rows = wards.iloc[pairs["ward"].to_numpy()]
+        id_columns = {"ward_id": ward_rows["id"].tolist()}
+        for key in ("subcounty_id", "county_id"):
+            if key in ward_rows.columns:
+                id_columns[key] = ward_rows[key].tolist()
+
+        for i, pos in enumerate(pairs["geom"].tolist()):
             parent_ids = {}
-            if ward.get("id") is not None:
-                parent_ids["ward_id"] = int(ward["id"])
-            for key in ("subcounty_id", "county_id"):
-                if ward.get(key) is not None:
-                    try:
-                        parent_ids[key] = int(ward[key])
-                    except (TypeError, ValueError):
-                        pass
-            if parent_ids:
-                return parent_ids
-        return {}
+            for key, values in id_columns.items():
+                value = values[i]
+                if value is None or pd.isna(value):
+                    continue
+                try:
+                    parent_ids[key] = int(value)
+                except (TypeError, ValueError):
+                    pass
+            results[pos] = parent_ids
+        return results
 
     def _get_settlement_entity(self):
         for entity in self.api_entities:
@@ -1660,42 +2037,11 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
             self._get_writable_settlement_api_fields(entity) - {"code", "geom", "isApproved"},
             key=lambda x: x.lower(),
         )
-        field_mapping = {}
-        scores = {}
-        table_data = []
-
-        for field in layer_fields:
-            candidates = process.extract(
-                field,
-                writable_api_fields,
-                scorer=fuzz.ratio,
-                score_cutoff=70,
-            )
-            if candidates:
-                best_field, best_score, _ = max(candidates, key=lambda x: x[1])
-                field_mapping[field] = best_field
-                scores[field] = best_score
-                table_data.append((field, best_field, str(int(best_score))))
-            else:
-                field_mapping[field] = None
-                table_data.append((field, "", "-"))
-
-        reverse_map = {}
-        for layer_field, api_field in field_mapping.items():
-            if api_field:
-                reverse_map.setdefault(api_field, []).append(layer_field)
-
-        for api_field, layer_list in reverse_map.items():
-            if len(layer_list) > 1:
-                sorted_layers = sorted(layer_list, key=lambda lf: scores.get(lf, 0), reverse=True)
-                for duplicate in sorted_layers[1:]:
-                    field_mapping[duplicate] = None
-                    for idx, row in enumerate(table_data):
-                        if row[0] == duplicate:
-                            table_data[idx] = (duplicate, "", "-")
-                            break
-
-        return field_mapping, table_data
+        saved = self._mapping_memory.recall(self.SETTLEMENT_MAPPING_KEY, layer_fields)
+        if saved is not None:
+            self.log_message("Reused the settlement field mapping saved for this layer schema.")
+            return apply_saved_mapping(layer_fields, writable_api_fields, saved)
+        return match_fields(layer_fields, writable_api_fields)
 
     def _update_code_guidance(self):
         settlement_layers = self._get_settlement_layers()
@@ -1739,6 +2085,8 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
                 "to generate codes if the selected layer does not have one."
             )
             self.sync_settlement_codes_button.setEnabled(False)
+        if getattr(self, "settlement_sync_worker", None) is not None:
+            self.sync_settlement_codes_button.setEnabled(False)
 
     def _layer_has_code_field(self, layer):
         return any(field.name().lower() == "code" for field in layer.fields())
@@ -1798,7 +2146,7 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
     def _feature_label(self, props, feature_id):
         for key in ("name", "settlement_name", "Name", "label", "settlement", "title"):
             value = props.get(key)
-            if value is not None and str(value).strip():
+            if value is not None and not pd.isna(value) and str(value).strip():
                 return str(value).strip()
         return f"Feature {feature_id}"
 
@@ -1813,54 +2161,29 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
             return f"Code {code}"
         return "KeSMIS settlement"
 
-    def _find_intersecting_settlements(self, feature_geom, settlements_gdf):
-        """Return all KeSMIS settlements intersecting a feature, best overlap first."""
-        if feature_geom is None or feature_geom.is_empty:
-            return []
-
-        candidate_idx = list(settlements_gdf.sindex.intersection(feature_geom.bounds))
-        if not candidate_idx:
-            return []
-
-        results = []
-        for cand in candidate_idx:
-            settlement_geom = settlements_gdf.geometry.iloc[cand]
-            if feature_geom.geom_type == "Point":
-                if not (
-                    settlement_geom.contains(feature_geom)
-                    or settlement_geom.touches(feature_geom)
-                    or settlement_geom.intersects(feature_geom)
-                ):
-                    continue
-                overlap = 1.0
-            else:
-                if not settlement_geom.intersects(feature_geom):
-                    continue
-                overlap = _intersection_area(settlement_geom, feature_geom)
-                if overlap is None or overlap <= 0:
-                    continue
-
-            row = settlements_gdf.iloc[cand]
-            kesmis_code = self._row_code(row)
-            if not kesmis_code:
+    def _kesmis_candidate_rows(self, settlements_gdf, positions):
+        """Serialise the given KeSMIS settlement rows once each, keyed by position."""
+        subset = settlements_gdf.iloc[positions]
+        columns = [col for col in subset.columns if col != subset.geometry.name]
+        values = {col: column_to_json_values(subset[col]) for col in columns}
+        rows = {}
+        for i, pos in enumerate(positions):
+            kesmis_row = {col: values[col][i] for col in columns}
+            code = ""
+            for key in ("code", "pcode", "settlement_code", "Code", "PCODE"):
+                value = kesmis_row.get(key)
+                if value is not None and str(value).strip():
+                    code = str(value).strip()
+                    break
+            if not code:
                 continue
-            kesmis_row = {
-                k: self._convert_to_serializable(v)
-                for k, v in row.items()
-                if k != "geometry"
+            rows[pos] = {
+                "kesmis_label": self._kesmis_label(kesmis_row),
+                "kesmis_code": code,
+                "kesmis_id": kesmis_row.get("id"),
+                "kesmis_row": kesmis_row,
             }
-            results.append(
-                {
-                    "kesmis_label": self._kesmis_label(row),
-                    "kesmis_code": kesmis_code,
-                    "kesmis_id": row.get("id"),
-                    "kesmis_row": kesmis_row,
-                    "overlap": overlap,
-                }
-            )
-
-        results.sort(key=lambda item: item["overlap"], reverse=True)
-        return results
+        return rows
 
     def _generate_settlement_short_code(self, existing_codes):
         while True:
@@ -1899,44 +2222,52 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
         if layer_gdf.empty:
             return [], layer_gdf
 
-        code_idx = None
-        field_names = [f.name() for f in layer.fields()]
-        if "code" in field_names:
-            code_idx = layer.fields().indexOf("code")
-        elif "code" in {name.lower(): idx for idx, name in enumerate(field_names)}:
-            code_idx = {name.lower(): idx for idx, name in enumerate(field_names)}["code"]
+        if progress_callback:
+            progress_callback(30, f"Matching {len(layer_gdf)} settlements...", indeterminate=True)
+
+        pairs = _settlement_overlap_pairs(layer_gdf.geometry.values, settlements_gdf)
+        kesmis_rows = self._kesmis_candidate_rows(settlements_gdf, sorted(set(pairs["kesmis"].tolist())))
+        pairs = pairs[pairs["kesmis"].isin(list(kesmis_rows))]
+        pairs = pairs.sort_values(["local", "overlap"], ascending=[True, False], kind="mergesort")
+        candidates_by_local = {
+            local: [
+                {**kesmis_rows[kesmis], "overlap": float(overlap)}
+                for kesmis, overlap in zip(group["kesmis"].tolist(), group["overlap"].tolist())
+            ]
+            for local, group in pairs.groupby("local", sort=False)
+        }
 
-        matches = []
-        total = len(layer_gdf)
-        for idx, (_, row) in enumerate(layer_gdf.iterrows()):
-            feature_id = row.get("_qgis_fid")
-            if feature_id is None:
-                continue
+        if "code" in layer_gdf.columns:
+            code_column = "code"
+        else:
+            code_column = next((col for col in layer_gdf.columns if str(col).lower() == "code"), None)
+        if code_column is not None:
+            codes = layer_gdf[code_column]
+            current_codes = codes.astype(str).str.strip().where(codes.notna(), "").tolist()
+        else:
+            current_codes = [""] * len(layer_gdf)
 
-            props = {k: v for k, v in row.items() if k not in ("geometry", "_qgis_fid")}
-            local_label = self._feature_label(props, feature_id)
-            current_code = ""
-            if code_idx is not None and code_idx >= 0:
-                value = layer.getFeature(feature_id)[code_idx]
-                if value is not None:
-                    current_code = str(value).strip()
+        label_columns = [
+            key for key in ("name", "settlement_name", "Name", "label", "settlement", "title")
+            if key in layer_gdf.columns
+        ]
+        label_values = [layer_gdf[key].tolist() for key in label_columns]
+        feature_ids = layer_gdf["_qgis_fid"].tolist()
 
-            candidates = self._find_intersecting_settlements(row.geometry, settlements_gdf)
+        matches = []
+        for pos, feature_id in enumerate(feature_ids):
+            props = {key: values[pos] for key, values in zip(label_columns, label_values)}
             matches.append(
                 {
                     "feature_id": feature_id,
-                    "local_label": local_label,
-                    "current_code": current_code,
-                    "candidates": candidates,
+                    "local_label": self._feature_label(props, feature_id),
+                    "current_code": current_codes[pos],
+                    "candidates": candidates_by_local.get(pos, []),
                 }
             )
-            if progress_callback and total:
-                pct = 30 + int((idx + 1) / total * 35)
-                progress_callback(
-                    pct,
-                    f"Matching settlements ({idx + 1}/{total})...",
-                )
 
+        if progress_callback:
+            progress_callback(65, f"Matched {len(matches)} settlements.")
         return matches, layer_gdf
 
     def _resolve_settlement_matches(self, layer_name, matches, settlement_entity, field_mapping, mapping_table_data):
@@ -1957,7 +2288,8 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
             f"Matched to existing KeSMIS settlements (will update): {update_count}\n"
             f"Multiple KeSMIS intersections (choose match): {multi_count}\n"
             f"No intersection (will create new): {no_match_count}\n"
-            "Review code matching first, then adjust field mapping on the second tab."
+            "Review code matching first (double-click a match marked ▾ to choose another "
+            "intersecting settlement), then adjust field mapping on the second tab."
         )
         intro.setWordWrap(True)
         layout.addWidget(intro)
@@ -1974,92 +2306,53 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
         matching_layout = QVBoxLayout(matching_tab)
         matching_layout.setContentsMargins(8, 8, 8, 8)
 
-        table = QTableWidget(len(matches), 6)
-        table.setHorizontalHeaderLabels(
-            ["Local Settlement", "Current Code", "KeSMIS Match", "Code To Apply", "Action", "Status"]
-        )
-        table.horizontalHeader().setStretchLastSection(True)
-        table.setEditTriggers(QTableWidget.NoEditTriggers)
-
         existing_codes = set()
         for match in matches:
             if match["current_code"]:
                 existing_codes.add(match["current_code"])
             for candidate in match["candidates"]:
                 existing_codes.add(candidate["kesmis_code"])
+        generated_codes = {
+            row: self._generate_settlement_short_code(existing_codes)
+            for row, match in enumerate(matches)
+            if not match["candidates"]
+        }
 
-        def sync_status_for_selection(row_match, selected):
-            is_create = selected.get("generated", False)
-            return self._settlement_sync_status(
-                row_match["current_code"],
-                selected.get("kesmis_code"),
-                is_create=is_create,
-            )
-
-        selectors = []
-        for row, match in enumerate(matches):
-            table.setItem(row, 0, QTableWidgetItem(match["local_label"]))
-            table.setItem(row, 1, QTableWidgetItem(match["current_code"]))
-
-            candidates = match["candidates"]
-            if len(candidates) > 1:
-                combo = QComboBox()
-                for candidate in candidates:
-                    combo.addItem(
-                        f"{candidate['kesmis_label']} ({candidate['kesmis_code']})",
-                        candidate,
-                    )
-
-                def update_combo_row(table_row, combo_box, row_match):
-                    selected = combo_box.currentData()
-                    is_create = selected.get("generated", False)
-                    table.setItem(table_row, 3, QTableWidgetItem(selected["kesmis_code"]))
-                    table.setItem(
-                        table_row,
-                        4,
-                        QTableWidgetItem("Create on KeSMIS" if is_create else "Update on KeSMIS"),
-                    )
-                    table.setItem(
-                        table_row,
-                        5,
-                        QTableWidgetItem(sync_status_for_selection(row_match, selected)),
-                    )
-
-                combo.currentIndexChanged.connect(
-                    lambda _idx, table_row=row, combo_box=combo, row_match=match: update_combo_row(
-                        table_row, combo_box, row_match
-                    )
-                )
-                table.setCellWidget(row, 2, combo)
-                selectors.append(("combo", combo))
-                selected = candidates[0]
-            elif len(candidates) == 1:
-                selected = candidates[0]
-                table.setItem(row, 2, QTableWidgetItem(selected["kesmis_label"]))
-                selectors.append(("fixed", selected))
-            else:
-                generated = self._generate_settlement_short_code(existing_codes)
-                selected = {
-                    "kesmis_label": "No KeSMIS intersection — new settlement",
-                    "kesmis_code": generated,
-                    "generated": True,
-                }
-                table.setItem(row, 2, QTableWidgetItem(selected["kesmis_label"]))
-                selectors.append(("generated", selected))
-
-            is_create = selected.get("generated", False)
-            table.setItem(row, 3, QTableWidgetItem(selected["kesmis_code"]))
-            table.setItem(
-                row,
-                4,
-                QTableWidgetItem("Create on KeSMIS" if is_create else "Update on KeSMIS"),
-            )
-            table.setItem(
-                row,
-                5,
-                QTableWidgetItem(sync_status_for_selection(match, selected)),
-            )
-
+        model = SettlementMatchModel(matches, generated_codes, self._settlement_sync_status, dialog)
+        proxy = SettlementMatchFilterProxy(dialog)
+        proxy.setSourceModel(model)
+
+        filter_row = QHBoxLayout()
+        filter_edit = QLineEdit()
+        filter_edit.setPlaceholderText("Filter by name, code or status...")
+        filter_edit.setClearButtonEnabled(True)
+        filter_edit.textChanged.connect(proxy.setFilterFixedString)
+        filter_row.addWidget(filter_edit, 1)
+        category_combo = QComboBox()
+        category_combo.addItem("All features", None)
+        category_combo.addItem("Multiple matches", "multiple")
+        category_combo.addItem("Single match", "single")
+        category_combo.addItem("New settlements", "new")
+        category_combo.currentIndexChanged.connect(
+            lambda _idx: proxy.set_category(category_combo.currentData())
+        )
+        filter_row.addWidget(category_combo)
+        matching_layout.addLayout(filter_row)
+
+        table = QTableView()
+        table.setModel(proxy)
+        table.setItemDelegateForColumn(SettlementMatchModel.MATCH_COLUMN, CandidateChoiceDelegate(table))
+        table.setEditTriggers(
+            QAbstractItemView.DoubleClicked | QAbstractItemView.SelectedClicked | QAbstractItemView.EditKeyPressed
+        )
+        table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        table.setWordWrap(False)
+        table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        header = table.horizontalHeader()
+        header.setSortIndicator(-1, Qt.AscendingOrder)
+        table.setSortingEnabled(True)
+        header.setStretchLastSection(True)
+        header.setResizeContentsPrecision(200)
         table.resizeColumnsToContents()
         matching_layout.addWidget(table)
 
@@ -2122,11 +2415,7 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
 
         resolved = []
         for row, match in enumerate(matches):
-            selector_type, selector = selectors[row]
-            if selector_type == "combo":
-                selected = selector.currentData()
-            else:
-                selected = selector
+            selected = model.selected(row)
 
             kesmis_code = selected["kesmis_code"]
             is_generated = selected.get("generated", False)
@@ -2175,7 +2464,32 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
                     return gdf, src
         return gdf, None
 
-    def _enrich_settlement_codes_from_ids(self, gdf, url, headers):
+    def _fetch_settlement_codes_by_id(self, endpoint, ids, headers):
+        """POST one batch of settlement ids and return {id: code} for the records found.
+
+        Raises when the endpoint fails or does not answer with a record list,
+        so callers can tell an unusable endpoint from records without codes.
+        """
+        response = requests.post(
+            endpoint,
+            headers=headers,
+            json={"model": "settlement", "ids": ids},
+            timeout=60,
+        )
+        response.raise_for_status()
+        payload = response.json()
+        records = payload if isinstance(payload, list) else payload.get("data") if isinstance(payload, dict) else None
+        if not isinstance(records, list):
+            raise ValueError("response does not contain a record list")
+        codes = {}
+        for rec in records:
+            rec_id = rec.get("id")
+            rec_code = rec.get("code") or rec.get("pcode")
+            if rec_id is not None and rec_code is not None and str(rec_code).strip():
+                codes[int(rec_id)] = str(rec_code).strip()
+        return codes
+
+    def _enrich_settlement_codes_from_ids(self, gdf, url, headers, max_workers=4):
         if "id" not in gdf.columns:
             return gdf, None
 
@@ -2188,38 +2502,56 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
         if not ids:
             return gdf, None
 
-        code_by_id = {}
         batch_size = 200
-        endpoints = [
-            f"{url}/api/v1/data/many/id",
-            f"{url}/api/v1/data/many/ids",
-        ]
-        for endpoint in endpoints:
-            for start in range(0, len(ids), batch_size):
-                batch = ids[start:start + batch_size]
+        batches = [ids[start:start + batch_size] for start in range(0, len(ids), batch_size)]
+        variants = self._endpoint_capabilities.ordered(
+            "settlement_many_ids",
+            [
+                ("many/id", f"{url}/api/v1/data/many/id"),
+                ("many/ids", f"{url}/api/v1/data/many/ids"),
+            ],
+            key=lambda variant: variant[0],
+        )
+
+        # Probe batch by batch until a variant returns codes. A batch whose
+        # settlements have no code yet proves nothing about the endpoint, so
+        # probing continues with the next batch. The batches left over go to
+        # the working variant in parallel.
+        code_by_id = {}
+        working = None
+        probed = 0
+        for label, endpoint in variants:
+            failed = False
+            for probed, batch in enumerate(batches, start=1):
                 try:
-                    response = requests.post(
-                        endpoint,
-                        headers=headers,
-                        json={"model": "settlement", "ids": batch},
-                        timeout=60,
-                    )
-                    if response.status_code != 200:
-                        continue
-                    payload = response.json()
-                    records = payload.get("data", payload if isinstance(payload, list) else [])
-                    for rec in records:
-                        rec_id = rec.get("id")
-                        rec_code = rec.get("code") or rec.get("pcode")
-                        if rec_id is not None and rec_code is not None and str(rec_code).strip():
-                            code_by_id[int(rec_id)] = str(rec_code).strip()
+                    code_by_id.update(self._fetch_settlement_codes_by_id(endpoint, batch, headers))
                 except Exception as e:
                     self.log_message(f"Settlement code lookup failed at {endpoint}: {e}")
+                    failed = True
+                    break
+                if code_by_id:
+                    break
             if code_by_id:
+                working = (label, endpoint)
                 break
-
-        if not code_by_id:
+            if not failed:
+                # The endpoint answered every batch; no settlement has a code.
+                return gdf, None
+        if working is None:
             return gdf, None
+        self._endpoint_capabilities.remember("settlement_many_ids", working[0])
+
+        if probed < len(batches):
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {
+                    executor.submit(self._fetch_settlement_codes_by_id, working[1], batch, headers): batch
+                    for batch in batches[probed:]
+                }
+                for future in as_completed(futures):
+                    try:
+                        code_by_id.update(future.result())
+                    except Exception as e:
+                        self.log_message(f"Settlement code lookup failed at {working[1]}: {e}")
 
         gdf = gdf.copy()
 
@@ -2231,14 +2563,18 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
             except (TypeError, ValueError):
                 return None
 
-        gdf["code"] = gdf["id"].apply(lookup_code)
+        gdf["code"] = gdf["id"].map(lookup_code)
         return gdf, "code"
 
     def _fetch_kesmis_settlements_gdf(self, url, headers):
-        fetch_attempts = [
-            ("geo/minimal", f"{url}/api/v1/data/geo/minimal", {"model": "settlement"}),
-            ("geo/full", f"{url}/api/v1/data/geo", {"model": "settlement"}),
-        ]
+        fetch_attempts = self._endpoint_capabilities.ordered(
+            "settlement_geo",
+            [
+                ("geo/minimal", f"{url}/api/v1/data/geo/minimal", {"model": "settlement"}),
+                ("geo/full", f"{url}/api/v1/data/geo", {"model": "settlement"}),
+            ],
+            key=lambda attempt: attempt[0],
+        )
         last_columns = []
         last_error = None
 
@@ -2261,6 +2597,7 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
                     if gdf.empty:
                         last_error = f"KeSMIS {label} returned settlements but no usable code values."
                         continue
+                    self._endpoint_capabilities.remember("settlement_geo", label)
                     self.log_message(
                         f"Loaded {len(gdf)} KeSMIS settlement(s) from {label} using '{code_field}'."
                     )
@@ -2282,32 +2619,38 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
         raise ValueError(last_error or "Could not load settlement data from KeSMIS.")
 
     def _build_settlement_upsert_features(self, layer_gdf, resolved, field_mapping, entity, wards_gdf=None):
-        """Build KeSMIS upsert payloads from resolved settlement matches and field mapping."""
+        """Build KeSMIS upsert payloads from resolved settlement matches and field mapping.
+
+        Returns (payloads, matches) where ``matches[i]`` is the resolved match
+        that produced ``payloads[i]``.
+        """
         allowed_fields = self._get_writable_settlement_api_fields(entity)
-        entity_attrs = self._entity_attr_lookup(entity)
-        features = []
-        for match in resolved:
-            if not match.get("kesmis_code"):
-                continue
+        lookups = self._entity_lookups(entity)
+
+        resolved = [match for match in resolved if match.get("kesmis_code")]
+        fid_positions = pd.Index(layer_gdf["_qgis_fid"]).get_indexer([m["feature_id"] for m in resolved])
+        mapped_fields = [
+            (layer_field, api_field)
+            for layer_field, api_field in field_mapping.items()
+            if api_field and api_field in allowed_fields and layer_field in layer_gdf.columns
+        ]
+        matched = [(match, pos) for match, pos in zip(resolved, fid_positions.tolist()) if pos >= 0]
+        rows = layer_gdf.iloc[[pos for _, pos in matched]]
+        api_columns = lookups.coercion_plan(mapped_fields).apply(rows)
+        value_columns = {
+            name: rows[name].tolist() for name in self.pcode_fields if name in rows.columns
+        }
+        geometries = rows.geometry.values
 
-            feature_rows = layer_gdf[layer_gdf["_qgis_fid"] == match["feature_id"]]
-            if feature_rows.empty:
-                continue
-            row = feature_rows.iloc[0]
+        features = []
+        needs_ward = []
+        for i, (match, _) in enumerate(matched):
             kesmis_row = match.get("kesmis_row") or {}
 
             feature = {"code": str(match["kesmis_code"]).strip()}
-
-            for layer_field, api_field in field_mapping.items():
-                if not api_field or api_field not in allowed_fields:
-                    continue
-                if layer_field not in row.index:
-                    continue
-                value = self._coerce_settlement_api_value(
-                    api_field, row[layer_field], entity_attrs
-                )
-                if value is not None:
-                    feature[api_field] = value
+            for api_field, values in api_columns.items():
+                if values[i] is not None:
+                    feature[api_field] = values[i]
 
             for key in self.pcode_fields:
                 if key in feature:
@@ -2317,34 +2660,39 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
                         feature[key] = int(kesmis_row[key])
                     except (TypeError, ValueError):
                         pass
-                elif key in row.index and self._has_meaningful_value(row[key]):
+                elif key in value_columns and self._has_meaningful_value(value_columns[key][i]):
                     try:
-                        feature[key] = int(row[key])
+                        feature[key] = int(value_columns[key][i])
                     except (TypeError, ValueError):
                         pass
 
             if match.get("is_generated") or "ward_id" not in feature:
-                if wards_gdf is not None:
-                    parent_ids = self._lookup_ward_parent_ids(row.geometry, wards_gdf)
-                    for key, value in parent_ids.items():
-                        if key not in feature:
-                            feature[key] = value
-
-            geom = self._build_settlement_geometry(row.geometry)
-            if geom is not None:
-                feature["geom"] = geom
-            feature["isApproved"] = True
+                needs_ward.append(len(features))
+            features.append((i, feature))
 
+        if needs_ward and wards_gdf is not None:
+            ward_parents = self._lookup_ward_parent_ids(
+                geometries[[features[i][0] for i in needs_ward]], wards_gdf
+            )
+            for i, parent_ids in zip(needs_ward, ward_parents):
+                feature = features[i][1]
+                for key, value in parent_ids.items():
+                    if key not in feature:
+                        feature[key] = value
+
+        payloads = []
+        for i, feature in features:
             filtered = {"code": feature["code"], "isApproved": True}
-            if feature.get("geom") is not None:
-                filtered["geom"] = feature["geom"]
+            geom = self._build_settlement_geometry(geometries[i])
+            if geom is not None:
+                filtered["geom"] = geom
             for key, value in feature.items():
                 if key in ("code", "geom", "isApproved"):
                     continue
                 if key in allowed_fields and self._has_meaningful_value(value):
                     filtered[key] = self._convert_to_serializable(value)
-            features.append(filtered)
-        return features
+            payloads.append(filtered)
+        return payloads, [matched[i][0] for i, _ in features]
 
     def _submit_upsert_batches(
         self,
@@ -2354,9 +2702,21 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
         dry_run_limit=None,
         progress_start=0,
         progress_end=100,
-        manage_visibility=True,
+        progress_callback=None,
+        should_stop=None,
+        transport=None,
+        sent=None,
     ):
-        """Submit features to KeSMIS import/upsert in batches."""
+        """Submit features to KeSMIS import/upsert in batches.
+
+        Without ``progress_callback`` progress is shown on the dialog's progress
+        bar, so the call must run on the GUI thread. With a callback the method
+        touches no widgets and can run in a worker thread; ``should_stop`` is
+        then checked before each batch and ``transport`` carries the
+        (compress, precision) upload options read from the dialog beforehand.
+        The (start, end) feature range of every batch the server processed is
+        appended to ``sent`` when a list is given.
+        """
         if not features:
             return 0, 0, 0, []
 
@@ -2373,44 +2733,43 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
         all_inserted = all_updated = all_failed = 0
         all_errors = []
         progress_span = max(progress_end - progress_start, 1)
+        bytes_sent = bytes_full = 0
 
-        if manage_visibility:
+        if progress_callback is None:
             self.progress_bar.setRange(0, 100)
             self.progress_bar.setValue(progress_start)
             self.progress_bar.setVisible(True)
-        elif progress_start == 0:
-            self.progress_bar.setValue(0)
 
         for start in range(0, total, batch_size):
-            batch = [
-                self._convert_to_serializable(feature)
-                for feature in features[start:start + batch_size]
-            ]
+            if should_stop is not None and should_stop():
+                self.log_message(f"Upload stopped after {start} of {total} record(s).")
+                break
+            batch = features[start:start + batch_size]
             batch_num = start // batch_size + 1
             action = "Validating batch" if dry_run else "Submitting batch"
-            self.log_message(
-                f"{action} {batch_num} ({start + 1}–{min(start + batch_size, total)} of {total})…"
-            )
-            if not manage_visibility:
-                self._update_settlement_sync_progress(
-                    message=f"{action} {batch_num} ({start + 1}–{min(start + batch_size, total)} of {total})...",
-                )
+            message = f"{action} {batch_num} ({start + 1}–{min(start + batch_size, total)} of {total})"
+            self.log_message(f"{message}…")
             try:
                 payload = {"model": model, "data": batch}
                 if dry_run:
                     payload["dryRun"] = True
-                resp = requests.post(
+                resp, encoded = self._post_upsert_payload(
                     f"{url}/api/v1/data/import/upsert",
-                    json=payload,
-                    headers=headers,
+                    payload,
+                    headers,
                     timeout=60,
+                    transport=transport,
                 )
+                bytes_sent += len(encoded.body)
+                bytes_full += encoded.full_size
                 resp.raise_for_status()
                 data = resp.json()
                 all_inserted += data.get("insertedCount", 0)
                 all_updated += data.get("updatedCount", 0)
                 all_failed += data.get("failedCount", 0)
                 all_errors.extend(data.get("errors", []))
+                if sent is not None:
+                    sent.append((start, start + len(batch)))
             except requests.HTTPError as e:
                 detail = _format_import_http_error(
                     e.response,
@@ -2426,19 +2785,76 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
                 self.log_message(f"Batch {batch_num} failed entirely: {e}")
                 all_failed += len(batch)
 
-            percent = progress_start + int((start + len(batch)) / total * progress_span)
+            percent = min(progress_start + int((start + len(batch)) / total * progress_span), progress_end)
+            if progress_callback is not None:
+                progress_callback(percent, f"{message}...")
+            else:
+                self.progress_bar.setRange(0, 100)
+                self.progress_bar.setValue(percent)
+                QApplication.processEvents()
+
+        if progress_callback is None:
             self.progress_bar.setRange(0, 100)
-            self.progress_bar.setValue(min(percent, progress_end))
+            self.progress_bar.setValue(progress_end)
             QApplication.processEvents()
-
-        self.progress_bar.setRange(0, 100)
-        self.progress_bar.setValue(progress_end)
-        QApplication.processEvents()
-        if manage_visibility:
             self.progress_bar.setVisible(False)
+        if bytes_full:
+            saved = bytes_full - bytes_sent
+            self.log_message(
+                f"Upload size: {format_byte_size(bytes_sent)} sent for "
+                f"{format_byte_size(bytes_full)} of full-precision JSON "
+                f"({format_byte_size(max(saved, 0))} saved, {max(saved, 0) * 100 // bytes_full}%)."
+            )
         return all_inserted, all_updated, all_failed, all_errors
 
-    def _apply_settlement_code_matches(self, layer, matches):
+    def _upload_transport(self):
+        """Return the (compress, precision) upload options selected in the dialog."""
+        precision = self.coordinate_precision_spinbox.value()
+        return self.compress_upload_checkbox.isChecked(), (precision if precision >= 0 else None)
+
+    def _post_upsert_payload(self, endpoint, payload, headers, timeout=60, transport=None):
+        """POST an upsert payload with the configured transport options.
+
+        With compression selected, bodies are gzip-compressed unless the
+        server has refused compressed requests before. Until one compressed request has succeeded, an
+        answer saying the body could not be decoded (HTTP 415, or HTTP 400
+        about the encoding) is retried once as plain JSON, and plain JSON is
+        used for the rest of the session. Other errors are returned as they
+        are: the upsert is not idempotent, so it is never sent twice for them.
+        """
+        compress, precision = transport if transport is not None else self._upload_transport()
+        compress = compress and self._server_accepts_gzip is not False
+
+        encoded = encode_upsert_body(payload, compress=compress, precision=precision)
+        resp = requests.post(
+            endpoint,
+            data=encoded.body,
+            headers={**headers, **encoded.headers},
+            timeout=timeout,
+        )
+        if compress:
+            if resp.status_code < 400:
+                self._server_accepts_gzip = True
+            elif not self._server_accepts_gzip and _rejects_gzip_body(resp):
+                self._server_accepts_gzip = False
+                self.log_message(
+                    f"Server rejected a gzip request body (HTTP {resp.status_code}); sending plain JSON."
+                )
+                encoded = encode_upsert_body(payload, compress=False, precision=precision)
+                resp = requests.post(
+                    endpoint,
+                    data=encoded.body,
+                    headers={**headers, **encoded.headers},
+                    timeout=timeout,
+                )
+        return resp, encoded
+
+    def _apply_settlement_code_matches(self, layer, matches, hashes=None):
+        """Write KeSMIS codes and the sync stamp back to the layer.
+
+        ``hashes`` maps feature ids to the content hash that was uploaded; it
+        is stored in the kesmis_hash field so the next sync can skip them.
+        """
         from qgis.core import edit
 
         transferable = [
@@ -2464,37 +2880,56 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
         sync_stamp = datetime.now().strftime("%Y-%m-%d %H:%M")
 
         with edit(layer):
-            code_idx = self._ensure_code_field_index(layer)
+            self._ensure_code_field_index(layer)
             sync_idx = self._ensure_sync_field_index(layer)
-            for match in transferable:
-                feature_id = match["feature_id"]
-                kesmis_code = match["kesmis_code"]
-                current_code = match["current_code"]
-                is_generated = match.get("is_generated", False)
-                if is_generated:
-                    generated += 1
-                if not current_code:
-                    layer.changeAttributeValue(feature_id, code_idx, kesmis_code)
-                    filled += 1
-                elif current_code == kesmis_code:
-                    unchanged += 1
-                else:
-                    layer.changeAttributeValue(feature_id, code_idx, kesmis_code)
-                    updated += 1
-                if sync_idx >= 0:
-                    layer.changeAttributeValue(feature_id, sync_idx, sync_stamp)
+            sync_name = layer.fields().at(sync_idx).name() if sync_idx >= 0 else None
+            hash_name = None
+            if hashes:
+                hash_idx = self._ensure_sync_field_index(layer, self.SETTLEMENT_HASH_FIELD)
+                hash_name = layer.fields().at(hash_idx).name() if hash_idx >= 0 else None
+        # Field indexes are looked up again once the schema changes are committed.
+        code_idx = layer.fields().indexOf("code")
+        sync_idx = layer.fields().indexOf(sync_name) if sync_name else -1
+        hash_idx = layer.fields().indexOf(hash_name) if hash_name else -1
+
+        changes = {}
+        for match in transferable:
+            feature_id = match["feature_id"]
+            kesmis_code = match["kesmis_code"]
+            current_code = match["current_code"]
+            attrs = {}
+            if match.get("is_generated", False):
+                generated += 1
+            if not current_code:
+                attrs[code_idx] = kesmis_code
+                filled += 1
+            elif current_code == kesmis_code:
+                unchanged += 1
+            else:
+                attrs[code_idx] = kesmis_code
+                updated += 1
+            if sync_idx >= 0:
+                attrs[sync_idx] = sync_stamp
+            if hash_idx >= 0 and feature_id in hashes:
+                attrs[hash_idx] = hashes[feature_id]
+            if attrs:
+                changes[feature_id] = attrs
+
+        write_attribute_values(layer, changes)
+        self._layer_snapshots.invalidate(layer.id())
 
         return filled, updated, unchanged, generated
 
-    def _ensure_sync_field_index(self, layer):
-        """Ensure the kesmis_sync marker field exists; must be called inside an edit session."""
+    def _ensure_sync_field_index(self, layer, field_name=None):
+        """Ensure a sync marker field (kesmis_sync by default) exists; must be called inside an edit session."""
+        field_name = field_name or self.SETTLEMENT_SYNC_FIELD
         for i, f in enumerate(layer.fields()):
-            if f.name().lower() == self.SETTLEMENT_SYNC_FIELD:
+            if f.name().lower() == field_name:
                 return i
         from qgis.core import QgsField
-        layer.addAttribute(QgsField(self.SETTLEMENT_SYNC_FIELD, QVariant.String))
+        layer.addAttribute(QgsField(field_name, QVariant.String))
         layer.updateFields()
-        return layer.fields().indexOf(self.SETTLEMENT_SYNC_FIELD)
+        return layer.fields().indexOf(field_name)
 
     def _ensure_code_field_index(self, layer):
         fields = layer.fields()
@@ -2512,27 +2947,7 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
         return layer.fields().indexOf("code")
 
     def _build_gdf_from_layer(self, layer, include_fid=False):
-        srid = layer.crs().postgisSrid() or 4326
-        features = []
-        for f in layer.getFeatures():
-            props = {
-                field: self._convert_to_serializable(f[field])
-                for field in [fld.name() for fld in layer.fields()]
-            }
-            if include_fid:
-                props["_qgis_fid"] = f.id()
-            features.append(
-                {
-                    "type": "Feature",
-                    "geometry": json.loads(f.geometry().asJson()) if f.geometry() else None,
-                    "properties": props,
-                }
-            )
-        gdf = gpd.GeoDataFrame.from_features(features, crs=f"EPSG:{srid}")
-        if gdf.empty:
-            return gdf
-        gdf["geometry"] = gdf["geometry"].apply(self.to_2d)
-        return gdf.to_crs(epsg=4326)
+        return self._layer_snapshots.get(layer, include_fid=include_fid)
 
     def _build_gdf_from_geojson(self, geojson):
         records = []
@@ -2586,6 +3001,9 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
         self._sync_settlement_codes_from_kesmis(layer)
 
     def _sync_settlement_codes_from_kesmis(self, layer):
+        """Start a settlement sync; network and matching work runs in SettlementSyncWorker."""
+        if self.settlement_sync_worker is not None:
+            return
         layer_name = layer.name()
         settlement_entity = self._get_settlement_entity()
         if not settlement_entity:
@@ -2599,57 +3017,106 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
 
         self.log_message(f"Fetching KeSMIS settlements and matching '{layer_name}'...")
         self.sync_settlement_codes_button.setEnabled(False)
-        self._start_settlement_sync_progress("Fetching KeSMIS settlements...")
+        self._start_settlement_sync_progress("Loading layer features...")
 
-        url = self.server_url
-        headers = {"Authorization": f"Bearer {self.token}", "x-access-token": self.token}
         try:
-            settlements_gdf = self._fetch_kesmis_settlements_gdf(url, headers)
-            self._update_settlement_sync_progress(20, "Mapping layer fields...")
+            layer_gdf = self._build_gdf_from_layer(layer, include_fid=True)
+            if layer_gdf.empty:
+                QMessageBox.warning(self, "No Features", f"Layer '{layer_name}' contains no features.")
+                self._finish_settlement_sync()
+                return
 
-            exclude_fields = {self.SETTLEMENT_SYNC_FIELD}
+            self._update_settlement_sync_progress(3, "Mapping layer fields...")
             field_mapping, mapping_table_data = self._auto_match_fields(
-                layer, settlement_entity, exclude_fields
+                layer, settlement_entity, {self.SETTLEMENT_SYNC_FIELD, self.SETTLEMENT_HASH_FIELD}
             )
             mapped_count = sum(1 for api_field in field_mapping.values() if api_field)
             self.log_message(
                 f"Auto-mapped {mapped_count} layer field(s) to settlement API attributes."
             )
-            self._update_settlement_sync_progress(25, "Matching local settlements to KeSMIS...")
+        except Exception as e:
+            self._settlement_sync_state = {"layer_name": layer_name}
+            self._on_settlement_sync_failed(str(e))
+            return
 
-            matches, layer_gdf = self._compute_settlement_matches(
-                layer,
-                settlements_gdf,
-                progress_callback=self._update_settlement_sync_progress,
-            )
-            if not matches:
-                QMessageBox.warning(self, "No Features", f"Layer '{layer_name}' contains no features.")
-                return
+        is_dry_run = self.dry_run_checkbox.isChecked()
+        options = {
+            "url": self.server_url,
+            "headers": {"Authorization": f"Bearer {self.token}", "x-access-token": self.token},
+            "dry_run": is_dry_run,
+            "dry_run_limit": self.dry_run_spinbox.value() if is_dry_run else None,
+            "transport": self._upload_transport(),
+            "delta": self.delta_sync_checkbox.isChecked(),
+            "hash_field": self.SETTLEMENT_HASH_FIELD,
+        }
+        self._settlement_sync_state = {
+            "layer": layer,
+            "layer_name": layer_name,
+            "entity": settlement_entity,
+            "field_mapping": field_mapping,
+            "mapping_table_data": mapping_table_data,
+            "dry_run": is_dry_run,
+        }
 
-            self._update_settlement_sync_progress(65, "Review matches...")
-            resolved, field_mapping = self._resolve_settlement_matches(
-                layer_name,
-                matches,
-                settlement_entity,
-                field_mapping,
-                mapping_table_data,
-            )
-            if not resolved:
-                self.log_message("Settlement sync cancelled.")
-                return
+        worker = SettlementSyncWorker(self, layer_gdf, settlement_entity, options)
+        worker.moveToThread(self.settlement_sync_thread)
+        worker.progress.connect(self._on_settlement_sync_progress)
+        worker.matched.connect(self._on_settlement_matches_ready)
+        worker.uploaded.connect(self._on_settlement_upload_finished)
+        worker.failed.connect(self._on_settlement_sync_failed)
+        worker.cancelled.connect(self._on_settlement_sync_cancelled)
+        self.settlement_upload_requested.connect(worker.run_upload)
+        self.settlement_sync_thread.started.connect(worker.run_matching)
+        self.settlement_sync_worker = worker
+        self.cancel_settlement_sync_button.setVisible(True)
+        self.cancel_settlement_sync_button.setEnabled(True)
+        self.settlement_sync_thread.start()
+
+    def cancel_settlement_sync(self):
+        """Ask the running settlement sync to stop after the current step."""
+        if self.settlement_sync_worker is None:
+            return
+        self.settlement_sync_worker.stop()
+        self.cancel_settlement_sync_button.setEnabled(False)
+        self.log_message("Cancelling settlement sync...")
+        self._update_settlement_sync_progress(message="Cancelling...")
 
-            self._update_settlement_sync_progress(70, "Loading ward boundaries...", indeterminate=True)
-            wards_gdf = self._fetch_kesmis_geo_gdf("ward", url, headers)
-            self._update_settlement_sync_progress(80, "Preparing records for upload...")
+    def _on_settlement_sync_progress(self, value, message, indeterminate):
+        self._update_settlement_sync_progress(value, message, indeterminate=indeterminate)
 
-            features = self._build_settlement_upsert_features(
-                layer_gdf,
-                resolved,
-                field_mapping,
-                settlement_entity,
-                wards_gdf=wards_gdf,
+    def _on_settlement_matches_ready(self, matches):
+        state = self._settlement_sync_state
+        if not matches:
+            QMessageBox.warning(self, "No Features", f"Layer '{state['layer_name']}' contains no features.")
+            self._finish_settlement_sync()
+            return
+
+        self._update_settlement_sync_progress(65, "Review matches...")
+        resolved, field_mapping = self._resolve_settlement_matches(
+            state["layer_name"],
+            matches,
+            state["entity"],
+            state["field_mapping"],
+            state["mapping_table_data"],
+        )
+        if not resolved or self.settlement_sync_worker is None or self.settlement_sync_worker.is_stopped():
+            self.log_message("Settlement sync cancelled.")
+            self._finish_settlement_sync()
+            return
+        self._mapping_memory.remember(self.SETTLEMENT_MAPPING_KEY, list(field_mapping), field_mapping)
+        if state["dry_run"]:
+            self.log_message(
+                f"DRY RUN: validating up to {self.dry_run_spinbox.value()} settlement record(s) on KeSMIS."
             )
-            if not features:
+        self.settlement_upload_requested.emit(resolved, field_mapping)
+
+    def _on_settlement_upload_finished(self, result):
+        state = self._settlement_sync_state
+        layer = state["layer"]
+        layer_name = state["layer_name"]
+        try:
+            skipped = result.get("skipped", 0)
+            if not result["features"] and not skipped:
                 QMessageBox.warning(
                     self,
                     "Nothing To Sync",
@@ -2657,28 +3124,18 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
                 )
                 return
 
-            is_dry_run = self.dry_run_checkbox.isChecked()
-            dry_run_limit = self.dry_run_spinbox.value() if is_dry_run else None
-            if is_dry_run:
-                self.log_message(
-                    f"DRY RUN: validating up to {dry_run_limit} settlement record(s) on KeSMIS."
-                )
-
-            inserted, updated, failed, errors = self._submit_upsert_batches(
-                settlement_entity["model"],
-                features,
-                dry_run=is_dry_run,
-                dry_run_limit=dry_run_limit,
-                progress_start=85,
-                progress_end=98,
-                manage_visibility=False,
-            )
+            # Nothing is uploaded when every feature is unchanged.
+            inserted = result.get("inserted", 0)
+            updated = result.get("updated", 0)
+            failed = result.get("failed", 0)
+            errors = result.get("errors", [])
 
-            if is_dry_run:
+            if state["dry_run"]:
                 summary = (
                     f"Settlement sync dry run for '{layer_name}'.\n\n"
                     f"Would insert: {inserted}\n"
                     f"Would update: {updated}\n"
+                    f"Unchanged (skipped): {skipped}\n"
                     f"Failed validation: {failed}"
                 )
                 dialog_title = "Settlement Sync Dry Run"
@@ -2690,6 +3147,17 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
                 self.log_message(summary.replace("\n", " "))
                 return
 
+            if not result["features"]:
+                self._apply_settlement_code_matches(layer, result["resolved"])
+                self._update_settlement_sync_progress(100, "Settlement sync complete.")
+                summary = (
+                    f"All {skipped} settlement(s) in '{layer_name}' are unchanged since the last sync; "
+                    "nothing was sent to KeSMIS."
+                )
+                self.log_message(summary)
+                QMessageBox.information(self, "Settlement Sync Complete", summary)
+                return
+
             if failed and not inserted and not updated:
                 summary = (
                     f"Settlement sync failed for '{layer_name}'.\n\n"
@@ -2703,14 +3171,15 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
                 return
 
             filled, local_updated, unchanged, generated = self._apply_settlement_code_matches(
-                layer, resolved
+                layer, result["resolved"], result.get("hashes")
             )
             self._update_settlement_sync_progress(100, "Settlement sync complete.")
             summary = (
                 f"Settlement sync finished for '{layer_name}'.\n\n"
                 f"KeSMIS inserted: {inserted}\n"
                 f"KeSMIS updated: {updated}\n"
-                f"KeSMIS failed: {failed}\n\n"
+                f"KeSMIS failed: {failed}\n"
+                f"Unchanged (skipped): {skipped}\n\n"
                 f"Local codes added: {filled}\n"
                 f"Local codes replaced: {local_updated}\n"
                 f"Local codes unchanged: {unchanged}\n"
@@ -2735,8 +3204,49 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
                 f"Could not sync settlements for '{layer_name}':\n{e}",
             )
         finally:
-            self._finish_settlement_sync_progress()
-            self._update_code_guidance()
+            self._finish_settlement_sync()
+
+    def _on_settlement_sync_failed(self, message):
+        layer_name = (self._settlement_sync_state or {}).get("layer_name", "")
+        self.log_message(f"Failed to sync settlements for '{layer_name}': {message}")
+        QMessageBox.critical(
+            self,
+            "Settlement Sync Failed",
+            f"Could not sync settlements for '{layer_name}':\n{message}",
+        )
+        self._finish_settlement_sync()
+
+    def _on_settlement_sync_cancelled(self, uploaded=None):
+        if uploaded:
+            try:
+                filled, local_updated, _, _ = self._apply_settlement_code_matches(
+                    self._settlement_sync_state["layer"], uploaded
+                )
+                self.log_message(
+                    f"Settlement sync cancelled after {len(uploaded)} record(s) were uploaded; "
+                    f"their codes were written back to the layer ({filled} added, {local_updated} replaced)."
+                )
+            except Exception as e:
+                self.log_message(f"Settlement sync cancelled; could not write codes of uploaded records: {e}")
+        else:
+            self.log_message("Settlement sync cancelled.")
+        self._finish_settlement_sync()
+
+    def _finish_settlement_sync(self):
+        """Stop the settlement sync thread and restore the idle UI."""
+        worker = self.settlement_sync_worker
+        if worker is not None:
+            worker.stop()
+            self.settlement_sync_thread.quit()
+            self.settlement_sync_thread.wait()
+            self.settlement_upload_requested.disconnect(worker.run_upload)
+            self.settlement_sync_thread.started.disconnect(worker.run_matching)
+            worker.deleteLater()
+            self.settlement_sync_worker = None
+        self._settlement_sync_state = None
+        self.cancel_settlement_sync_button.setVisible(False)
+        self._finish_settlement_sync_progress()
+        self._update_code_guidance()
 
     def clear_search(self):
         """Clear the search input and show all table rows."""
@@ -2758,6 +3268,14 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
         """Clear all messages in the log window."""
         self.log_textedit.clear()
 
+    def clear_kesmis_cache(self):
+        """Delete cached KeSMIS lookups stored on disk."""
+        self._endpoint_capabilities.clear()
+        self._model_catalogue.clear()
+        self._mapping_memory.clear()
+        removed = clear_cache_dir()
+        self.log_message(f"Cleared {removed} cached KeSMIS lookup file(s).")
+
     def _convert_to_serializable(self, value):
         """Convert QVariant, numpy/pandas, and other types to JSON-serializable values."""
         if value is None:
@@ -2771,19 +3289,15 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
                 return None
         except (TypeError, ValueError):
             pass
-        try:
-            import numpy as np
-            if isinstance(value, np.integer):
-                return int(value)
-            if isinstance(value, np.floating):
-                number = float(value)
-                if number != number or number in (float("inf"), float("-inf")):
-                    return None
-                return number
-            if isinstance(value, np.bool_):
-                return bool(value)
-        except ImportError:
-            pass
+        if isinstance(value, np.integer):
+            return int(value)
+        if isinstance(value, np.floating):
+            number = float(value)
+            if number != number or number in (float("inf"), float("-inf")):
+                return None
+            return number
+        if isinstance(value, np.bool_):
+            return bool(value)
         if hasattr(value, "item") and not isinstance(value, (bytes, str)):
             try:
                 return self._convert_to_serializable(value.item())
@@ -2825,42 +3339,14 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
                 srid = layer.crs().postgisSrid()
                 self.log_message(f"Layer CRS SRID detected: {srid}")
 
-                # 2) Build a list of GeoJSON‐like feature dicts
-                features = [
-                    {
-                        "type": "Feature",
-                        "geometry": json.loads(f.geometry().asJson()) if f.geometry() else None,
-                        "properties": {
-                            field: self._convert_to_serializable(f[field])
-                            for field in [fld.name() for fld in layer.fields()]
-                        }
-                    }
-                    for f in layer.getFeatures()
-                ]
-
-                # 3) Create GeoDataFrame with layer's CRS
-                self.gdf = gpd.GeoDataFrame.from_features(features, crs=f"EPSG:{srid}")
+                # 2) Read features as 2D geometries in EPSG:4326 (reused until the layer changes)
+                self.gdf = self._build_gdf_from_layer(layer)
                 if self.gdf.empty:
                     self.gdf = None
                     self.log_message("Selected layer contains no features.")
                     QMessageBox.warning(self, "No Features", "The selected layer contains no features.")
                     return
 
-                # 4) Immediately convert to 2D and reproject to EPSG:4326
-                try:
-                    self.gdf['geometry'] = self.gdf['geometry'].apply(self.to_2d)
-                    self.gdf = self.gdf.to_crs(epsg=4326)
-                    self.log_message("Layer immediately reprojected to EPSG:4326.")
-                except Exception as e:
-                    self.log_message(f"Error reprojecting to EPSG:4326: {str(e)}")
-                    QMessageBox.critical(self, "Projection Error", f"Failed to reproject layer: {str(e)}")
-                    return
-
-                # 3) Set geojson column from the already reprojected geometry
-                self.gdf["geojson"] = self.gdf.geometry.apply(
-                    lambda geom: geom.__geo_interface__ if geom is not None else None
-                )
-
                 self.log_message("Layer loaded and prepared in EPSG:4326.")
             except Exception as e:
                 self.gdf = None
@@ -3056,30 +3542,58 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
             self.reset_data()
 
     def fetch_entities(self, base_url):
-        """Fetch entities from API and populate the entity combo box."""
-        try:
-            headers = {
-                "Authorization": f"Bearer {self.token}",
-                "x-access-token": self.token
-            }
-            response = requests.get(f"{base_url}/api/v1/models/list", headers=headers, timeout=30)
+        """Populate the entity combo box from the cached model catalogue and refresh it in the background."""
+        cached = self._model_catalogue.models()
+        if cached:
+            self._populate_entities(cached)
+            self.log_message(f"Loaded {len(cached)} entities from cache; checking the server for changes...")
+        else:
+            self.log_message("Fetching entities...")
 
-            if response.status_code == 200:
-                data = response.json()
-                self.api_entities = data.get("models", [])
-                # Sort entities by model name
-                self.api_entities.sort(key=lambda e: e.get("model", "").lower())
-                entity_names = [entity["model"] for entity in self.api_entities]
-                self.entity_combo.addItems(entity_names)
-                for i, entity in enumerate(self.api_entities):
-                    self.entity_combo.setItemData(i + 1, entity)  # Offset by 1 for '-'
-                self.entity_combo.setCurrentIndex(0)  # Select '-' initially
-                self.entity_combo.setEnabled(True)
-                self.log_message("Entities fetched successfully")
-            else:
-                self.log_message(f"Failed to fetch entities: {response.text}")
-        except Exception as e:
-            self.log_message(f"Error fetching entities: {str(e)}")
+        if self.catalogue_thread.isRunning():
+            return
+        self.catalogue_worker = ModelCatalogueWorker(base_url, self.token)
+        self.catalogue_worker.moveToThread(self.catalogue_thread)
+        self.catalogue_worker.log.connect(self.log_message)
+        self.catalogue_worker.result.connect(self._on_models_fetched)
+        self.catalogue_worker.finished.connect(self._on_catalogue_worker_finished)
+        self.catalogue_thread.started.connect(self.catalogue_worker.run)
+        self.catalogue_thread.start()
+
+    def _on_models_fetched(self, models):
+        """Store a freshly downloaded model list and refresh the entity combo when it changed."""
+        changed = self._model_catalogue.update(models)
+        if changed or not self.api_entities:
+            self._populate_entities(models)
+            self.log_message("Entities fetched successfully")
+        else:
+            self.log_message("Entity catalogue is up to date.")
+
+    def _on_catalogue_worker_finished(self):
+        self.catalogue_thread.quit()
+        self.catalogue_thread.wait()
+        self.catalogue_thread.started.disconnect()
+        self.catalogue_worker.deleteLater()
+        self.catalogue_worker = None
+
+    def _populate_entities(self, models):
+        """Fill the entity combo box, keeping the current selection when it still exists."""
+        current = self.entity_combo.currentData()
+        current_model = current.get("model") if isinstance(current, dict) else None
+
+        self.api_entities = sorted(models, key=lambda e: e.get("model", "").lower())
+        entity_names = [entity["model"] for entity in self.api_entities]
+        self.entity_combo.blockSignals(True)
+        self.entity_combo.clear()
+        self.entity_combo.addItems(entity_names)
+        for i, entity in enumerate(self.api_entities):
+            self.entity_combo.setItemData(i + 1, entity)  # Offset by 1 for '-'
+        selected_index = 0  # '-' unless the previous entity is still listed
+        if current_model in entity_names:
+            selected_index = entity_names.index(current_model) + 1
+        self.entity_combo.setCurrentIndex(selected_index)
+        self.entity_combo.blockSignals(False)
+        self.entity_combo.setEnabled(bool(self.api_entities))
 
     def _on_entity_activated(self, index):
         """Run field matching only after the user confirms an entity choice."""
@@ -3116,7 +3630,8 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
             self.field_matching_worker = FieldMatchingWorker(
                 layer,
                 entity,
-                self.pcode_fields
+                self.pcode_fields,
+                mapping_memory=self._mapping_memory,
             )
             self.field_matching_worker.moveToThread(self.thread)
 
@@ -3186,11 +3701,7 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
         """Convert geometry to 2D by dropping Z dimension."""
         if geom is None:
             return None
-        return shape(mapping(force_2d(geom)))
-
-    def sanitize_json_value(self, value):
-        """Sanitize JSON values to handle NaN, infinity, and numpy/pandas scalars."""
-        return self._convert_to_serializable(value)
+        return force_2d(geom)
 
     def _format_import_error_lines(self, errors, limit=15):
         """Format API import errors for display in logs and message boxes."""
@@ -3212,7 +3723,6 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
         """Submit features to API in batches of 100 with progress updates."""
         try:
             layer = self.layer_combo.currentData()
-            url = self.server_url
             entity = self.entity_combo.currentData()
 
             # Validate GeoDataFrame
@@ -3230,47 +3740,24 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
                     self.gdf.set_crs(epsg=srid, inplace=True)
                     self.log_message("No CRS defined for GeoDataFrame. Using layer CRS.")
                 self.gdf = self.gdf.to_crs(epsg=4326)
-                self.gdf['geometry'] = self.gdf['geometry'].apply(self.to_2d)
+                self.gdf['geometry'] = drop_z(self.gdf.geometry.values)
                 self.log_message("Z dimension dropped and GeoDataFrame reprojected to EPSG:4326.")
             except Exception as e:
                 self.log_message(f"Error reprojecting or processing geometries: {e}")
                 QMessageBox.critical(self, "Geometry Error", f"Failed to reproject or process geometries: {e}")
                 return
 
-            # Build feature payloads
-            features = []
-            for idx, row in self.gdf.iterrows():
-                if idx not in self.valid_feature_indices:
-                    self.log_message(f"Skipping feature index {idx}: No valid parent ID found.")
-                    continue
-
-                feature = {}
-                # include codes and pcode if present
-                for key in ("code", "pcode"):  # optional keys
-                    if key in row and row[key]:
-                        feature[key] = self._convert_to_serializable(row[key])
-
-                # parent entity IDs
-                entity_data = self.pcode_entity_data.get(idx, {})
-                for id_key in ("settlement_id", "ward_id", "subcounty_id", "county_id"):
-                    if entity_data.get(id_key) is not None:
-                        feature[id_key] = entity_data[id_key]
-
-                # mapped fields
-                for field, api_field in self.field_mapping.items():
-                    if not api_field:
-                        continue
-                    if field in row:
-                        feature[api_field] = self.sanitize_json_value(row[field])
-                    elif field in entity_data:
-                        feature[api_field] = self.sanitize_json_value(entity_data[field])
-
-                # geometry
-                if hasattr(row, "geometry") and row.geometry:
-                    feature["geom"] = row.geometry.__geo_interface__
-                # Add isApproved property
-                feature["isApproved"] = True
-                features.append(feature)
+            # Build feature payloads column by column
+            features = build_feature_payloads(
+                self.gdf,
+                self.field_mapping,
+                self.pcode_entity_data,
+                self.valid_feature_indices,
+            )
+            skipped = len(self.gdf) - len(features)
+            if skipped:
+                self.log_message(f"Skipping {skipped} feature(s): No valid parent ID found.")
+            self._mapping_memory.remember(entity.get("model", ""), list(self.field_mapping), self.field_mapping)
 
             if not features:
                 self.log_message("No features with valid parent IDs to submit.")
@@ -3289,53 +3776,11 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
                     f"(limit: {dry_run_limit}). No records will be saved."
                 )
 
-            # Batch submission setup
-            batch_size = 100
-            total = len(features)
-            self.progress_bar.setRange(0, 100)
-            self.progress_bar.setValue(0)
-            self.progress_bar.setVisible(True)
-
-            headers = {
-                "Authorization": f"Bearer {self.token}",
-                "x-access-token": self.token
-            }
-            all_inserted = all_updated = all_failed = 0
-            all_errors = []
-
-            # Submit in batches
-            for start in range(0, total, batch_size):
-                batch = features[start:start + batch_size]
-                batch_num = start // batch_size + 1
-                action = "Validating batch" if is_dry_run else "Submitting batch"
-                self.log_message(f"{action} {batch_num} ({start+1}–{min(start+batch_size, total)} of {total})…")
-                try:
-                    payload = {"model": entity["model"], "data": batch}
-                    if is_dry_run:
-                        payload["dryRun"] = True
-                    resp = requests.post(
-                        f"{url}/api/v1/data/import/upsert",
-                        json=payload,
-                        headers=headers,
-                        timeout=30
-                    )
-                    resp.raise_for_status()
-                    data = resp.json()
-                    all_inserted += data.get("insertedCount", 0)
-                    all_updated += data.get("updatedCount", 0)
-                    all_failed += data.get("failedCount", 0)
-                    all_errors.extend(data.get("errors", []))
-                except Exception as e:
-                    self.log_message(f"Batch {batch_num} failed entirely: {e}")
-                    all_failed += len(batch)
-
-                # Update progress
-                percent = int((start + len(batch)) / total * 100)
-                self.progress_bar.setValue(percent)
-
-            # Finalize
-            self.progress_bar.setValue(100)
-            self.progress_bar.setVisible(False)
+            all_inserted, all_updated, all_failed, all_errors = self._submit_upsert_batches(
+                entity["model"],
+                features,
+                dry_run=is_dry_run,
+            )
 
             if is_dry_run:
                 summary = (
@@ -3378,11 +3823,19 @@ class KesMISDialog(QDialog, CollapsibleHelpMixin):
             self.submit_button.setText("Submit Data to KeSMIS")
     
     def log_message(self, message):
-        """Append message to log widget."""
-        self.log_textedit.append(message)
+        """Append message to log widget (safe to call from worker threads)."""
+        self.log_requested.emit(str(message))
 
     def closeEvent(self, event):
         """Handle dialog close event to clean up threads and workers."""
+        self._layer_snapshots.clear()
+        if self.settlement_sync_worker is not None:
+            self.settlement_sync_worker.stop()
+            self.settlement_sync_thread.quit()
+            self.settlement_sync_thread.wait()
+        if self.catalogue_thread.isRunning():
+            self.catalogue_thread.quit()
+            self.catalogue_thread.wait()
         if self.thread.isRunning():
             if self.worker:
                 self.worker.stop()